@@ -0,0 +1,103 @@
+"""
+Конфигурация gunicorn (загружается автоматически из корня проекта или через -c).
+
+Все параметры задаются переменными окружения:
+
+- GUNICORN_WORKER_CLASS — sync | gthread (по умолчанию) | uvicorn.
+  uvicorn запускает petcosttracker.asgi (нужен пакет uvicorn); синхронные
+  представления Django под ASGI все равно выполняются в потоке, поэтому
+  выигрыша для этого приложения он не дает и оставлен для сравнения.
+- WEB_CONCURRENCY — число воркеров; по умолчанию считается из числа ядер
+  (2 * ядра + 1 для sync, ядра + 1 для gthread/uvicorn) и ограничивается
+  GUNICORN_MAX_WORKERS: каждый воркер с matplotlib — это ~100 МБ.
+- GUNICORN_THREADS — потоков в воркере gthread (по умолчанию 4).
+- GUNICORN_PRELOAD — загрузка приложения в мастере до fork (по умолчанию
+  включена): Django, представления и matplotlib импортируются один раз, а
+  воркеры делят эти страницы памяти copy-on-write.
+- GUNICORN_MAX_REQUESTS / GUNICORN_MAX_REQUESTS_JITTER — перезапуск
+  воркера после N запросов; разброс не дает всем воркерам перезапуститься
+  одновременно. Ограничивает рост памяти от утечек matplotlib.
+- GUNICORN_TIMEOUT — графики строятся в процессе при TASK_BACKEND=thread,
+  поэтому запас больше стандартных 30 секунд.
+
+Итоговые WEB_CONCURRENCY и GUNICORN_THREADS записываются в окружение до
+загрузки приложения, чтобы settings рассчитал по ним пул соединений с базой
+(см. petcosttracker/db.py).
+"""
+import gc
+import multiprocessing
+import os
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'uvicorn': 'uvicorn.workers.UvicornWorker',
+}
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+kind = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if kind not in WORKER_CLASSES:
+    raise RuntimeError(f'Unknown GUNICORN_WORKER_CLASS: {kind}')
+cores = multiprocessing.cpu_count()
+
+worker_class = WORKER_CLASSES[kind]
+wsgi_app = 'petcosttracker.asgi:application' if kind == 'uvicorn' else 'petcosttracker.wsgi:application'
+workers = env_int('WEB_CONCURRENCY', min(
+    2 * cores + 1 if kind == 'sync' else cores + 1,
+    env_int('GUNICORN_MAX_WORKERS', 4),
+))
+threads = env_int('GUNICORN_THREADS', 4) if kind == 'gthread' else 1
+
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['GUNICORN_THREADS'] = str(threads)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+preload_app = env_bool('GUNICORN_PRELOAD', True)
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+timeout = env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+# Сердцебиение воркеров в tmpfs: запись на диск контейнера может зависать
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+
+
+def when_ready(server):
+    """Мастер готов: догружаем представления до fork воркеров"""
+    if not preload_app:
+        return
+    from django.db import connections
+    from django.urls import get_resolver
+
+    # urls импортирует views, а с ними matplotlib
+    get_resolver().url_patterns
+    # Соединение мастера не должно достаться воркерам
+    connections.close_all()
+    # Объекты мастера больше не трогает сборщик мусора, и их страницы
+    # не копируются в воркерах при обходе поколений
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from django.db import connections
+
+    connections.close_all()
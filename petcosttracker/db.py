@@ -0,0 +1,71 @@
+"""
+Профили управления соединениями с PostgreSQL.
+
+DB_CONNECTION_MODE:
+    persistent — постоянные соединения Django (CONN_MAX_AGE) с проверкой
+                 живости перед каждым запросом;
+    pool       — пул соединений psycopg 3 внутри процесса (Django 5.1+,
+                 нужен пакет psycopg[pool]);
+    pgbouncer  — соединения через PgBouncer в режиме transaction pooling:
+                 серверные курсоры отключаются, пулом управляет PgBouncer.
+"""
+from importlib.util import find_spec
+
+import django
+from django.core.exceptions import ImproperlyConfigured
+
+CONNECTION_MODES = ('persistent', 'pool', 'pgbouncer')
+
+
+def check_pool_support():
+    """Пул есть только в Django 5.1+ с psycopg 3; psycopg2 его не поддерживает"""
+    if django.VERSION < (5, 1):
+        raise ImproperlyConfigured(
+            f"DB_CONNECTION_MODE=pool requires Django 5.1+, installed {django.get_version()}"
+        )
+    missing = [name for name in ('psycopg', 'psycopg_pool') if find_spec(name) is None]
+    if missing:
+        raise ImproperlyConfigured(
+            f"DB_CONNECTION_MODE=pool requires psycopg[pool] (missing: {', '.join(missing)})"
+        )
+
+
+def pool_size_per_worker(workers, threads, max_connections):
+    """Возвращает (min_size, max_size) пула одного воркера.
+
+    Суммарно воркеры не превышают лимит соединений сервера; заранее
+    открывается по соединению на поток, но не больше доли воркера.
+    """
+    share = max(max_connections // max(workers, 1), 1)
+    return max(min(threads, share), 1), share
+
+
+def tune_database(config, mode, workers=1, threads=1, max_connections=20, conn_max_age=600):
+    """Применяет профиль соединений к настройкам одной базы PostgreSQL"""
+    if mode not in CONNECTION_MODES:
+        raise ValueError(f"Unknown DB_CONNECTION_MODE: {mode}")
+    if 'postgresql' not in config.get('ENGINE', ''):
+        return config
+
+    # Соединение, умершее после перезапуска Postgres, заменяется до запроса
+    config['CONN_HEALTH_CHECKS'] = True
+    options = config.setdefault('OPTIONS', {})
+
+    if mode == 'pool':
+        check_pool_support()
+        min_size, max_size = pool_size_per_worker(workers, threads, max_connections)
+        # Пул сам переиспользует соединения, CONN_MAX_AGE с ним несовместим
+        config['CONN_MAX_AGE'] = 0
+        options['pool'] = {
+            'min_size': min_size,
+            'max_size': max_size,
+            'timeout': 10,
+        }
+    elif mode == 'pgbouncer':
+        config['CONN_MAX_AGE'] = conn_max_age
+        # В transaction pooling курсор может пережить транзакцию на другом соединении
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+    else:
+        config['CONN_MAX_AGE'] = conn_max_age
+
+    return config
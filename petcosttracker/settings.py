@@ -6,8 +6,11 @@ from pathlib import Path
 import os
 import sys
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
+from petcosttracker.db import tune_database
+
 # 1. Сначала загружаем переменные окружения
 load_dotenv()
 
@@ -24,6 +27,9 @@ SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-xj02_h0kn%5kelh$35_sl
 # ЕДИНСТВЕННОЕ определение DEBUG
 DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true' if IS_PRODUCTION else True
 
+# Запуск manage.py test (pets/tests.py)
+TESTING = sys.argv[1:2] == ['test']
+
 # Разрешенные хосты для продакшена
 ALLOWED_HOSTS = [
     'localhost',
@@ -57,6 +63,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'pets.middleware.RateScopeMiddleware',
 ]
 
 ROOT_URLCONF = 'petcosttracker.urls'
@@ -74,15 +81,76 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'pets.context_processors.cache_versions',
+                'pets.context_processors.reporting',
             ],
         },
     },
 ]
+
+# На продакшене шаблоны компилируются один раз на процесс
+if not DEBUG:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+# Кэш должен быть общим для всех процессов: в нем версии данных
+# (pets/caching.py), по которым сверяются фрагменты, ETag и реестр
+# категорий, а также сессии, пользователи и готовые графики от воркера задач.
+# Redis при наличии REDIS_URL; на продакшене без него — таблица в базе
+# (manage.py createcachetable). Память процесса — только для разработки.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif not DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'pets_cache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'petcosttracker',
+        }
+    }
+# Кэш виден всем процессам (условие для cached_db сессий и CachedModelBackend)
+SHARED_CACHE = 'locmem' not in CACHES['default']['BACKEND']
+
+# Кэш фрагментов шаблонов. Версия шаблонов входит в ключ, поэтому
+# после деплоя с измененной разметкой старые фрагменты не используются.
+TEMPLATE_CACHE_VERSION = (
+    os.environ.get('TEMPLATE_CACHE_VERSION')
+    or os.environ.get('RENDER_GIT_COMMIT', '')[:12]
+    or '1'
+)
+TEMPLATE_FRAGMENT_CACHE_TIMEOUT = int(
+    os.environ.get('TEMPLATE_FRAGMENT_CACHE_TIMEOUT', '0' if DEBUG else '600')
+)
 DEFAULT_EXCHANGE_RATES = {
     'USD': '77.0',  # Курсы по умолчанию, могут быть переопределены переменными окружения
     'EUR': '90.4',
 }
 
+# Источник курсов для manage.py ingest_rates: csv (файл) или cbr (XML ЦБ РФ).
+# Для cbr {date} в адресе заменяется датой, можно указать локальную заглушку.
+RATES_SOURCE = os.environ.get('RATES_SOURCE', 'cbr')
+RATES_LOCATION = os.environ.get(
+    'RATES_LOCATION', 'https://www.cbr.ru/scripts/XML_daily.asp?date_req={date}'
+)
+RATES_FETCH_TIMEOUT = int(os.environ.get('RATES_FETCH_TIMEOUT', '10'))
+
 WSGI_APPLICATION = 'petcosttracker.wsgi.application'
 
 # Database
@@ -102,6 +170,73 @@ if DATABASE_URL:
         ssl_require=True if IS_PRODUCTION else False
     )
 
+# Реплики только для чтения: REPLICA_DATABASE_URLS="postgres://...,postgres://..."
+# Для локальной проверки подойдут две SQLite-базы:
+#   REPLICA_DATABASE_URLS=sqlite:///db_replica.sqlite3
+#   python manage.py migrate && python manage.py migrate --database=replica_1
+REPLICA_DATABASES = []
+for index, replica_url in enumerate(
+    filter(None, os.environ.get('REPLICA_DATABASE_URLS', '').split(',')), start=1
+):
+    alias = f'replica_{index}'
+    replica_url = replica_url.strip()
+    DATABASES[alias] = dj_database_url.parse(
+        replica_url,
+        conn_max_age=600,
+        ssl_require=IS_PRODUCTION and replica_url.startswith('postgres'),
+    )
+    # В тестах реплика указывает на тестовую основную базу
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    REPLICA_DATABASES.append(alias)
+
+# Тесты маршрутизации (pets.tests) читают через зеркало тестовой основной базы
+if TESTING and not REPLICA_DATABASES:
+    DATABASES['replica_test'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+
+# Представления, которые читают данные с реплик
+REPLICA_READ_VIEWS = {
+    'pets:home',
+    'pets:analytics',
+    'pets:pet_list',
+    'pets:expense_list',
+    'pets:global_search',
+    'pets:export_csv',
+    'pets:api_pets',
+    'pets:api_categories',
+    'pets:api_expenses',
+    'pets:api_analytics',
+}
+# После POST клиент читает из основной базы столько секунд
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '5'))
+REPLICA_PIN_COOKIE = 'pin_primary'
+# Реплика с большим отставанием не используется
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '10'))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', '5'))
+
+# Секционирование pets_expense по дате на PostgreSQL: '' (выключено), 'year' или 'month'.
+# Применяется миграцией 0004; позже — командой `manage.py expense_partitions convert`.
+EXPENSE_PARTITIONING = os.environ.get('EXPENSE_PARTITIONING', '')
+
+# Профиль соединений: persistent | pool | pgbouncer (см. petcosttracker/db.py).
+# Размер пула считается из числа воркеров gunicorn и потоков в каждом
+# (gunicorn.conf.py выставляет их в окружении до загрузки settings).
+DB_CONNECTION_MODE = os.environ.get('DB_CONNECTION_MODE', 'persistent')
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', '1'))
+DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', '20'))
+for database in DATABASES.values():
+    tune_database(
+        database,
+        DB_CONNECTION_MODE,
+        workers=WEB_CONCURRENCY,
+        threads=GUNICORN_THREADS,
+        max_connections=DB_MAX_CONNECTIONS,
+    )
+
+if REPLICA_DATABASES:
+    DATABASE_ROUTERS = ['pets.db_router.ReplicaRouter']
+    MIDDLEWARE.append('pets.middleware.ReplicaRoutingMiddleware')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -135,8 +270,27 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 
-# Использование WhiteNoise для обслуживания статических файлов
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# WhiteNoise: при collectstatic CSS и JS приложения минифицируются, имена
+# получают отпечаток содержимого, рядом сохраняются .gz и .br (при
+# установленном Brotli). Файлы с отпечатком отдаются как immutable на 10 лет.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'pets.storage.MinifiedManifestStaticFilesStorage',
+    },
+}
+# Тесты не требуют collectstatic: статика без манифеста
+if TESTING:
+    STORAGES['staticfiles']['BACKEND'] = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+# Префиксы собственной статики приложения, которую нужно минифицировать
+STATIC_MINIFY_PREFIXES = ('css/', 'js/')
+# Срок кэширования файлов без отпечатка (favicon и т.п.)
+WHITENOISE_MAX_AGE = 0 if DEBUG else 3600
+
+# Бюджет веса страницы для manage.py page_weight (HTML и своя статика, сжатые)
+PAGE_WEIGHT_BUDGET_KB = int(os.environ.get('PAGE_WEIGHT_BUDGET_KB', '30'))
 
 # Media files (если будут загружаться файлы)
 MEDIA_URL = '/media/'
@@ -147,7 +301,31 @@ LOGIN_URL = '/pets/accounts/login/'
 LOGIN_REDIRECT_URL = 'pets:home'
 LOGOUT_REDIRECT_URL = 'pets:home'
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
+    # Пользователь сессии читается из кэша, а не из базы на каждом запросе
+    'pets.auth.CachedModelBackend',
+]
+USER_CACHE_TIMEOUT = int(os.environ.get('USER_CACHE_TIMEOUT', '300'))
+
+# Сессии: db, cached_db (кэш с записью в базу) или signed_cookies (без
+# хранилища). С общим кэшем по умолчанию cached_db: чтение сессии из кэша,
+# база нужна только при промахе. Кэш в памяти процесса не видит выхода и
+# смены пароля в других воркерах, поэтому cached_db без него запрещен.
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cached_db' if SHARED_CACHE else 'db')
+if SESSION_BACKEND == 'cached_db' and not SHARED_CACHE:
+    raise ImproperlyConfigured("SESSION_BACKEND=cached_db requires a shared cache (REDIS_URL or DatabaseCache)")
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_BACKEND}'
+
+# Число итераций PBKDF2; без переменной — значение текущей версии Django.
+# Снижать можно для разработки и нагрузочных тестов (python manage.py
+# bench_auth покажет время одной проверки). Хэши с другой стоимостью
+# пересчитываются при следующем входе.
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', '0')) or None
+PASSWORD_HASHERS = [
+    'pets.auth.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
 ]
 
 # Безопасность для продакшена
@@ -220,6 +398,42 @@ LOGGING = {
 MAX_PETS_PER_USER = 50
 MAX_EXPENSES_PER_PET = 1000
 DEFAULT_CURRENCY = 'RUB'
+# Время жизни кэша отчета векторизованной аналитики (ключ включает версию данных)
+ANALYTICS_CACHE_TIMEOUT = 3600
+# Свободных заготовок фигур matplotlib на шаблон графика (см. pets/charts.py)
+CHART_POOL_SIZE = int(os.environ.get('CHART_POOL_SIZE', '2'))
+# Размер порции серверного курсора при потоковом экспорте
+EXPORT_CHUNK_SIZE = 2000
+# Фоновые выгрузки (pets.exports): срок действия ссылки, после него файл удаляется
+EXPORT_TTL_HOURS = int(os.environ.get('EXPORT_TTL_HOURS', '24'))
+# JSON API: размер страницы по умолчанию и максимальный, размер пакета записи
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 500
+API_BATCH_LIMIT = 500
+# Журнал синхронизации: записей на страницу и срок хранения
+SYNC_PAGE_SIZE = 500
+# Записи моложе этого числа секунд не отдаются: транзакция с меньшим id
+# могла еще не зафиксироваться, и клиент перешагнул бы через нее
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', '2'))
+SYNC_LOG_RETENTION_DAYS = int(os.environ.get('SYNC_LOG_RETENTION_DAYS', '90'))
+
+# Фоновые задачи (pets.queue). worker — отдельный процесс
+# manage.py run_tasks (Procfile: worker); thread — пул потоков в веб-процессе
+# для разработки и деплоя из одного сервиса.
+TASK_BACKEND = os.environ.get('TASK_BACKEND', 'thread')
+TASK_THREADS = int(os.environ.get('TASK_THREADS', '2'))
+TASK_WORKER_CONCURRENCY = int(os.environ.get('TASK_WORKER_CONCURRENCY', '4'))
+TASK_POLL_INTERVAL = float(os.environ.get('TASK_POLL_INTERVAL', '1'))
+TASK_MAX_ATTEMPTS = 3
+TASK_RETRY_DELAY = 10  # секунд до второй попытки, далее вдвое больше
+TASK_TIMEOUT = int(os.environ.get('TASK_TIMEOUT', '600'))  # running дольше — воркер упал
+TASK_RESULT_TTL_DAYS = int(os.environ.get('TASK_RESULT_TTL_DAYS', '7'))
+# Админка для больших таблиц: приблизительный COUNT, фильтры без сканирования, поиск по индексам
+ADMIN_PERFORMANCE_MODE = os.environ.get('ADMIN_PERFORMANCE_MODE', 'true').lower() == 'true'
+# Ниже этой оценки выполняется точный COUNT
+ADMIN_COUNT_ESTIMATE_THRESHOLD = 10000
+ADMIN_DATE_FILTER_MONTHS = 12
+ADMIN_FILTER_CACHE_TIMEOUT = 3600
 
 # Дополнительные настройки для продакшена
 if IS_PRODUCTION:
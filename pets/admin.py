@@ -1,16 +1,137 @@
-from django.contrib import admin
+import datetime
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.cache import cache
+from django.db.models import Max, Min, Q
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Pet, ExpenseCategory, Expense
+from . import queue
+from .bulk import apply_by_owner
+from .categories import all_categories
+from .forms import CategoryChoiceField
+from .models import Pet, ExpenseCategory, Expense, Budget, BudgetAlert, RecurringExpense, Task
+from .pagination import EstimatedCountPaginator
+
+# Режим производительности для больших таблиц: приблизительный COUNT, фильтры
+# без сканирования таблицы и поиск по индексам (см. ADMIN_PERFORMANCE_MODE)
+PERFORMANCE_MODE = settings.ADMIN_PERFORMANCE_MODE
+EXPENSE_DATE_RANGE_KEY = 'pets:admin:expense-date-range'
+
+
+class PerformanceAdminMixin:
+    """Списки без точного COUNT всей таблицы в режиме производительности"""
+    if PERFORMANCE_MODE:
+        paginator = EstimatedCountPaginator
+        # Без второго COUNT(*) по всей таблице для «N из M»
+        show_full_result_count = False
+
+
+class OwnerFilter(admin.SimpleListFilter):
+    """Фильтр по владельцу без списка всех пользователей.
+
+    Владелец выбирается ссылкой в колонке списка; в панели фильтра
+    показывается только текущий выбор.
+    """
+    title = 'Владелец'
+    parameter_name = 'owner'
+    
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if not value or not value.isdigit():
+            return []
+        owner = model_admin.model._meta.get_field('owner').related_model.objects.filter(pk=value).first()
+        return [(value, str(owner or value))]
+    
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(owner_id=value)
+        return queryset
+
+
+class CategoryFilter(admin.SimpleListFilter):
+    """Категории из справочника в памяти (pets.categories)"""
+    title = 'Категория'
+    parameter_name = 'category'
+    
+    def lookups(self, request, model_admin):
+        return [(str(category.id), category.name) for category in all_categories()]
+    
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(category_id=value)
+        return queryset
+
+
+def _expense_date_range():
+    """Первая и последняя дата расходов (MIN/MAX по индексу date, из кэша)"""
+    bounds = cache.get(EXPENSE_DATE_RANGE_KEY)
+    if bounds is None:
+        bounds = Expense.objects.aggregate(first=Min('date'), last=Max('date'))
+        cache.set(EXPENSE_DATE_RANGE_KEY, bounds, settings.ADMIN_FILTER_CACHE_TIMEOUT)
+    return bounds['first'], bounds['last']
+
+
+class PeriodFilter(admin.SimpleListFilter):
+    """Ограниченная иерархия дат вместо date_hierarchy.
+
+    date_hierarchy строит список лет и месяцев через SELECT DISTINCT по всей
+    выборке. Здесь годы берутся из MIN/MAX даты, а месяцы — последние
+    ADMIN_DATE_FILTER_MONTHS; фильтр — диапазон дат, который идет по индексу.
+    """
+    title = 'Период'
+    parameter_name = 'period'
+    
+    def lookups(self, request, model_admin):
+        first, last = _expense_date_range()
+        if first is None:
+            return []
+        choices = []
+        month = timezone.localdate().replace(day=1)
+        for _ in range(settings.ADMIN_DATE_FILTER_MONTHS):
+            if month < first.replace(day=1):
+                break
+            choices.append((month.strftime('%Y-%m'), month.strftime('%m.%Y')))
+            month = (month - datetime.timedelta(days=1)).replace(day=1)
+        choices += [(str(year), str(year)) for year in range(last.year, first.year - 1, -1)]
+        return choices
+    
+    def queryset(self, request, queryset):
+        value = self.value()
+        try:
+            if not value:
+                return queryset
+            if len(value) == 4:
+                start = datetime.date(int(value), 1, 1)
+                end = datetime.date(start.year + 1, 1, 1)
+            else:
+                start = datetime.date.fromisoformat(f'{value}-01')
+                end = (start + datetime.timedelta(days=32)).replace(day=1)
+        except ValueError:
+            return queryset
+        return queryset.filter(date__gte=start, date__lt=end)
+
 
 @admin.register(Pet)
-class PetAdmin(admin.ModelAdmin):
-    list_display = ['name', 'species', 'breed', 'owner', 'birth_date']
-    list_filter = ['species', 'owner']
+class PetAdmin(PerformanceAdminMixin, admin.ModelAdmin):
+    list_display = ['name', 'species', 'breed', 'owner_link', 'birth_date']
+    list_filter = ['species', OwnerFilter]
+    list_select_related = ['owner']
     search_fields = ['name', 'breed']
+    autocomplete_fields = ['owner']
+    
+    @admin.display(description='Владелец', ordering='owner')
+    def owner_link(self, obj):
+        return format_html('<a href="?owner={}">{}</a>', obj.owner_id, obj.owner)
 
 @admin.register(ExpenseCategory)
 class ExpenseCategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'color_display', 'description']
+    search_fields = ['name']
     
     def color_display(self, obj):
         return format_html(
@@ -20,9 +141,113 @@ class ExpenseCategoryAdmin(admin.ModelAdmin):
         )
     color_display.short_description = 'Цвет'
 
+class ExpenseActionForm(ActionForm):
+    """Значения для массовых действий над расходами"""
+    category = CategoryChoiceField(ExpenseCategory.objects.all(), required=False, label='Категория')
+    # Список всех питомцев на странице не выводится: питомец задается по ID
+    pet = forms.IntegerField(required=False, min_value=1, label='ID питомца')
+    currency = forms.ChoiceField(choices=[('', '---------')] + Expense.CURRENCIES, required=False, label='Валюта')
+
 @admin.register(Expense)
-class ExpenseAdmin(admin.ModelAdmin):
+class ExpenseAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ['pet', 'category', 'amount', 'currency', 'date']
-    list_filter = ['category', 'date', 'currency']
+    list_select_related = ['pet', 'category']
+    autocomplete_fields = ['pet', 'category']
     search_fields = ['pet__name', 'description']
-    date_hierarchy = 'date'
\ No newline at end of file
+    if PERFORMANCE_MODE:
+        list_filter = [PeriodFilter, CategoryFilter, 'currency', OwnerFilter]
+        search_help_text = 'ID расхода, часть клички питомца или описания'
+    else:
+        list_filter = ['category', 'date', 'currency']
+        date_hierarchy = 'date'
+    action_form = ExpenseActionForm
+    actions = ['bulk_set_category', 'bulk_set_pet', 'bulk_set_currency', 'bulk_delete']
+    
+    def get_actions(self, request):
+        # Стандартное удаление загружает каждый объект; заменено на bulk_delete
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск без JOIN: питомцы находятся отдельным запросом по индексу клички.
+
+        На PostgreSQL icontains по кличке и описанию обслуживают триграммные
+        GIN-индексы (миграция 0011), число — это еще и ID расхода.
+        """
+        if not PERFORMANCE_MODE:
+            return super().get_search_results(request, queryset, search_term)
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        pets = Pet.objects.filter(name__icontains=term).values('pk')
+        condition = Q(pet_id__in=pets) | Q(description__icontains=term)
+        if term.isdigit():
+            condition |= Q(pk=int(term))
+        return queryset.filter(condition), False
+    
+    def _bulk(self, request, queryset, action, field=None, attribute=None):
+        changes = {}
+        if field:
+            value = request.POST.get(field)
+            if not value:
+                self.message_user(request, 'Выберите значение для действия', messages.WARNING)
+                return
+            changes[attribute] = value
+        try:
+            count = apply_by_owner(queryset, action, **changes)
+        except ValueError:
+            self.message_user(request, 'Питомец принадлежит другому владельцу', messages.ERROR)
+            return
+        self.message_user(request, f'Обработано расходов: {count}', messages.SUCCESS)
+    
+    @admin.action(description='Сменить категорию', permissions=['change'])
+    def bulk_set_category(self, request, queryset):
+        self._bulk(request, queryset, 'update', 'category', 'category_id')
+    
+    @admin.action(description='Сменить питомца', permissions=['change'])
+    def bulk_set_pet(self, request, queryset):
+        self._bulk(request, queryset, 'update', 'pet', 'pet_id')
+    
+    @admin.action(description='Сменить валюту', permissions=['change'])
+    def bulk_set_currency(self, request, queryset):
+        self._bulk(request, queryset, 'update', 'currency', 'currency')
+    
+    @admin.action(description='Удалить выбранные расходы', permissions=['delete'])
+    def bulk_delete(self, request, queryset):
+        self._bulk(request, queryset, 'delete')
+
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ['owner', 'pet', 'category', 'monthly_limit', 'is_active']
+    list_filter = ['is_active']
+    list_select_related = ['owner', 'pet', 'category']
+
+@admin.register(BudgetAlert)
+class BudgetAlertAdmin(admin.ModelAdmin):
+    list_display = ['budget', 'month', 'spent', 'limit', 'is_read']
+    list_filter = ['is_read', 'month']
+    list_select_related = ['budget__owner', 'budget__pet', 'budget__category']
+
+@admin.register(RecurringExpense)
+class RecurringExpenseAdmin(admin.ModelAdmin):
+    list_display = ['pet', 'category', 'amount', 'currency', 'frequency', 'interval', 'next_run', 'is_active']
+    list_filter = ['is_active', 'frequency', 'currency']
+    list_select_related = ['pet', 'category']
+    readonly_fields = ['next_run']
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'owner', 'run_at', 'finished_at']
+    list_filter = ['status', 'name']
+    list_select_related = ['owner']
+    readonly_fields = [field.name for field in Task._meta.fields]
+    actions = ['retry']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry(self, request, queryset):
+        updated = queue.retry(queryset)
+        self.message_user(request, f'Возвращено в очередь: {updated}', messages.SUCCESS)
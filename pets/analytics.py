@@ -0,0 +1,215 @@
+"""
+Векторизованная аналитика расходов на NumPy.
+
+Для владельца один раз выгружается компактная колоночная выборка
+(дата, категория, питомец, сумма в копейках как int64), и все показатели —
+скользящее среднее, сравнение год к году, сезонность категорий и прогноз —
+считаются операциями над массивами без циклов по строкам.
+Готовый отчет кэшируется по версии данных владельца.
+"""
+import logging
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BigIntegerField, CharField, F
+from django.db.models.functions import Cast, Round
+
+from .caching import get_data_version
+from .categories import category_names
+from .models import Expense
+from .money import (
+    MINOR_UNITS, RATE_SCALE, RateCalendar, convert_minor_array, convert_minor_back_array,
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError as e:
+    logger.error(f"NumPy import error: {e}")
+    np = None
+    NUMPY_AVAILABLE = False
+
+REPORT_CACHE_KEY = 'pets:analytics:report:{}:{}:{}'
+ROLLING_WINDOW = 3
+FORECAST_HORIZON = 3
+FORECAST_HISTORY = 12
+MONTH_NAMES = [
+    'январь', 'февраль', 'март', 'апрель', 'май', 'июнь',
+    'июль', 'август', 'сентябрь', 'октябрь', 'ноябрь', 'декабрь',
+]
+
+
+@dataclass
+class OwnerExtract:
+    """Колоночная выборка расходов владельца"""
+    dates: 'np.ndarray'         # datetime64[D]
+    category_ids: 'np.ndarray'  # int64
+    pet_ids: 'np.ndarray'       # int64
+    amounts: 'np.ndarray'       # int64, сотые доли валюты отчетов
+
+    def __len__(self):
+        return len(self.amounts)
+
+
+def load_extract(owner_id, currency='RUB'):
+    """Выгружает расходы владельца одним запросом без подзапроса курса.
+
+    Суммы переводятся в копейки в базе, дата приходит строкой ISO (без
+    преобразования в date по строкам), курсы на дату подставляются из
+    RateCalendar, пересчет в рубли и затем в валюту отчетов — целочисленный
+    и векторный (money).
+    """
+    rows = Expense.objects.filter(owner_id=owner_id).annotate(
+        minor=Cast(Round(F('amount') * MINOR_UNITS), BigIntegerField()),
+        # Дата строкой ISO: NumPy разбирает ее сам, без объекта date на каждую строку
+        day=Cast('date', CharField()),
+    ).values_list('day', 'category_id', 'pet_id', 'currency', 'minor')
+
+    dates, category_ids, pet_ids, currencies, minor = zip(*rows) if rows else ((), (), (), (), ())
+    dates = np.array(dates, dtype='datetime64[D]')
+    currencies = np.array(currencies, dtype='U3')
+    rates = np.full(len(dates), RATE_SCALE, dtype=np.int64)
+    calendar = RateCalendar.load(set(currencies.tolist()) | {currency})
+    # code, а не currency: параметр currency — валюта отчетов, нужна ниже
+    for code in np.unique(currencies):
+        mask = currencies == code
+        rates[mask] = calendar.rates_for(str(code), dates[mask])
+
+    amounts = convert_minor_array(np.array(minor, dtype=np.int64), rates)
+    if currency != 'RUB':
+        amounts = convert_minor_back_array(amounts, calendar.rates_for(currency, dates))
+
+    return OwnerExtract(
+        dates=dates,
+        category_ids=np.array(category_ids, dtype=np.int64),
+        pet_ids=np.array(pet_ids, dtype=np.int64),
+        amounts=amounts,
+    )
+
+
+def monthly_totals(extract):
+    """Суммы по календарным месяцам без пропусков: (месяцы datetime64[M], суммы int64)"""
+    if not len(extract):
+        return np.array([], dtype='datetime64[M]'), np.array([], dtype=np.int64)
+    months = extract.dates.astype('datetime64[M]').astype(np.int64)
+    first = months.min()
+    totals = np.bincount(months - first, weights=extract.amounts)
+    month_axis = np.arange(first, first + len(totals)).astype('datetime64[M]')
+    return month_axis, np.rint(totals).astype(np.int64)
+
+
+def rolling_average(totals, window=ROLLING_WINDOW):
+    """Скользящее среднее; для первых window-1 месяцев — NaN"""
+    result = np.full(len(totals), np.nan)
+    if len(totals) >= window:
+        result[window - 1:] = np.convolve(totals, np.ones(window) / window, mode='valid')
+    return result
+
+
+def year_over_year(totals):
+    """Изменение к тому же месяцу прошлого года в процентах (NaN без базы сравнения)"""
+    result = np.full(len(totals), np.nan)
+    if len(totals) > 12:
+        previous = totals[:-12].astype(float)
+        current = totals[12:].astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result[12:] = np.where(previous > 0, (current - previous) / previous * 100, np.nan)
+    return result
+
+
+def category_seasonality(extract):
+    """Сезонный индекс категорий: (id категорий, матрица категория × месяц года).
+
+    1.0 — средний для категории месяц, 2.0 — вдвое больше среднего.
+    """
+    if not len(extract):
+        return np.array([], dtype=np.int64), np.zeros((0, 12))
+    categories, category_index = np.unique(extract.category_ids, return_inverse=True)
+    month_of_year = extract.dates.astype('datetime64[M]').astype(np.int64) % 12
+    matrix = np.bincount(
+        category_index * 12 + month_of_year,
+        weights=extract.amounts,
+        minlength=len(categories) * 12,
+    ).reshape(len(categories), 12)
+    mean = matrix.mean(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index = np.where(mean > 0, matrix / mean, 0.0)
+    return categories, index
+
+
+def forecast(totals, horizon=FORECAST_HORIZON, history=FORECAST_HISTORY):
+    """Линейный тренд по последним месяцам, продолженный на horizon месяцев вперед"""
+    recent = totals[-history:].astype(float)
+    if len(recent) < 2:
+        return np.full(horizon, recent[-1] if len(recent) else 0.0)
+    x = np.arange(len(recent))
+    slope, intercept = np.polyfit(x, recent, 1)
+    future = np.arange(len(recent), len(recent) + horizon)
+    return np.clip(slope * future + intercept, 0, None)
+
+
+def compute_report(extract, category_names=None):
+    """Считает все показатели по выборке. Суммы в отчете — в валюте выборки (float)"""
+    category_names = category_names or {}
+    months, totals = monthly_totals(extract)
+    rolling = rolling_average(totals)
+    yoy = year_over_year(totals)
+    categories, seasonality = category_seasonality(extract)
+    predicted = forecast(totals)
+
+    def rub(value):
+        return None if np.isnan(value) else round(float(value) / MINOR_UNITS, 2)
+
+    monthly = [
+        {
+            'month': str(month),
+            'total': float(totals[i]) / MINOR_UNITS,
+            'rolling_avg': rub(rolling[i]),
+            'yoy_percent': None if np.isnan(yoy[i]) else round(float(yoy[i]), 1),
+        }
+        for i, month in enumerate(months)
+    ]
+
+    peak_months = seasonality.argmax(axis=1) if len(categories) else []
+    seasonal = [
+        {
+            'category_id': int(category_id),
+            'category_name': category_names.get(int(category_id), ''),
+            'peak_month': int(peak_months[i]) + 1,
+            'peak_month_name': MONTH_NAMES[int(peak_months[i])],
+            'peak_index': round(float(seasonality[i, peak_months[i]]), 2),
+            'index': [round(float(value), 2) for value in seasonality[i]],
+        }
+        for i, category_id in enumerate(categories)
+    ]
+    seasonal.sort(key=lambda item: item['peak_index'], reverse=True)
+
+    next_month = months[-1] + 1 if len(months) else None
+    return {
+        'rows': len(extract),
+        'monthly': monthly,
+        'last_rolling_avg': rub(rolling[-1]) if len(rolling) else None,
+        'last_yoy_percent': monthly[-1]['yoy_percent'] if monthly else None,
+        'seasonality': seasonal,
+        'forecast': [
+            {'month': str(next_month + i), 'total': round(float(value) / MINOR_UNITS, 2)}
+            for i, value in enumerate(predicted)
+        ] if next_month is not None else [],
+    }
+
+
+def owner_report(owner_id, currency='RUB'):
+    """Отчет владельца из кэша или с пересчетом; None, если NumPy недоступен"""
+    if not NUMPY_AVAILABLE:
+        return None
+    key = REPORT_CACHE_KEY.format(owner_id, currency, get_data_version(owner_id))
+    report = cache.get(key)
+    if report is None:
+        extract = load_extract(owner_id, currency)
+        names = category_names()
+        report = compute_report(extract, names)
+        cache.set(key, report, settings.ANALYTICS_CACHE_TIMEOUT)
+    return report
@@ -0,0 +1,485 @@
+"""
+JSON API для мобильного клиента и интеграций.
+
+Все ответы — JSON (orjson, если установлен), сжатые gzip при поддержке
+клиентом. Списки постраничные по курсору: курсор кодирует ключ сортировки
+последней строки, поэтому страница читается по индексу без OFFSET.
+
+?fields=a,b выбирает поля ответа. Запрос строится только из нужных
+колонок: связанные таблицы присоединяются, а агрегаты считаются, лишь
+если их поля запрошены. Названия категорий берутся из справочника в памяти.
+"""
+import base64
+import datetime
+import json
+from decimal import Decimal, InvalidOperation
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncMonth
+from django.http import HttpResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET, require_POST
+
+from .analytics import owner_report
+from .budgets import record_bulk_change
+from .caching import bump_owner_versions
+from .categories import all_categories, attach, get_category
+from . import queue
+from .models import Expense, Pet, Task
+from .reporting import CurrencyReport
+from .sync import SyncTokenExpired, changes_since, current_token, record_expenses
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+# ==================== СЕРИАЛИЗАЦИЯ ====================
+
+def _default(value):
+    # Суммы отдаются строками, чтобы не терять точность
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(data):
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+
+def error_response(message, status=400, **extra):
+    return json_response({'error': message, **extra}, status=status)
+
+
+def api_view(view_func):
+    """Аутентификация по сессии, gzip и ответы об ошибках в JSON"""
+    @wraps(view_func)
+    @gzip_page
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error_response('Требуется вход', status=401)
+        try:
+            return view_func(request, *args, **kwargs)
+        except ApiError as e:
+            return error_response(e.message, status=e.status, **e.extra)
+    return wrapper
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+
+# ==================== ПОЛЯ И ПЛАНИРОВАНИЕ ЗАПРОСА ====================
+
+# Поле ответа → колонка для values() или агрегат
+PET_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'species': 'species',
+    'breed': 'breed',
+    'birth_date': 'birth_date',
+    'created_at': 'created_at',
+    'expense_count': Count('expenses'),
+    'last_expense_date': Max('expenses__date'),
+}
+EXPENSE_FIELDS = {
+    'id': 'id',
+    'pet_id': 'pet_id',
+    'pet_name': 'pet__name',
+    'category_id': 'category_id',
+    'category_name': 'category_id',  # название подставляется из справочника
+    'amount': 'amount',
+    'currency': 'currency',
+    'date': 'date',
+    'description': 'description',
+    'receipt': 'receipt',
+    'recurring_id': 'recurring_id',
+    'created_at': 'created_at',
+}
+CATEGORY_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'description': 'description',
+    'color': 'color',
+}
+DEFAULT_EXPENSE_FIELDS = ('id', 'pet_id', 'category_id', 'amount', 'currency', 'date', 'description')
+
+
+def requested_fields(request, available, default=None):
+    value = request.GET.get('fields')
+    if not value:
+        return list(default or available)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ApiError('Неизвестные поля', unknown=unknown, available=sorted(available))
+    return fields
+
+
+def plan_values(queryset, fields, available, extra_columns=()):
+    """values() только с нужными колонками; агрегаты добавляются по требованию.
+
+    Связанные таблицы попадают в JOIN только через запрошенные колонки
+    (pet__name и т.п.), отдельный select_related не нужен.
+    """
+    columns = {}
+    annotations = {}
+    for name in fields:
+        spec = available[name]
+        if isinstance(spec, str):
+            columns[name] = spec
+        else:
+            annotations[name] = spec
+    paths = list(dict.fromkeys([*columns.values(), *extra_columns]))
+    if annotations:
+        queryset = queryset.annotate(**{f'_{name}': expr for name, expr in annotations.items()})
+        paths += [f'_{name}' for name in annotations]
+    return queryset.values(*paths), columns, annotations
+
+
+def shape(row, fields, columns, annotations):
+    item = {}
+    for name in fields:
+        value = row[columns[name]] if name in columns else row[f'_{name}']
+        if name == 'category_name':
+            category = get_category(value)
+            value = category.name if category else None
+        elif name == 'receipt':
+            value = settings.MEDIA_URL + value if value else None
+        item[name] = value
+    return item
+
+
+# ==================== КУРСОРНАЯ ПАГИНАЦИЯ ====================
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=DjangoJSONEncoder).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return json.loads(raw)
+    except (ValueError, TypeError):
+        raise ApiError('Неверный курсор')
+
+
+def page_limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    return max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+
+def paginate(queryset, request, ordering, parse):
+    """Keyset-пагинация по ordering (поля с '-' — по убыванию, последнее уникально).
+
+    parse переводит значения курсора из JSON обратно в типы полей.
+    """
+    limit = page_limit(request)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        values = parse(decode_cursor(cursor))
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = f'{name}__lt' if field.startswith('-') else f'{name}__gt'
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{name: value})
+        queryset = queryset.filter(condition)
+    rows = list(queryset.order_by(*ordering)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor([last[field.lstrip('-')] for field in ordering])
+    return rows, next_cursor
+
+
+def _parse_id(values):
+    try:
+        return [int(values[0])]
+    except (ValueError, TypeError, IndexError):
+        raise ApiError('Неверный курсор')
+
+
+def _parse_date_id(values):
+    try:
+        return [datetime.date.fromisoformat(values[0]), int(values[1])]
+    except (ValueError, TypeError, IndexError):
+        raise ApiError('Неверный курсор')
+
+
+# ==================== ЧТЕНИЕ ====================
+
+@require_GET
+@api_view
+def pets(request):
+    fields = requested_fields(request, PET_FIELDS, default=['id', 'name', 'species', 'breed', 'birth_date'])
+    queryset, columns, annotations = plan_values(
+        Pet.objects.filter(owner=request.user), fields, PET_FIELDS, extra_columns=['id']
+    )
+    rows, next_cursor = paginate(queryset, request, ['id'], _parse_id)
+    return json_response({
+        'results': [shape(row, fields, columns, annotations) for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+@require_GET
+@api_view
+def categories(request):
+    """Категории из справочника в памяти; список короткий и отдается целиком"""
+    fields = requested_fields(request, CATEGORY_FIELDS)
+    return json_response({
+        'results': [{name: getattr(category, name) for name in fields} for category in all_categories()],
+        'next_cursor': None,
+    })
+
+
+def _filter_expenses(request):
+    queryset = Expense.objects.filter(owner=request.user)
+    params = request.GET
+    try:
+        if params.get('pet'):
+            queryset = queryset.filter(pet_id=int(params['pet']))
+        if params.get('category'):
+            queryset = queryset.filter(category_id=int(params['category']))
+        if params.get('date_from'):
+            queryset = queryset.filter(date__gte=datetime.date.fromisoformat(params['date_from']))
+        if params.get('date_to'):
+            queryset = queryset.filter(date__lte=datetime.date.fromisoformat(params['date_to']))
+    except ValueError:
+        raise ApiError('Неверный фильтр')
+    return queryset
+
+
+@require_GET
+@api_view
+def expenses(request):
+    fields = requested_fields(request, EXPENSE_FIELDS, default=DEFAULT_EXPENSE_FIELDS)
+    queryset, columns, annotations = plan_values(
+        _filter_expenses(request), fields, EXPENSE_FIELDS, extra_columns=['date', 'id']
+    )
+    rows, next_cursor = paginate(queryset, request, ['-date', '-id'], _parse_date_id)
+    return json_response({
+        'results': [shape(row, fields, columns, annotations) for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+@require_GET
+@api_view
+def analytics(request):
+    """Итоги по категориям, питомцам и месяцам в валюте отчетов (или ?currency=).
+
+    ?insights=1 добавляет скользящее среднее, сезонность и прогноз (analytics).
+    """
+    currency = request.GET.get('currency') or CurrencyReport.for_user(request.user).currency
+    if currency not in dict(Expense.CURRENCIES):
+        raise ApiError('Неизвестная валюта')
+    report = CurrencyReport(currency)
+    queryset = _filter_expenses(request)
+
+    def by_total(items):
+        return sorted(items, key=lambda item: item['total'], reverse=True)
+
+    return json_response({
+        'currency': currency,
+        'summary': report.total(queryset, extremes=True),
+        'by_category': by_total(attach(report.totals(queryset, 'category_id'))),
+        'by_pet': by_total(report.totals(queryset, 'pet_id', 'pet__name')),
+        'by_month': sorted(
+            report.totals(queryset.annotate(month=TruncMonth('date')), 'month'),
+            key=lambda item: item['month'],
+        ),
+        'insights': owner_report(request.user.pk, currency) if request.GET.get('insights') else None,
+    })
+
+
+@require_GET
+@api_view
+def sync(request):
+    """Изменения после токена: ?since=<token>&limit=N.
+
+    Без since возвращает только текущий токен для начала синхронизации.
+    Если журнал после токена уже очищен, ответ 410 — нужна полная загрузка.
+    """
+    if 'since' not in request.GET:
+        return json_response({'token': current_token(request.user.pk)})
+    try:
+        since = int(request.GET['since'])
+        limit = int(request.GET.get('limit', settings.SYNC_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('since и limit должны быть числами')
+    limit = max(1, min(limit, settings.SYNC_PAGE_SIZE))
+    try:
+        return json_response(changes_since(request.user.pk, since, limit))
+    except SyncTokenExpired:
+        raise ApiError('Токен устарел, нужна полная загрузка', status=410, token=current_token(request.user.pk))
+
+
+@require_GET
+@api_view
+def task_status(request, pk):
+    """Статус фоновой задачи пользователя для опроса клиентом"""
+    job = Task.objects.filter(pk=pk, owner=request.user).first()
+    if job is None:
+        raise ApiError('Задача не найдена', status=404)
+    return json_response(queue.status(job))
+
+
+# ==================== ПАКЕТНАЯ ЗАПИСЬ ====================
+
+WRITABLE_EXPENSE_FIELDS = ('pet_id', 'category_id', 'amount', 'currency', 'date', 'description')
+_AMOUNT_LIMIT = Decimal('99999999.99')
+
+
+def _clean_expense(data, pet_ids, category_ids, partial):
+    """Проверяет одну запись пакета; возвращает (значения, ошибки)"""
+    if not isinstance(data, dict):
+        return None, {'__all__': 'Ожидается объект'}
+    values = {}
+    errors = {}
+    for name in WRITABLE_EXPENSE_FIELDS:
+        if name not in data:
+            if not partial and name != 'description':
+                errors[name] = 'Обязательное поле'
+            continue
+        value = data[name]
+        try:
+            if name == 'pet_id':
+                value = int(value)
+                if value not in pet_ids:
+                    raise ValueError
+            elif name == 'category_id':
+                value = int(value)
+                if value not in category_ids:
+                    raise ValueError
+            elif name == 'amount':
+                value = Decimal(str(value))
+                if not value.is_finite() or value <= 0 or value > _AMOUNT_LIMIT:
+                    raise ValueError
+                value = value.quantize(Decimal('0.01'))
+            elif name == 'currency':
+                if value not in dict(Expense.CURRENCIES):
+                    raise ValueError
+            elif name == 'date':
+                value = datetime.date.fromisoformat(value)
+            elif name == 'description':
+                value = str(value)
+        except (ValueError, TypeError, InvalidOperation):
+            errors[name] = 'Неверное значение'
+            continue
+        values[name] = value
+    return values, errors
+
+
+@require_POST
+@api_view
+def expenses_batch(request):
+    """Создает и изменяет расходы пакетом в одной транзакции.
+
+    Тело: {"create": [{...}], "update": [{"id": 1, ...}]}; id в update не
+    повторяются. При ошибке хотя бы в одной записи ничего не сохраняется,
+    ответ 400 содержит ошибки по индексам. Запись идет через bulk_create/bulk_update: суммы бюджетов и
+    версии кэша обновляются один раз на пакет, а не на каждую строку.
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError('Тело запроса должно быть JSON')
+    if not isinstance(payload, dict):
+        raise ApiError('Ожидается объект с create и update')
+    to_create = payload.get('create') or []
+    to_update = payload.get('update') or []
+    if not isinstance(to_create, list) or not isinstance(to_update, list):
+        raise ApiError('create и update должны быть списками')
+    if len(to_create) + len(to_update) > settings.API_BATCH_LIMIT:
+        raise ApiError('Слишком большой пакет', status=413, limit=settings.API_BATCH_LIMIT)
+
+    pet_ids = set(Pet.objects.filter(owner=request.user).values_list('id', flat=True))
+    category_ids = {category.id for category in all_categories()}
+    errors = {'create': {}, 'update': {}}
+
+    created = []
+    for index, data in enumerate(to_create):
+        values, item_errors = _clean_expense(data, pet_ids, category_ids, partial=False)
+        if item_errors:
+            errors['create'][str(index)] = item_errors
+        else:
+            created.append(Expense(owner=request.user, **values))
+
+    update_ids = []
+    for data in to_update:
+        try:
+            update_ids.append(int(data['id']))
+        except (KeyError, TypeError, ValueError):
+            update_ids.append(None)
+    existing = Expense.objects.filter(owner=request.user, id__in=[i for i in update_ids if i])
+    existing = {expense.pk: expense for expense in existing}
+
+    updated = []
+    changed_fields = set()
+    before = []
+    seen = set()
+    for index, (expense_id, data) in enumerate(zip(update_ids, to_update)):
+        expense = existing.get(expense_id)
+        if expense is None:
+            errors['update'][str(index)] = {'id': 'Расход не найден'}
+            continue
+        if expense_id in seen:
+            # Второе изменение того же объекта исказило бы прежнее состояние для сумм бюджетов
+            errors['update'][str(index)] = {'id': 'Расход уже изменяется в этом пакете'}
+            continue
+        seen.add(expense_id)
+        values, item_errors = _clean_expense(data, pet_ids, category_ids, partial=True)
+        if item_errors:
+            errors['update'][str(index)] = item_errors
+            continue
+        before.append(Expense(
+            owner_id=expense.owner_id, pet_id=expense.pet_id, category_id=expense.category_id,
+            date=expense.date, currency=expense.currency, amount=expense.amount,
+        ))
+        for name, value in values.items():
+            setattr(expense, name, value)
+        changed_fields.update(values)
+        updated.append(expense)
+
+    if errors['create'] or errors['update']:
+        raise ApiError('Ошибки в данных, ничего не сохранено', errors=errors)
+
+    with transaction.atomic():
+        Expense.objects.bulk_create(created, batch_size=500)
+        if updated and changed_fields:
+            Expense.objects.bulk_update(updated, sorted(changed_fields), batch_size=500)
+        # bulk_* не отправляют сигналы: суммы бюджетов получают разницу пакетом
+        record_bulk_change(before, created + updated)
+        record_expenses(created + updated)
+        transaction.on_commit(lambda: bump_owner_versions([request.user.pk]))
+
+    return json_response({
+        'created': [expense.pk for expense in created],
+        'updated': [expense.pk for expense in updated],
+    }, status=201 if created else 200)
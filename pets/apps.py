@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class PetsConfig(AppConfig):
     name = 'pets'
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        # Обработчики сигналов бюджетов, журнала синхронизации и кэша
+        # пользователей; регистрация фоновых задач
+        from . import auth, budgets, sync, tasks  # noqa: F401
@@ -0,0 +1,64 @@
+"""
+Аутентификация на горячем пути запроса.
+
+AuthenticationMiddleware на каждом запросе читает пользователя из базы по
+id из сессии. CachedModelBackend держит пользователя в общем кэше, и
+вместе с сессиями cached_db аутентифицированная страница обходится без
+двух запросов (сессия и пользователь). Без общего кэша (SHARED_CACHE)
+бэкенд читает пользователя из базы, как ModelBackend: сброс кэша в памяти
+одного процесса не дошел бы до остальных воркеров. Кэш сбрасывается при любом
+сохранении или удалении пользователя, включая смену пароля и
+обновление last_login, поэтому проверка хэша сессии видит актуальный
+пароль.
+
+ConfigurablePBKDF2PasswordHasher берет число итераций из
+PASSWORD_HASH_ITERATIONS (по умолчанию — значение Django). Имя алгоритма не меняется: существующие хэши
+проверяются как раньше и пересчитываются при входе, если их стоимость
+отличается от настроенной.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+USER_CACHE_KEY = 'pets:user:{}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который читает пользователя сессии из кэша"""
+
+    def get_user(self, user_id):
+        if not settings.SHARED_CACHE:
+            return super().get_user(user_id)
+        key = USER_CACHE_KEY.format(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 с числом итераций из настроек"""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+
+def invalidate_user(user_id):
+    cache.delete(USER_CACHE_KEY.format(user_id))
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    user_id = instance.pk
+    invalidate_user(user_id)
+    # Повторно после коммита: параллельный запрос мог успеть закэшировать
+    # строку, прочитанную до коммита
+    transaction.on_commit(lambda: invalidate_user(user_id))
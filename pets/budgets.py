@@ -0,0 +1,264 @@
+"""
+Бюджеты: накопленные суммы за месяц и проверка превышений.
+
+Каждое сохранение или удаление расхода меняет BudgetPeriodTotal на разницу
+между старым и новым вкладом расхода (четыре строки UPDATE ... SET total =
+total + delta), история при этом не пересчитывается. Проверка бюджета —
+это сравнение одной накопленной суммы с лимитом.
+
+Ночная проверка всех владельцев (`manage.py evaluate_budgets`) обходит их
+порциями в нескольких потоках.
+"""
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .money import RATE_SCALE, RateCalendar, convert_minor, rate_to_fixed, to_minor
+from .models import (
+    Budget, BudgetAlert, BudgetPeriodTotal, ExchangeRate, Expense, deleted_with_owner,
+)
+
+logger = logging.getLogger(__name__)
+
+ALL = 0
+
+
+def month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def rollup_keys(pet_id, category_id):
+    """Ключи (питомец, категория) всех сумм, в которые входит расход"""
+    return [(pet_id, category_id), (pet_id, ALL), (ALL, category_id), (ALL, ALL)]
+
+
+def contribution(state):
+    """Вклад расхода: (владелец, питомец, категория, месяц, копейки в рублях)"""
+    owner_id, pet_id, category_id, date, currency, amount = state
+    if currency == 'RUB':
+        rate = RATE_SCALE
+    else:
+        rate = rate_to_fixed(ExchangeRate.get_rate_on_date(currency, date))
+    return owner_id, pet_id, category_id, month_start(date), convert_minor(to_minor(amount), rate)
+
+
+def apply_delta(owner_id, pet_id, category_id, month, delta):
+    """Прибавляет delta копеек ко всем суммам расхода за месяц"""
+    if not delta:
+        return
+    for pet_key, category_key in rollup_keys(pet_id, category_id):
+        _add_to_total(owner_id, month, pet_key, category_key, delta)
+
+
+def _add_to_total(owner_id, month, pet_key, category_key, delta):
+    """Прибавляет delta к одной строке BudgetPeriodTotal, создавая ее при необходимости"""
+    lookup = dict(owner_id=owner_id, month=month, pet_key=pet_key, category_key=category_key)
+    updated = BudgetPeriodTotal.objects.filter(**lookup).update(total_minor=F('total_minor') + delta)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            BudgetPeriodTotal.objects.create(total_minor=delta, **lookup)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        BudgetPeriodTotal.objects.filter(**lookup).update(total_minor=F('total_minor') + delta)
+
+
+def record_change(old_state, new_state):
+    """Переносит изменение расхода в накопленные суммы и проверяет бюджеты"""
+    if old_state == new_state:
+        return
+    old = contribution(old_state) if old_state else None
+    new = contribution(new_state) if new_state else None
+
+    if old and new and old[:4] == new[:4]:
+        apply_delta(*new[:4], new[4] - old[4])
+    else:
+        if old:
+            apply_delta(*old[:4], -old[4])
+        if new:
+            apply_delta(*new)
+
+    for item in {value[:4] for value in (old, new) if value}:
+        owner_id, pet_id, category_id, month = item
+        evaluate_owner(owner_id, month, pet_id=pet_id, category_id=category_id)
+
+
+def record_bulk(expenses, sign=1, rates=None):
+    """Учитывает расходы, созданные (sign=1) или удаленные (sign=-1) в обход сигналов.
+
+    Вклады суммируются по ключам, поэтому число UPDATE не зависит от числа строк.
+    """
+    if sign > 0:
+        record_bulk_change([], expenses, rates)
+    else:
+        record_bulk_change(expenses, [], rates)
+
+
+def record_bulk_change(before, after, rates=None):
+    """Переносит в суммы массовое изменение: before — прежние состояния, after — новые.
+
+    Разницы складываются по строкам сумм до записи, поэтому строки, итог
+    которых не изменился (при смене категории — «питомец, все» и «все, все»),
+    не дают ни одного UPDATE. Бюджеты проверяются один раз на владельца и месяц.
+    """
+    rates = rates or RateCalendar.covering(
+        (expense.currency, expense.date) for expenses in (before, after) for expense in expenses
+    )
+    deltas = {}
+    for expenses, sign in ((before, -1), (after, 1)):
+        for expense in expenses:
+            month = month_start(expense.date)
+            rub_minor = rates.to_rub_minor(to_minor(expense.amount), expense.currency, expense.date)
+            for pet_key, category_key in rollup_keys(expense.pet_id, expense.category_id):
+                key = (expense.owner_id, month, pet_key, category_key)
+                deltas[key] = deltas.get(key, 0) + sign * rub_minor
+    changed = {key: delta for key, delta in deltas.items() if delta}
+    for key, delta in changed.items():
+        _add_to_total(*key, delta)
+    for owner_id, month in {key[:2] for key in changed}:
+        evaluate_owner(owner_id, month)
+
+
+def reprice(condition, old_rates, new_rates):
+    """Переносит в суммы бюджетов изменение курсов для расходов по условию.
+
+    Возвращает владельцев, у которых сумма в рублях действительно изменилась.
+    """
+    rows = Expense.objects.filter(condition).values_list(
+        'owner_id', 'pet_id', 'category_id', 'date', 'currency', 'amount'
+    )
+    deltas = {}
+    for owner_id, pet_id, category_id, date, currency, amount in rows.iterator():
+        minor = to_minor(amount)
+        delta = new_rates.to_rub_minor(minor, currency, date) - old_rates.to_rub_minor(minor, currency, date)
+        if delta:
+            key = (owner_id, pet_id, category_id, month_start(date))
+            deltas[key] = deltas.get(key, 0) + delta
+    for key, delta in deltas.items():
+        apply_delta(*key, delta)
+    for owner_id, pet_id, category_id, month in deltas:
+        evaluate_owner(owner_id, month, pet_id=pet_id, category_id=category_id)
+    return {owner_id for owner_id, _, _, _ in deltas}
+
+
+def rebuild_owner_totals(owner_id):
+    """Пересчитывает суммы владельца с нуля (после массовых изменений)"""
+    expenses = Expense.objects.filter(owner_id=owner_id)
+    rows = expenses.values_list('pet_id', 'category_id', 'date', 'currency', 'amount')
+    rates = RateCalendar.for_queryset(expenses)
+    totals = {}
+    for pet_id, category_id, date, currency, amount in rows.iterator():
+        rub_minor = rates.to_rub_minor(to_minor(amount), currency, date)
+        month = month_start(date)
+        for key in rollup_keys(pet_id, category_id):
+            totals[(month, *key)] = totals.get((month, *key), 0) + rub_minor
+
+    with transaction.atomic():
+        BudgetPeriodTotal.objects.filter(owner_id=owner_id).delete()
+        BudgetPeriodTotal.objects.bulk_create([
+            BudgetPeriodTotal(
+                owner_id=owner_id, month=month, pet_key=pet_key,
+                category_key=category_key, total_minor=total,
+            )
+            for (month, pet_key, category_key), total in totals.items()
+        ], batch_size=1000)
+    return len(totals)
+
+
+def evaluate_owner(owner_id, month=None, pet_id=None, category_id=None):
+    """Сравнивает суммы владельца за месяц с лимитами; возвращает новые превышения.
+
+    С pet_id/category_id проверяются только бюджеты, в которые входит
+    такой расход.
+    """
+    month = month_start(month or timezone.localdate())
+    budgets = Budget.objects.filter(owner_id=owner_id, is_active=True)
+    if pet_id is not None:
+        budgets = budgets.filter(Q(pet_id=pet_id) | Q(pet__isnull=True))
+    if category_id is not None:
+        budgets = budgets.filter(Q(category_id=category_id) | Q(category__isnull=True))
+    budgets = list(budgets)
+    if not budgets:
+        return []
+
+    totals = {
+        (pet_key, category_key): total
+        for pet_key, category_key, total in BudgetPeriodTotal.objects.filter(
+            owner_id=owner_id, month=month
+        ).values_list('pet_key', 'category_key', 'total_minor')
+    }
+    alerts = {
+        alert.budget_id: alert
+        for alert in BudgetAlert.objects.filter(budget__in=budgets, month=month)
+    }
+
+    created = []
+    for budget in budgets:
+        spent = totals.get((budget.pet_key, budget.category_key), 0)
+        limit = to_minor(budget.monthly_limit)
+        alert = alerts.get(budget.pk)
+        if alert:
+            if alert.spent_minor != spent or alert.limit_minor != limit:
+                BudgetAlert.objects.filter(pk=alert.pk).update(spent_minor=spent, limit_minor=limit)
+        elif spent > limit:
+            created.append(BudgetAlert(budget=budget, month=month, spent_minor=spent, limit_minor=limit))
+    if created:
+        BudgetAlert.objects.bulk_create(created, ignore_conflicts=True)
+    return created
+
+
+def _evaluate_chunk(owner_ids, month):
+    try:
+        return sum(len(evaluate_owner(owner_id, month)) for owner_id in owner_ids)
+    finally:
+        # Соединения рабочих потоков не переиспользуются
+        connections.close_all()
+
+
+def evaluate_all(month=None, workers=4, chunk_size=100):
+    """Проверяет бюджеты всех владельцев порциями в workers потоках"""
+    owner_ids = list(
+        Budget.objects.filter(is_active=True)
+        .values_list('owner_id', flat=True).distinct().order_by('owner_id')
+    )
+    chunks = [owner_ids[i:i + chunk_size] for i in range(0, len(owner_ids), chunk_size)]
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        created = sum(executor.map(lambda chunk: _evaluate_chunk(chunk, month), chunks))
+    return len(owner_ids), created
+
+
+def stored_state(pk):
+    """Вклад расхода так, как он записан в базе (одна выборка по первичному ключу)"""
+    return Expense.objects.filter(pk=pk).values_list(*Expense.ROLLUP_FIELDS).first()
+
+
+@receiver(pre_save, sender=Expense)
+def expense_saving(sender, instance, **kwargs):
+    """Запоминает прежнее состояние расхода, если объект собран вручную или загружен частично"""
+    if instance.pk is None or getattr(instance, '_original', None) is not None:
+        return
+    instance._original = stored_state(instance.pk)
+
+
+@receiver(post_save, sender=Expense)
+def expense_saved(sender, instance, created, **kwargs):
+    """Учитывает разницу между прежним и новым расходом в суммах бюджетов"""
+    old_state = None if created else getattr(instance, '_original', None)
+    # После сохранения части полей (update_fields по only/defer) остальные берутся из базы
+    new_state = instance.rollup_state() or stored_state(instance.pk)
+    record_change(old_state, new_state)
+    instance._original = new_state
+
+
+@receiver(post_delete, sender=Expense)
+def expense_deleted(sender, instance, origin=None, **kwargs):
+    if deleted_with_owner(origin):
+        return
+    record_change(getattr(instance, '_original', None) or instance.rollup_state(), None)
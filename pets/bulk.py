@@ -0,0 +1,84 @@
+"""
+Массовое изменение и удаление расходов владельца.
+
+Каждая операция — один UPDATE или DELETE по списку id с условием на
+владельца. Удаление (delete_in_bulk) обходит Collector: строки не
+загружаются в модели и сигналы отдельных строк не отправляются. Все, что
+обычно делают сигналы, выполняется один раз на операцию по ключам строк,
+прочитанным одним values_list: разница в суммах бюджетов
+(record_bulk_change), журнал синхронизации и версия кэша владельца.
+"""
+from django.db import transaction
+
+from .budgets import record_bulk, record_bulk_change
+from .caching import bump_owner_versions
+from .models import Expense, Pet
+from .sync import record_expenses
+
+BULK_FIELDS = ('category_id', 'pet_id', 'currency')
+
+
+def _rollup_rows(queryset):
+    """Легкие объекты Expense только с полями, нужными суммам бюджетов"""
+    return [
+        Expense(id=pk, **dict(zip(Expense.ROLLUP_FIELDS, values)))
+        for pk, *values in queryset.values_list('id', *Expense.ROLLUP_FIELDS)
+    ]
+
+
+def update_expenses(owner_id, expense_ids, **changes):
+    """Меняет категорию, питомца или валюту у расходов владельца; возвращает число строк"""
+    unknown = set(changes) - set(BULK_FIELDS)
+    if unknown or not changes:
+        raise ValueError(f"Unsupported bulk fields: {sorted(unknown) or 'none'}")
+    if 'pet_id' in changes and not Pet.objects.filter(pk=changes['pet_id'], owner_id=owner_id).exists():
+        raise ValueError("Pet does not belong to owner")
+
+    queryset = Expense.objects.filter(owner_id=owner_id, id__in=list(expense_ids))
+    with transaction.atomic():
+        before = _rollup_rows(queryset.select_for_update())
+        if not before:
+            return 0
+        updated = Expense.objects.filter(owner_id=owner_id, id__in=[e.pk for e in before]).update(**changes)
+
+        after = [Expense(id=e.pk, **{name: getattr(e, name) for name in Expense.ROLLUP_FIELDS}) for e in before]
+        for expense in after:
+            for name, value in changes.items():
+                setattr(expense, name, value)
+        record_bulk_change(before, after)
+        record_expenses(after)
+        transaction.on_commit(lambda: bump_owner_versions([owner_id]))
+    return updated
+
+
+def delete_expenses(owner_id, expense_ids):
+    """Удаляет расходы владельца одним DELETE; возвращает число строк"""
+    queryset = Expense.objects.filter(owner_id=owner_id, id__in=list(expense_ids))
+    with transaction.atomic():
+        before = _rollup_rows(queryset.select_for_update())
+        if not before:
+            return 0
+        # delete_in_bulk() не отправляет post_delete: суммы, журнал и версия
+        # кэша учитываются ниже один раз на всю операцию
+        deleted = Expense.objects.filter(
+            owner_id=owner_id, id__in=[e.pk for e in before]
+        ).delete_in_bulk()
+
+        record_bulk(before, sign=-1)
+        record_expenses(before, deleted=True)
+        transaction.on_commit(lambda: bump_owner_versions([owner_id]))
+    return deleted
+
+
+def apply_by_owner(queryset, action, **changes):
+    """Применяет массовую операцию к выборке с расходами разных владельцев (админка)"""
+    by_owner = {}
+    for pk, owner_id in queryset.values_list('id', 'owner_id'):
+        by_owner.setdefault(owner_id, []).append(pk)
+    total = 0
+    for owner_id, ids in by_owner.items():
+        if action == 'delete':
+            total += delete_expenses(owner_id, ids)
+        else:
+            total += update_expenses(owner_id, ids, **changes)
+    return total
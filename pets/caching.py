@@ -0,0 +1,100 @@
+"""
+Версии данных для инвалидации кэша фрагментов шаблонов.
+
+Каждый владелец имеет счетчик версии, который увеличивается при любом
+изменении его питомцев или расходов. Глобальные области (категории, курсы)
+версионируются отдельно. Ключи кэша строятся из версий, поэтому старые
+фрагменты не удаляются явно, а просто перестают запрашиваться и истекают по TTL.
+"""
+import time
+
+from django.core.cache import cache
+
+OWNER_VERSION_KEY = 'pets:version:owner:{}'
+OWNER_MUTATED_KEY = 'pets:mutated:owner:{}'
+SCOPE_VERSION_KEY = 'pets:version:scope:{}'
+LATEST_RATE_DATE_KEY = 'pets:rates:latest-date'
+
+# Глобальные области, изменение которых влияет на данные всех владельцев
+CATALOG_SCOPE = 'catalog'
+RATES_SCOPE = 'rates'
+
+
+def _initial_version():
+    """Начальное значение счетчика.
+
+    Берется от текущего времени, чтобы после вытеснения ключа из кэша
+    счетчик не начинался заново с уже использованных значений.
+    """
+    return time.time_ns() // 1000
+
+
+def _get(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version or 0
+
+
+def _bump(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Ключ вытеснен или еще не создан
+        version = _initial_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def get_owner_version(owner_id):
+    """Текущая версия данных владельца"""
+    if not owner_id:
+        return 0
+    return _get(OWNER_VERSION_KEY.format(owner_id))
+
+
+def bump_owner_version(owner_id):
+    """Отмечает изменение данных владельца"""
+    if not owner_id:
+        return None
+    cache.set(OWNER_MUTATED_KEY.format(owner_id), time.time(), timeout=None)
+    return _bump(OWNER_VERSION_KEY.format(owner_id))
+
+
+def get_owner_mutated_at(owner_id):
+    """Время последнего изменения данных владельца (unix time) или None"""
+    if not owner_id:
+        return None
+    return cache.get(OWNER_MUTATED_KEY.format(owner_id))
+
+
+def bump_owner_versions(owner_ids):
+    """Отмечает изменение данных сразу нескольких владельцев"""
+    for owner_id in set(owner_ids):
+        bump_owner_version(owner_id)
+
+
+def get_scope_version(scope):
+    """Текущая версия глобальной области (категории, курсы)"""
+    return _get(SCOPE_VERSION_KEY.format(scope))
+
+
+def bump_scope_version(scope):
+    """Отмечает изменение глобальной области"""
+    return _bump(SCOPE_VERSION_KEY.format(scope))
+
+
+def get_data_version(owner_id):
+    """Составная версия данных владельца для ключей кэша фрагментов"""
+    keys = [
+        OWNER_VERSION_KEY.format(owner_id or 0),
+        SCOPE_VERSION_KEY.format(CATALOG_SCOPE),
+        SCOPE_VERSION_KEY.format(RATES_SCOPE),
+    ]
+    # Один поход в кэш на запрос; недостающие ключи создаются по одному
+    values = cache.get_many(keys)
+    return '.'.join(
+        str(values[key]) if key in values else str(_get(key))
+        for key in keys
+    )
@@ -0,0 +1,108 @@
+"""
+Справочник категорий расходов в памяти процесса.
+
+Категорий немного, и меняются они редко, поэтому каждый процесс держит
+их копию и перечитывает ее, только когда меняется версия справочников
+(CATALOG_SCOPE) в общем кэше. Сигналы изменения категорий повышают эту
+версию, и все воркеры перечитывают справочник при следующем обращении.
+Проверка версии — один ключ в кэше, без запроса к базе.
+
+Агрегаты группируют расходы по category_id, а названия и цвета
+подставляются из памяти (attach), без JOIN с pets_expensecategory.
+"""
+import threading
+from dataclasses import dataclass
+
+from .caching import CATALOG_SCOPE, get_scope_version
+from .models import ExpenseCategory
+
+_lock = threading.Lock()
+_state = (None, (), {})  # (версия, категории по названию, категории по id)
+
+
+@dataclass(frozen=True)
+class Category:
+    id: int
+    name: str
+    color: str
+    description: str
+
+    def __str__(self):
+        return self.name
+
+    def as_model(self):
+        """Несохраняемый экземпляр модели для присваивания внешним ключам"""
+        category = ExpenseCategory(id=self.id, name=self.name, color=self.color, description=self.description)
+        category._state.adding = False
+        return category
+
+
+def _load(version):
+    categories = tuple(
+        Category(*row) for row in ExpenseCategory.objects.order_by('name', 'id').values_list(
+            'id', 'name', 'color', 'description'
+        )
+    )
+    return version, categories, {category.id: category for category in categories}
+
+
+def _current():
+    global _state
+    version = get_scope_version(CATALOG_SCOPE)
+    state = _state
+    if state[0] != version:
+        with _lock:
+            if _state[0] != version:
+                _state = _load(version)
+            state = _state
+    return state
+
+
+def invalidate():
+    """Сбрасывает копию текущего процесса (остальные сверят версию)"""
+    global _state
+    _state = (None, (), {})
+
+
+def all_categories():
+    """Категории, отсортированные по названию"""
+    return _current()[1]
+
+
+def get_category(category_id):
+    return _current()[2].get(category_id)
+
+
+def category_ids():
+    return set(_current()[2])
+
+
+def category_names():
+    return {category.id: category.name for category in all_categories()}
+
+
+def attach(rows, key='category_id'):
+    """Добавляет category__name и category__color к строкам агрегатов по category_id"""
+    by_id = _current()[2]
+    for row in rows:
+        category = by_id.get(row[key])
+        row['category__name'] = category.name if category else None
+        row['category__color'] = category.color if category else None
+    return rows
+
+
+def attach_objects(objects):
+    """Заполняет obj.category (расходы, шаблоны, бюджеты) из справочника вместо JOIN"""
+    objects = list(objects)
+    by_id = _current()[2]
+    for obj in objects:
+        category = by_id.get(obj.category_id)
+        if category is not None:
+            obj.category = category.as_model()
+    return objects
+
+
+def matching_ids(query):
+    """id категорий, в названии которых есть query (без учета регистра)"""
+    query = query.casefold()
+    return [category.id for category in all_categories() if query in category.name.casefold()]
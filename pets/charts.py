@@ -0,0 +1,241 @@
+"""
+Графики аналитики на объектном API matplotlib (Figure + FigureCanvasAgg).
+
+pyplot хранит каждую фигуру в глобальном менеджере до plt.close(): если
+построение падает раньше, фигура остается в памяти навсегда, и долго
+живущий воркер постепенно растет. Здесь pyplot не используется: фигуры
+берутся из пула заготовок с нужным размером (FigurePool), после отрисовки
+очищаются и возвращаются в пул, а при ошибке просто отбрасываются.
+
+matplotlib не гарантирует потокобезопасность (общие кэши шрифтов и
+разметки текста), поэтому построение и отрисовка выполняются под общей
+блокировкой: графики строятся и из потоков gthread, и из пула задач.
+Отрисовка и так почти все время держит GIL, так что параллелизма это не
+отнимает.
+"""
+import base64
+import io
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db.models.functions import TruncDate, TruncMonth
+
+from . import categories as category_registry
+from .money import as_major_floats, to_minor
+
+logger = logging.getLogger(__name__)
+
+try:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    AVAILABLE = True
+except ImportError as e:
+    logger.error(f"Matplotlib import error: {e}")
+    AVAILABLE = False
+
+COLORS = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40']
+DPI = 80
+
+
+@dataclass(frozen=True)
+class ChartTemplate:
+    figsize: tuple
+    title_size: int = 14
+    grid: str = ''          # '', 'both' или 'y'
+    tight: bool = True      # tight_layout перед сохранением
+    bbox_inches: str = None
+
+
+TEMPLATES = {
+    'pie': ChartTemplate(figsize=(8, 8), tight=False, bbox_inches='tight'),
+    'line': ChartTemplate(figsize=(10, 5), grid='both'),
+    'bar': ChartTemplate(figsize=(10, 6), grid='y'),
+}
+
+_render_lock = threading.RLock()
+
+
+class FigurePool:
+    """Переиспользуемые фигуры по шаблонам; не больше size свободных на шаблон"""
+
+    def __init__(self, size):
+        self.size = size
+        self._free = {name: queue.LifoQueue(maxsize=size) for name in TEMPLATES}
+        self.created = 0
+
+    def acquire(self, name):
+        try:
+            return self._free[name].get_nowait()
+        except queue.Empty:
+            figure = Figure(figsize=TEMPLATES[name].figsize, dpi=DPI)
+            FigureCanvasAgg(figure)
+            self.created += 1
+            return figure
+
+    def release(self, name, figure):
+        # clear() отпускает оси и все нарисованное, размер и холст остаются
+        figure.clear()
+        try:
+            self._free[name].put_nowait(figure)
+        except queue.Full:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = FigurePool(settings.CHART_POOL_SIZE)
+    return _pool
+
+
+@contextmanager
+def chart(name, title):
+    """Оси оформленной по шаблону фигуры; по выходе фигура возвращается в пул.
+
+    Фигура, на которой построение упало, в пул не возвращается и
+    освобождается сборщиком мусора: на нее не ссылается ничего глобального.
+    """
+    template = TEMPLATES[name]
+    pool = get_pool()
+    with _render_lock:
+        figure = pool.acquire(name)
+        ax = figure.add_subplot()
+        ax.set_title(title, fontsize=template.title_size)
+        if template.grid:
+            ax.grid(True, axis=template.grid, alpha=0.3)
+        yield ax
+        pool.release(name, figure)
+
+
+def to_base64(ax, name):
+    """PNG фигуры осей ax в base64 (вызывается внутри chart())"""
+    template = TEMPLATES[name]
+    figure = ax.figure
+    if template.tight:
+        figure.tight_layout()
+    buf = io.BytesIO()
+    figure.savefig(buf, format='png', dpi=DPI, bbox_inches=template.bbox_inches)
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+
+def pie(labels, values, title):
+    with chart('pie', title) as ax:
+        ax.pie(values, labels=labels, colors=COLORS[:len(labels)], autopct='%1.1f%%', startangle=90)
+        ax.axis('equal')
+        return to_base64(ax, 'pie')
+
+
+def line(labels, values, title, xlabel, ylabel):
+    with chart('line', title) as ax:
+        ax.plot(labels, values, marker='o', linewidth=2, color='#36A2EB')
+        ax.fill_between(labels, values, alpha=0.2, color='#36A2EB')
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        for label in ax.get_xticklabels():
+            label.set_rotation(45)
+            label.set_horizontalalignment('right')
+        return to_base64(ax, 'line')
+
+
+def bar(labels, values, title, xlabel, ylabel, symbol=''):
+    with chart('bar', title) as ax:
+        bars = ax.bar(labels, values, color=COLORS[:len(labels)])
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        # Значения над столбцами
+        for item in bars:
+            height = item.get_height()
+            ax.text(item.get_x() + item.get_width() / 2., height, f'{height:,.0f}{symbol}',
+                    ha='center', va='bottom')
+        return to_base64(ax, 'bar')
+
+
+# ==================== ГРАФИКИ АНАЛИТИКИ ====================
+
+def category_chart(filtered_expenses, report):
+    """Круговая диаграмма по категориям"""
+    try:
+        category_data = sorted(
+            category_registry.attach(report.totals(filtered_expenses, 'category_id')),
+            key=lambda item: item['total'], reverse=True
+        )[:6]
+
+        categories = []
+        amounts = []
+        for item in category_data:
+            cat_name = item['category__name'] or 'Без категории'
+            categories.append(cat_name[:15])
+            amounts.append(to_minor(item['total']))
+
+        if not categories:
+            return None
+        return pie(categories, as_major_floats(amounts), 'Расходы по категориям')
+    except Exception as e:
+        logger.error(f"Error creating category chart: {e}")
+        return None
+
+
+def trend_chart(filtered_expenses, period, report):
+    """Линейный график по времени"""
+    try:
+        if period == 'week':
+            date_data = sorted(
+                report.totals(filtered_expenses.annotate(day=TruncDate('date')), 'day'),
+                key=lambda item: item['day']
+            )
+        else:
+            date_data = sorted(
+                report.totals(filtered_expenses.annotate(month=TruncMonth('date')), 'month'),
+                key=lambda item: item['month']
+            )
+
+        dates = []
+        amounts = []
+        for item in date_data:
+            if 'day' in item:
+                dates.append(item['day'].strftime('%d.%m'))
+            else:
+                dates.append(item['month'].strftime('%b %Y'))
+            amounts.append(to_minor(item['total']))
+
+        if len(dates) < 2:
+            return None
+        return line(dates, as_major_floats(amounts), 'Динамика расходов', 'Период', f'Сумма ({report.symbol})')
+    except Exception as e:
+        logger.error(f"Error creating trend chart: {e}")
+        return None
+
+
+def pet_chart(filtered_expenses, report):
+    """Столбчатая диаграмма по питомцам"""
+    try:
+        pet_data = sorted(
+            report.totals(filtered_expenses, 'pet__name'),
+            key=lambda item: item['total'], reverse=True
+        )[:5]
+
+        pet_names = []
+        pet_amounts = []
+        for item in pet_data:
+            name = item['pet__name'] or 'Без имени'
+            pet_names.append(name[:12])
+            pet_amounts.append(to_minor(item['total']))
+
+        if not pet_names:
+            return None
+        return bar(
+            pet_names, as_major_floats(pet_amounts), 'Расходы по питомцам',
+            'Питомец', f'Сумма ({report.symbol})', report.symbol,
+        )
+    except Exception as e:
+        logger.error(f"Error creating pet chart: {e}")
+        return None
@@ -0,0 +1,104 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) для тяжелых страниц.
+
+Валидатор владельца строится из максимального Expense.created_at (один
+индексируемый запрос), даты последнего курса валют и счетчика изменений
+из кэша. Если клиент прислал совпадающий валидатор, представление
+возвращает 304 до любых агрегатов и рендеринга.
+
+Страница может добавить к валидатору свою часть (owner_conditional(extra=...)),
+если ее содержимое меняется без изменения данных владельца — например,
+когда фоновая задача положила в кэш готовые графики.
+"""
+import datetime
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .caching import LATEST_RATE_DATE_KEY, get_data_version, get_owner_mutated_at
+from .models import Expense, ExchangeRate
+
+
+def latest_rate_date():
+    """Дата последнего курса валют (кэшируется до изменения курсов)"""
+    value = cache.get(LATEST_RATE_DATE_KEY)
+    if value is None:
+        value = ExchangeRate.objects.aggregate(latest=Max('date'))['latest'] or ''
+        cache.set(LATEST_RATE_DATE_KEY, value, timeout=None)
+    return value or None
+
+
+def _owner_validators(request, extra=None):
+    """Возвращает (etag, last_modified) для текущего пользователя.
+
+    Результат запоминается на объекте запроса, так как condition()
+    вызывает функции для ETag и Last-Modified по отдельности.
+    """
+    if hasattr(request, '_owner_validators'):
+        return request._owner_validators
+
+    validators = (None, None)
+    user = request.user
+    # Неотображенные сообщения должны попасть на страницу, поэтому 304 не отдаем
+    if user.is_authenticated and not len(get_messages(request)):
+        last_expense = Expense.objects.filter(
+            owner=user
+        ).aggregate(last=Max('created_at'))['last']
+        rate_date = latest_rate_date()
+        mutated_at = get_owner_mutated_at(user.pk)
+
+        etag_source = '|'.join(str(part) for part in [
+            user.pk,
+            get_data_version(user.pk),
+            last_expense.isoformat() if last_expense else '',
+            rate_date or '',
+            settings.TEMPLATE_CACHE_VERSION,
+            # Страница содержит CSRF-токен, привязанный к cookie
+            request.META.get('CSRF_COOKIE', ''),
+            extra(request) if extra else '',
+        ])
+        etag = hashlib.md5(etag_source.encode('utf-8'), usedforsecurity=False).hexdigest()
+
+        candidates = [last_expense]
+        if rate_date:
+            candidates.append(timezone.make_aware(
+                datetime.datetime.combine(rate_date, datetime.time.min)
+            ))
+        if mutated_at:
+            candidates.append(datetime.datetime.fromtimestamp(mutated_at, tz=datetime.timezone.utc))
+        candidates = [value for value in candidates if value is not None]
+        validators = (etag, max(candidates) if candidates else None)
+
+    request._owner_validators = validators
+    return validators
+
+
+def owner_conditional(view_func=None, *, extra=None):
+    """Декоратор: 304 Not Modified для неизменившихся данных владельца.
+
+    Ответ помечается как private с обязательной перепроверкой, чтобы
+    браузер хранил копию, но каждый раз сверял валидатор с сервером.
+    extra(request) — строка, которая входит в ETag вместе с данными владельца.
+    """
+    def etag_func(request, *args, **kwargs):
+        return _owner_validators(request, extra)[0]
+
+    def last_modified_func(request, *args, **kwargs):
+        return _owner_validators(request, extra)[1]
+
+    def decorator(view_func):
+        @wraps(view_func)
+        @cache_control(private=True, no_cache=True)
+        @condition(etag_func=etag_func, last_modified_func=last_modified_func)
+        def wrapper(request, *args, **kwargs):
+            return view_func(request, *args, **kwargs)
+        return wrapper
+
+    return decorator(view_func) if view_func is not None else decorator
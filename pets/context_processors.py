@@ -0,0 +1,25 @@
+from django.conf import settings
+
+from .caching import get_data_version
+from .reporting import get_reporting_currency
+from .money import currency_symbol
+
+
+def cache_versions(request):
+    """Версии для ключей кэша фрагментов шаблонов"""
+    user = getattr(request, 'user', None)
+    owner_id = user.pk if user is not None and user.is_authenticated else None
+    return {
+        'data_cache_version': get_data_version(owner_id),
+        'template_cache_version': settings.TEMPLATE_CACHE_VERSION,
+        'fragment_cache_timeout': settings.TEMPLATE_FRAGMENT_CACHE_TIMEOUT,
+    }
+
+
+def reporting(request):
+    """Валюта отчетов текущего пользователя"""
+    currency = get_reporting_currency(getattr(request, 'user', None))
+    return {
+        'reporting_currency': currency,
+        'currency_symbol': currency_symbol(currency),
+    }
@@ -0,0 +1,102 @@
+"""
+Маршрутизация чтения на реплики базы данных.
+
+Представления только для чтения (см. REPLICA_READ_VIEWS) выполняют запросы
+на одной из реплик. Запись всегда идет в основную базу. После POST клиент
+на короткое время «прилипает» к основной базе, чтобы видеть свои изменения.
+Отстающая или недоступная реплика исключается до следующей проверки.
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# Псевдоним базы для чтения в текущем запросе (None — основная база)
+_read_alias = ContextVar('pets_read_alias', default=None)
+
+# Модели, которые всегда читаются из основной базы: очередь задач меняется
+# каждую секунду, и отставание реплики ломает дедупликацию и опрос статуса
+PRIMARY_ONLY_MODELS = {'pets.task'}
+# Приложения целиком в основной базе. DatabaseCache передает роутеру
+# псевдомодель без label_lower; кэш пишется на каждом запросе, и чтение с
+# реплики возвращало бы устаревшие версии данных
+PRIMARY_ONLY_APPS = {'django_cache'}
+
+# Кэш состояния реплик внутри процесса: alias -> (время проверки, годна ли)
+_replica_health = {}
+
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def set_read_alias(alias):
+    """Назначает базу для чтения в текущем контексте выполнения"""
+    return _read_alias.set(alias)
+
+
+def get_read_alias():
+    return _read_alias.get()
+
+
+def replica_lag(alias):
+    """Отставание реплики в секундах (для не-PostgreSQL всегда 0)"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        return float(cursor.fetchone()[0])
+
+
+def is_replica_healthy(alias):
+    """Проверяет реплику не чаще раза в REPLICA_LAG_CHECK_INTERVAL секунд"""
+    now = time.monotonic()
+    checked_at, healthy = _replica_health.get(alias, (None, False))
+    if checked_at is not None and now - checked_at < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return healthy
+
+    try:
+        lag = replica_lag(alias)
+        healthy = lag <= settings.REPLICA_MAX_LAG_SECONDS
+        if not healthy:
+            logger.warning(f"Replica {alias} lags by {lag:.1f}s, reading from primary")
+    except Exception as e:
+        logger.warning(f"Replica {alias} is unavailable: {e}")
+        healthy = False
+
+    _replica_health[alias] = (now, healthy)
+    return healthy
+
+
+def choose_replica():
+    """Случайная исправная реплика или None, если таких нет"""
+    candidates = [alias for alias in settings.REPLICA_DATABASES if is_replica_healthy(alias)]
+    return random.choice(candidates) if candidates else None
+
+
+class ReplicaRouter:
+    """Чтение — на реплику, назначенную middleware; запись — в основную базу"""
+
+    def db_for_read(self, model, **hints):
+        app_label = getattr(model._meta, 'app_label', '')
+        model_name = getattr(model._meta, 'model_name', '')
+        if app_label in PRIMARY_ONLY_APPS or f'{app_label}.{model_name}' in PRIMARY_ONLY_MODELS:
+            return None
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Все базы содержат одни и те же данные
+        return True
@@ -0,0 +1,183 @@
+"""
+Выгрузка расходов в файл фоновой задачей.
+
+Большая выгрузка не держит веб-воркер на время скачивания: пользователь
+запрашивает ее (request_export), задача exports.build читает расходы
+порциями через серверный курсор и пишет сжатый gzip файл в хранилище, а
+пользователь получает ссылку. Ссылка действует EXPORT_TTL_HOURS, после чего
+файл удаляет задача exports.expire. Если ее отложенный запуск потерялся
+(перезапуск веб-процесса при TASK_BACKEND=thread), просроченные выгрузки
+удаляет периодическое обслуживание очереди (cleanup) или manage.py cleanup_exports.
+
+Повторный запрос того же формата при неизменных данных владельца
+возвращает уже готовую или строящуюся выгрузку.
+"""
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from . import queue
+from .caching import get_data_version
+from .categories import category_names
+from .models import Expense, Export, Task
+from .money import RateCalendar, from_minor, to_minor
+
+HEADER = ['Дата', 'Питомец', 'Категория', 'Сумма', 'Валюта', 'Сумма (RUB)', 'Описание']
+JSON_FIELDS = ['date', 'pet', 'category', 'amount', 'currency', 'amount_rub', 'description']
+FILE_NAMES = {'csv': 'pet_expenses.csv.gz', 'jsonl': 'pet_expenses.jsonl.gz'}
+
+
+def expense_rows(queryset):
+    """Строки выгрузки без заголовка; курсы и категории читаются один раз"""
+    rates = RateCalendar.for_queryset(queryset)
+    rows = queryset.order_by('date', 'id').values_list(
+        'date', 'pet__name', 'category_id', 'amount', 'currency', 'description'
+    ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    names = category_names()
+    for date, pet_name, category_id, amount, currency, description in rows:
+        yield [
+            date.strftime('%Y-%m-%d') if date else '',
+            pet_name or 'Не указан',
+            names.get(category_id) or 'Без категории',
+            amount,
+            currency,
+            from_minor(rates.to_rub_minor(to_minor(amount), currency, date)),
+            description or '',
+        ]
+
+
+def write_csv(handle, rows):
+    writer = csv.writer(handle)
+    writer.writerow(HEADER)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(handle, rows):
+    count = 0
+    for row in rows:
+        record = dict(zip(JSON_FIELDS, row))
+        record['amount'] = str(record['amount'])
+        record['amount_rub'] = str(record['amount_rub'])
+        handle.write(json.dumps(record, ensure_ascii=False))
+        handle.write('\n')
+        count += 1
+    return count
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl}
+
+
+def request_export(owner_id, fmt):
+    """Выгрузка владельца в формате fmt: готовая, строящаяся или новая"""
+    if fmt not in WRITERS:
+        raise ValueError(f'Unknown export format: {fmt}')
+    version = str(get_data_version(owner_id))
+    existing = Export.objects.filter(
+        owner_id=owner_id, format=fmt, data_version=version, expires_at__gt=timezone.now(),
+    ).exclude(task__status=Task.FAILED).select_related('task').first()
+    if existing is not None:
+        return existing
+
+    with transaction.atomic():
+        export = Export.objects.create(
+            owner_id=owner_id,
+            format=fmt,
+            data_version=version,
+            expires_at=timezone.now() + timedelta(hours=settings.EXPORT_TTL_HOURS),
+        )
+        export.task = queue.enqueue('exports.build', {'export_id': export.pk}, owner_id=owner_id)
+        export.save(update_fields=['task'])
+    return export
+
+
+def build(export_id):
+    """Пишет файл выгрузки порциями во временный файл и сохраняет в хранилище"""
+    export = Export.objects.filter(pk=export_id).first()
+    if export is None or export.is_expired:
+        return {'skipped': True}
+
+    write = WRITERS[export.format]
+    with tempfile.TemporaryFile() as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as compressed:
+            text = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+            rows = write(text, expense_rows(Expense.objects.filter(owner_id=export.owner_id)))
+            text.flush()
+            text.detach()
+        size = raw.tell()
+        raw.seek(0)
+        export.file.save(f'{export.owner_id}/{export.token}.{export.format}.gz', File(raw), save=False)
+    export.size = size
+    export.rows = rows
+    export.save(update_fields=['file', 'size', 'rows'])
+
+    delay = max((export.expires_at - timezone.now()).total_seconds(), 0)
+    queue.enqueue('exports.expire', {'export_id': export.pk}, unique_key=f'export-expire:{export.pk}', delay=delay)
+    return {'rows': rows, 'size': size}
+
+
+def delete_export(export):
+    if export.file:
+        export.file.delete(save=False)
+    export.delete()
+
+
+def cleanup(now=None):
+    """Удаляет просроченные выгрузки вместе с файлами; возвращает их число"""
+    now = now or timezone.now()
+    expired = list(Export.objects.filter(expires_at__lte=now))
+    for export in expired:
+        delete_export(export)
+    return len(expired)
+
+
+def parse_range(header, size):
+    """(начало, конец включительно) из заголовка Range: bytes=... или None.
+
+    Поддерживается один диапазон; для недопустимого ValueError (ответ 416).
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, _, end = header[len('bytes='):].strip().partition('-')
+    try:
+        if start:
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        else:
+            # bytes=-N — последние N байт
+            length = int(end)
+            if length <= 0:
+                raise ValueError(header)
+            start, end = max(size - length, 0), size - 1
+    except ValueError:
+        raise ValueError(header)
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def iter_file(handle, start, length, chunk_size=64 * 1024):
+    """Читает length байт с позиции start порциями"""
+    handle.seek(start)
+    remaining = length
+    try:
+        while remaining > 0:
+            chunk = handle.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
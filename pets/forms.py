@@ -1,6 +1,45 @@
 from django import forms
 from django.forms import DateInput
-from .models import Pet, Expense, ExpenseCategory
+from django.forms.models import ModelChoiceIterator
+from .categories import all_categories, get_category
+from .models import Pet, Expense, ExpenseCategory, Budget, RecurringExpense, UserPreferences
+
+
+class CategoryChoiceIterator(ModelChoiceIterator):
+    """Варианты из справочника категорий; читаются при каждом выводе формы"""
+    
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for category in all_categories():
+            yield (category.id, category.name)
+    
+    def __len__(self):
+        return len(all_categories()) + (self.field.empty_label is not None)
+    
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(all_categories())
+
+
+class CategoryChoiceField(forms.ModelChoiceField):
+    """Выбор категории из справочника в памяти: без запросов при выводе и проверке"""
+    iterator = CategoryChoiceIterator
+    
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, ExpenseCategory):
+            return value
+        try:
+            category = get_category(int(value))
+        except (TypeError, ValueError):
+            category = None
+        if category is None:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value}
+            )
+        return category.as_model()
+
 
 class PetForm(forms.ModelForm):
     class Meta:
@@ -21,6 +60,7 @@ class PetForm(forms.ModelForm):
 class ExpenseForm(forms.ModelForm):
     class Meta:
         model = Expense
+        field_classes = {'category': CategoryChoiceField}
         fields = ['pet', 'category', 'amount', 'currency', 'date', 'description', 'receipt']
         widgets = {
             'date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
@@ -54,4 +94,75 @@ class ExpenseForm(forms.ModelForm):
             self.fields['pet'].queryset = Pet.objects.filter(owner=user)
             
             # Добавляем placeholder для валюты
-            self.fields['currency'].widget.attrs.update({'class': 'form-select'})
\ No newline at end of file
+            self.fields['currency'].widget.attrs.update({'class': 'form-select'})
+
+
+class BudgetForm(forms.ModelForm):
+    class Meta:
+        model = Budget
+        field_classes = {'category': CategoryChoiceField}
+        fields = ['pet', 'category', 'monthly_limit']
+        widgets = {
+            'monthly_limit': forms.NumberInput(attrs={'step': '0.01', 'min': '0.01'}),
+        }
+        help_texts = {
+            'pet': 'Оставьте пустым, чтобы учитывать всех питомцев',
+            'category': 'Оставьте пустым, чтобы учитывать все категории',
+        }
+    
+    def __init__(self, *args, **kwargs):
+        self.user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        if self.user:
+            self.fields['pet'].queryset = Pet.objects.filter(owner=self.user)
+        for field in self.fields.values():
+            field.widget.attrs['class'] = 'form-control'
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.user and Budget.objects.filter(
+            owner=self.user,
+            pet=cleaned_data.get('pet'),
+            category=cleaned_data.get('category'),
+        ).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError('Бюджет для этого питомца и категории уже есть')
+        return cleaned_data
+
+
+class RecurringExpenseForm(forms.ModelForm):
+    class Meta:
+        model = RecurringExpense
+        field_classes = {'category': CategoryChoiceField}
+        fields = ['pet', 'category', 'amount', 'currency', 'frequency', 'interval',
+                  'start_date', 'end_date', 'description']
+        widgets = {
+            'amount': forms.NumberInput(attrs={'step': '0.01', 'min': '0.01'}),
+            'start_date': DateInput(attrs={'type': 'date'}),
+            'end_date': DateInput(attrs={'type': 'date'}),
+            'description': forms.Textarea(attrs={'rows': 2}),
+        }
+    
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        if user:
+            self.fields['pet'].queryset = Pet.objects.filter(owner=user)
+        for field in self.fields.values():
+            field.widget.attrs['class'] = 'form-select' if isinstance(field.widget, forms.Select) else 'form-control'
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        if start_date and end_date and end_date < start_date:
+            self.add_error('end_date', 'Последняя дата раньше первой')
+        return cleaned_data
+
+
+class UserPreferencesForm(forms.ModelForm):
+    class Meta:
+        model = UserPreferences
+        fields = ['reporting_currency']
+        widgets = {
+            'reporting_currency': forms.Select(attrs={'class': 'form-select'}),
+        }
@@ -0,0 +1,98 @@
+import datetime
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from pets.analytics import NUMPY_AVAILABLE, compute_report, load_extract
+from pets.models import Expense, ExpenseCategory, Pet
+
+# Валюты засеянных расходов: в основном рубли, часть — с пересчетом по курсу
+SEED_CURRENCIES = ['RUB'] * 8 + ['USD', 'EUR']
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет аналитику владельца: выгрузку из базы (load_extract) и векторизованный '
+        'расчет (compute_report). Без --owner засевает расходы во временной транзакции'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Количество засеваемых расходов')
+        parser.add_argument('--years', type=int, default=5, help='Глубина истории в годах')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество повторов')
+        parser.add_argument('--owner', type=int, help='id владельца: замер на его данных без засева')
+        parser.add_argument('--currency', default='RUB', help='Валюта отчетов')
+
+    def handle(self, *args, **options):
+        if not NUMPY_AVAILABLE:
+            raise CommandError('NumPy не установлен')
+
+        if options['owner'] is not None:
+            self._bench(options['owner'], options)
+            return
+
+        # Засеянные строки не остаются в базе: транзакция откатывается
+        with transaction.atomic():
+            owner_id = self._seed(options['rows'], options['years'])
+            self._bench(owner_id, options)
+            transaction.set_rollback(True)
+
+    def _seed(self, rows, years):
+        import numpy as np
+
+        owner = get_user_model().objects.create_user(f'bench-analytics-{time.time_ns()}')
+        pets = Pet.objects.bulk_create([
+            Pet(name=f'Питомец {i}', species='dog', owner=owner) for i in range(5)
+        ])
+        categories = list(ExpenseCategory.objects.order_by('pk')[:10]) or ExpenseCategory.objects.bulk_create([
+            ExpenseCategory(name=f'Категория {i}') for i in range(10)
+        ])
+
+        rng = np.random.default_rng(42)
+        start = datetime.date.today() - datetime.timedelta(days=365 * years)
+        offsets = rng.integers(0, 365 * years, rows).tolist()
+        kopecks = rng.integers(100, 500_000, rows).tolist()
+        pet_index = rng.integers(0, len(pets), rows).tolist()
+        category_index = rng.integers(0, len(categories), rows).tolist()
+        currency_index = rng.integers(0, len(SEED_CURRENCIES), rows).tolist()
+
+        started = time.perf_counter()
+        # bulk_create не вызывает save() и сигналы: владелец задается явно
+        Expense.objects.bulk_create((
+            Expense(
+                owner_id=owner.pk,
+                pet=pets[pet_index[i]],
+                category=categories[category_index[i]],
+                amount=Decimal(kopecks[i]) / 100,
+                currency=SEED_CURRENCIES[currency_index[i]],
+                date=start + datetime.timedelta(days=offsets[i]),
+            )
+            for i in range(rows)
+        ), batch_size=5000)
+        self.stdout.write(f'Засеяно {rows} расходов за {time.perf_counter() - started:.1f} с')
+        return owner.pk
+
+    def _bench(self, owner_id, options):
+        load_timings, compute_timings = [], []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            extract = load_extract(owner_id, options['currency'])
+            loaded = time.perf_counter()
+            report = compute_report(extract)
+            load_timings.append(loaded - started)
+            compute_timings.append(time.perf_counter() - loaded)
+
+        self.stdout.write(
+            f"{len(extract)} строк, {len(report['monthly'])} месяцев, "
+            f"{len(report['seasonality'])} категорий"
+        )
+        for title, timings in (('load_extract', load_timings), ('compute_report', compute_timings)):
+            self.stdout.write(
+                f"  {title:<15} лучшее {min(timings) * 1000:8.1f} мс, "
+                f"среднее {sum(timings) / len(timings) * 1000:8.1f} мс"
+            )
+        total = min(load_timings) + min(compute_timings)
+        self.stdout.write(self.style.SUCCESS(f'Отчет целиком (лучшее): {total * 1000:.1f} мс'))
@@ -0,0 +1,104 @@
+import statistics
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from pets.auth import ConfigurablePBKDF2PasswordHasher, invalidate_user
+
+PROFILES = [
+    ('db + ModelBackend', 'db', 'django.contrib.auth.backends.ModelBackend'),
+    ('cached_db + CachedModelBackend', 'cached_db', 'pets.auth.CachedModelBackend'),
+    ('signed_cookies + CachedModelBackend', 'signed_cookies', 'pets.auth.CachedModelBackend'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Замеряет стоимость хэша пароля и аутентификации запроса по сессии'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, nargs='*',
+                            help='Варианты числа итераций PBKDF2 (по умолчанию настроенное и значение Django)')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Количество имитируемых запросов на профиль сессий')
+        parser.add_argument('--username', help='Пользователь для сессии (по умолчанию первый активный)')
+
+    def handle(self, *args, **options):
+        self._bench_hashers(options['iterations'])
+        self._bench_sessions(options['username'], options['requests'])
+
+    def _bench_hashers(self, variants):
+        configured = ConfigurablePBKDF2PasswordHasher().iterations
+        variants = variants or sorted({configured, PBKDF2PasswordHasher.iterations}, reverse=True)
+        self.stdout.write('Проверка пароля (PBKDF2-SHA256):')
+        for iterations in variants:
+            hasher = PBKDF2PasswordHasher()
+            encoded = hasher.encode('benchmark-password', hasher.salt(), iterations)
+            timings = []
+            for _ in range(3):
+                started = time.perf_counter()
+                hasher.verify('benchmark-password', encoded)
+                timings.append((time.perf_counter() - started) * 1000)
+            marker = ' (настроено)' if iterations == configured else ''
+            self.stdout.write(f"  {iterations:>9} итераций: {min(timings):8.1f} мс{marker}")
+
+    def _bench_sessions(self, username, requests):
+        users = get_user_model().objects.filter(is_active=True)
+        user = users.filter(username=username).first() if username else users.order_by('pk').first()
+        if user is None:
+            raise CommandError('Нет активного пользователя для сессии')
+
+        self.stdout.write(f'Аутентифицированный запрос (пользователь {user.get_username()}):')
+        factory = RequestFactory()
+        for title, engine, backend in PROFILES:
+            # Замер идет в одном процессе, поэтому кэш в памяти здесь равноценен общему
+            with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}',
+                                   AUTHENTICATION_BACKENDS=[backend], SHARED_CACHE=True):
+                store_class = import_module(f'django.contrib.sessions.backends.{engine}').SessionStore
+                session = store_class()
+                session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+                session[BACKEND_SESSION_KEY] = backend
+                session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+                session.save()
+                invalidate_user(user.pk)
+                try:
+                    timings, queries = self._simulate(factory, session.session_key, requests)
+                finally:
+                    session.delete()
+            self.stdout.write(
+                f"  {title:<38} запросов к базе {queries}, "
+                f"среднее {statistics.mean(timings):7.3f} мс"
+            )
+
+    def _simulate(self, factory, session_key, requests):
+        """SessionMiddleware + AuthenticationMiddleware вокруг пустого представления"""
+        def view(request):
+            if not request.user.is_authenticated:
+                raise CommandError('Сессия не аутентифицировала пользователя')
+            return HttpResponse()
+
+        handler = SessionMiddleware(AuthenticationMiddleware(view))
+        handler(self._request(factory, session_key))  # прогрев кэшей
+
+        timings = []
+        with CaptureQueriesContext(connection) as captured:
+            for _ in range(requests):
+                started = time.perf_counter()
+                handler(self._request(factory, session_key))
+                timings.append((time.perf_counter() - started) * 1000)
+        return timings, len(captured.captured_queries) // requests
+
+    @staticmethod
+    def _request(factory, session_key):
+        request = factory.get('/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = session_key
+        return request
@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает стоимость запроса с новым и с переиспользуемым соединением'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Количество имитируемых запросов')
+        parser.add_argument('--database', default='default',
+                            help='Псевдоним базы данных')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        original_max_age = connection.settings_dict['CONN_MAX_AGE']
+        uses_pool = 'pool' in connection.settings_dict.get('OPTIONS', {})
+
+        try:
+            results = [
+                ('Новое соединение на запрос', self._simulate(connection, 0, options['requests'])),
+                ('Постоянное соединение', self._simulate(connection, 600, options['requests'])),
+            ]
+        finally:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = original_max_age
+
+        self.stdout.write(f"База: {options['database']} ({connection.vendor})"
+                          f"{', пул psycopg' if uses_pool else ''}")
+        for title, timings in results:
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            self.stdout.write(
+                f"{title:<28} среднее {statistics.mean(timings):7.3f} мс, p95 {p95:7.3f} мс"
+            )
+
+        saved = statistics.mean(results[0][1]) - statistics.mean(results[1][1])
+        self.stdout.write(self.style.SUCCESS(
+            f"Установка соединения на запрос стоит ~{saved:.3f} мс"
+        ))
+
+    def _simulate(self, connection, conn_max_age, requests):
+        """Повторяет жизненный цикл запроса Django: request_started → SQL → request_finished"""
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            close_old_connections()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            close_old_connections()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
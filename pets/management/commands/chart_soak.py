@@ -0,0 +1,98 @@
+import gc
+import random
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pets import charts
+
+PETS = ['Барсик', 'Рекс', 'Мурка', 'Шарик', 'Кеша']
+CATEGORIES = ['Корм', 'Ветеринар', 'Игрушки', 'Аксессуары', 'Груминг', 'Лекарства']
+MONTHS = ['Янв', 'Фев', 'Мар', 'Апр', 'Май', 'Июн', 'Июл', 'Авг', 'Сен', 'Окт', 'Ноя', 'Дек']
+
+
+def rss_mb():
+    """Текущий RSS процесса (Linux), иначе пиковый из getrusage"""
+    try:
+        with open('/proc/self/status') as handle:
+            for line in handle:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def render(i):
+    """Один график по очереди каждого шаблона на случайных данных"""
+    rng = random.Random(i)
+    kind = i % 3
+    if kind == 0:
+        labels = rng.sample(CATEGORIES, rng.randint(2, len(CATEGORIES)))
+        return charts.pie(labels, [rng.uniform(100, 5000) for _ in labels], 'Расходы по категориям')
+    if kind == 1:
+        labels = MONTHS[:rng.randint(2, len(MONTHS))]
+        return charts.line(labels, [rng.uniform(100, 5000) for _ in labels], 'Динамика расходов', 'Период', 'Сумма (₽)')
+    labels = rng.sample(PETS, rng.randint(1, len(PETS)))
+    return charts.bar(labels, [rng.uniform(100, 5000) for _ in labels], 'Расходы по питомцам', 'Питомец', 'Сумма (₽)', '₽')
+
+
+def render_failing(i):
+    """Построение, падающее посреди отрисовки: фигура не должна утечь"""
+    try:
+        with charts.chart('bar', 'Ошибка') as ax:
+            ax.bar(PETS, range(len(PETS)))
+            raise RuntimeError(i)
+    except RuntimeError:
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный прогон графиков: проверяет, что RSS не растет за много отрисовок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=10000, help='Число отрисовок')
+        parser.add_argument('--threads', type=int, default=1, help='Потоков отрисовки (как в gthread)')
+        parser.add_argument('--fail-every', type=int, default=50,
+                            help='Каждая N-я отрисовка падает с исключением (0 — без ошибок)')
+        parser.add_argument('--warmup', type=int, default=1000,
+                            help='Отрисовок до замера исходного RSS (кэши шрифтов и т.п.)')
+        parser.add_argument('--max-growth', type=float, default=10.0,
+                            help='Допустимый рост RSS после прогрева, МБ')
+
+    def handle(self, *args, renders, threads, fail_every, warmup, max_growth, **options):
+        if not charts.AVAILABLE:
+            raise CommandError('matplotlib не установлен')
+
+        def step(i):
+            if fail_every and i % fail_every == fail_every - 1:
+                return render_failing(i)
+            return render(i)
+
+        with ThreadPoolExecutor(max_workers=max(threads, 1)) as executor:
+            list(executor.map(step, range(warmup)))
+            gc.collect()
+            baseline = rss_mb()
+            self.stdout.write(f'После прогрева ({warmup} отрисовок): RSS {baseline:.1f} МБ')
+
+            started = time.perf_counter()
+            checkpoint = max(renders // 10, 1)
+            done = 0
+            while done < renders:
+                batch = min(checkpoint, renders - done)
+                list(executor.map(step, range(warmup + done, warmup + done + batch)))
+                done += batch
+                self.stdout.write(f'  {done:>6}: RSS {rss_mb():.1f} МБ')
+            elapsed = time.perf_counter() - started
+
+        gc.collect()
+        growth = rss_mb() - baseline
+        self.stdout.write(
+            f'{renders} отрисовок за {elapsed:.1f} с ({renders / elapsed:.0f}/с), '
+            f'создано фигур: {charts.get_pool().created}, рост RSS: {growth:+.1f} МБ'
+        )
+        if growth > max_growth:
+            raise CommandError(f'RSS вырос на {growth:.1f} МБ (допустимо {max_growth} МБ)')
+        self.stdout.write(self.style.SUCCESS('Память стабильна'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pets import exports
+
+
+class Command(BaseCommand):
+    help = 'Удаляет выгрузки с истекшим сроком ссылки вместе с файлами'
+
+    def handle(self, *args, **options):
+        deleted = exports.cleanup()
+        self.stdout.write(self.style.SUCCESS(f'Удалено выгрузок: {deleted}'))
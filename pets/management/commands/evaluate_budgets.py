@@ -0,0 +1,31 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from pets.budgets import evaluate_all, rebuild_owner_totals
+from pets.models import Budget
+
+
+class Command(BaseCommand):
+    help = 'Ночная проверка бюджетов всех владельцев'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=datetime.date.fromisoformat, default=None,
+                            help='Любая дата проверяемого месяца (по умолчанию — текущий)')
+        parser.add_argument('--workers', type=int, default=4, help='Количество потоков')
+        parser.add_argument('--chunk-size', type=int, default=100, help='Владельцев в одной порции')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Сначала пересчитать накопленные суммы с нуля')
+
+    def handle(self, *args, month, workers, chunk_size, rebuild, **options):
+        started = time.perf_counter()
+        if rebuild:
+            owner_ids = Budget.objects.values_list('owner_id', flat=True).distinct()
+            for owner_id in owner_ids:
+                rebuild_owner_totals(owner_id)
+        owners, created = evaluate_all(month, workers=workers, chunk_size=chunk_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"Проверено владельцев: {owners}, новых превышений: {created} "
+            f"({time.perf_counter() - started:.2f} с)"
+        ))
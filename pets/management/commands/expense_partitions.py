@@ -0,0 +1,97 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from pets import partitioning
+from pets.models import Expense
+from pets.views import _get_period_dates
+
+PERIODS = ('week', 'month', 'year')
+
+
+class Command(BaseCommand):
+    help = 'Управление секциями таблицы расходов (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        subparsers.add_parser('status', help='Показать секции')
+
+        convert = subparsers.add_parser('convert', help='Секционировать таблицу с переносом данных')
+        convert.add_argument('--granularity', choices=partitioning.GRANULARITIES,
+                             default=settings.EXPENSE_PARTITIONING or 'year')
+
+        subparsers.add_parser('revert', help='Вернуть обычную таблицу')
+
+        ensure = subparsers.add_parser('ensure', help='Создать секции на будущие периоды')
+        ensure.add_argument('--ahead', type=int, default=1,
+                            help='Сколько периодов вперед от текущего создать')
+
+        archive = subparsers.add_parser('archive', help='Отсоединить старые секции')
+        archive.add_argument('--before', required=True, type=datetime.date.fromisoformat,
+                             help='Секции, закончившиеся до этой даты (YYYY-MM-DD)')
+        archive.add_argument('--drop', action='store_true', help='Удалить вместо переименования')
+
+        explain = subparsers.add_parser('explain', help='Проверить отсечение секций в аналитике')
+        explain.add_argument('--owner', type=int, required=True, help='ID владельца')
+
+    def handle(self, *args, **options):
+        if not partitioning.is_supported(connection):
+            raise CommandError('Секционирование поддерживается только на PostgreSQL')
+        getattr(self, f"handle_{options['action']}")(**options)
+
+    def handle_status(self, **options):
+        with connection.cursor() as cursor:
+            if not partitioning.is_partitioned(cursor):
+                self.stdout.write('Таблица pets_expense не секционирована')
+                return
+            for name, start, end in partitioning.list_partitions(cursor):
+                cursor.execute(f'SELECT COUNT(*) FROM {name}')
+                count = cursor.fetchone()[0]
+                bounds = f'{start} — {end}' if start else 'DEFAULT'
+                self.stdout.write(f'{name:<32} {bounds:<26} {count} строк')
+
+    def handle_convert(self, granularity, **options):
+        with transaction.atomic():
+            converted = partitioning.partition_table(connection, granularity)
+        self.stdout.write(self.style.SUCCESS('Готово') if converted else 'Таблица уже секционирована')
+
+    def handle_revert(self, **options):
+        with transaction.atomic():
+            reverted = partitioning.unpartition_table(connection)
+        self.stdout.write(self.style.SUCCESS('Готово') if reverted else 'Таблица не секционирована')
+
+    def handle_ensure(self, ahead, **options):
+        with connection.cursor() as cursor:
+            partitions = partitioning.list_partitions(cursor) if partitioning.is_partitioned(cursor) else []
+        granularity = partitioning.detect_granularity(partitions)
+        through = partitioning.period_start(datetime.date.today(), granularity)
+        for _ in range(ahead):
+            through = partitioning.next_period(through, granularity)
+        with transaction.atomic():
+            created = partitioning.ensure_partitions(connection, through, granularity)
+        self.stdout.write(f"Создано секций: {len(created)} {', '.join(created)}")
+
+    def handle_archive(self, before, drop, **options):
+        with transaction.atomic():
+            archived = partitioning.archive_partitions(connection, before, drop=drop)
+        self.stdout.write(f"Отсоединено секций: {len(archived)} {', '.join(archived)}")
+
+    def handle_explain(self, owner, **options):
+        """Печатает, какие секции читает аналитика для каждого периода"""
+        with connection.cursor() as cursor:
+            all_partitions = [name for name, _, _ in partitioning.list_partitions(cursor)]
+
+        for period in PERIODS:
+            start_date, end_date = _get_period_dates(period)
+            queryset = Expense.objects.filter(
+                owner_id=owner, date__range=(start_date, end_date)
+            ).values('category__name')
+            scanned = partitioning.scanned_partitions(queryset)
+            style = self.style.SUCCESS if len(scanned) < len(all_partitions) else self.style.WARNING
+            self.stdout.write(style(
+                f"{period:<6} {start_date} — {end_date}: {len(scanned)} из {len(all_partitions)} секций "
+                f"({', '.join(scanned)})"
+            ))
@@ -0,0 +1,57 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from pets import queue, rates
+
+
+class Command(BaseCommand):
+    help = 'Загружает курсы валют и пересчитывает затронутые суммы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=sorted(rates.SOURCES), default=None,
+                            help='Тип источника (по умолчанию RATES_SOURCE)')
+        parser.add_argument('--location', default=None,
+                            help='Файл или URL (по умолчанию RATES_LOCATION)')
+        parser.add_argument('--start', type=datetime.date.fromisoformat, default=None,
+                            help='Первая дата (YYYY-MM-DD)')
+        parser.add_argument('--end', type=datetime.date.fromisoformat, default=None,
+                            help='Последняя дата (по умолчанию — сегодня)')
+        parser.add_argument('--days', type=int, default=7,
+                            help='Глубина загрузки, если --start не указан')
+        parser.add_argument('--currency', action='append', dest='currencies',
+                            help='Валюта (можно несколько раз)')
+        parser.add_argument('--refresh', action='store_true',
+                            help='Перечитать и уже загруженные даты')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать изменения')
+        parser.add_argument('--enqueue', action='store_true',
+                            help='Поставить загрузку в очередь фоновых задач и выйти')
+
+    def handle(self, *args, source, location, start, end, days, currencies, refresh, dry_run, enqueue, **options):
+        end = end or timezone.localdate()
+        start = start or end - datetime.timedelta(days=days - 1)
+        if start > end:
+            raise CommandError('--start позже --end')
+        if enqueue:
+            job = queue.enqueue('rates.ingest', {
+                'start': start.isoformat(), 'end': end.isoformat(), 'source': source,
+                'location': location, 'currencies': currencies, 'only_missing': not refresh,
+            })
+            self.stdout.write(self.style.SUCCESS(f'Задача #{job.pk} поставлена в очередь'))
+            return
+        try:
+            rate_source = rates.get_source(source, location)
+            result = rates.ingest(
+                rate_source, start, end, currencies=currencies,
+                only_missing=not refresh, dry_run=dry_run,
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Не удалось загрузить курсы: {e}')
+
+        prefix = 'Проверка: ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}дат {result.requested}, котировок {result.fetched}, "
+            f"новых курсов {result.created}, измененных {result.updated}, "
+            f"затронуто владельцев {len(result.owners)}"
+        ))
@@ -0,0 +1,183 @@
+import http.client
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+DEFAULT_PAGES = ['pets:home', 'pets:pet_list', 'pets:expense_list', 'pets:analytics']
+
+# Окружение gunicorn.conf.py для каждого сравниваемого режима
+PROFILES = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_PRELOAD': 'false'},
+    'sync-preload': {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_PRELOAD': 'true'},
+    'gthread-preload': {'GUNICORN_WORKER_CLASS': 'gthread', 'GUNICORN_PRELOAD': 'true'},
+    'uvicorn-preload': {'GUNICORN_WORKER_CLASS': 'uvicorn', 'GUNICORN_PRELOAD': 'true'},
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def process_tree(pid):
+    """pid процесса и всех его потомков (Linux, /proc)"""
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f'/proc/{current}/task/{current}/children') as handle:
+                pids.extend(int(child) for child in handle.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def memory_kb(pid, field):
+    """Поле Rss/Pss из smaps_rollup процесса в КБ (0, если недоступно)"""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as handle:
+            for line in handle:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочное сравнение режимов gunicorn (sync, preload, gthread, uvicorn): RPS, задержки, память'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pages', nargs='*',
+                            help='Имена URL или пути (по умолчанию основные страницы)')
+        parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES),
+                            help='Режимы для сравнения (по умолчанию все доступные)')
+        parser.add_argument('--workers', type=int, default=2, help='WEB_CONCURRENCY для всех режимов')
+        parser.add_argument('--threads', type=int, default=4, help='GUNICORN_THREADS для gthread')
+        parser.add_argument('--requests', type=int, default=400, help='Запросов на режим')
+        parser.add_argument('--concurrency', type=int, default=8, help='Одновременных клиентов')
+        parser.add_argument('--username', help='Пользователь для страниц за входом (по умолчанию первый активный)')
+
+    def handle(self, *args, **options):
+        if find_spec('gunicorn') is None:
+            raise CommandError('gunicorn не установлен')
+        profiles = options['profiles'] or [
+            name for name, env in PROFILES.items()
+            if env['GUNICORN_WORKER_CLASS'] != 'uvicorn' or find_spec('uvicorn') is not None
+        ]
+        paths = [page if page.startswith('/') else reverse(page) for page in options['pages'] or DEFAULT_PAGES]
+        cookie = self._session_cookie(options['username'])
+
+        results = []
+        for name in profiles:
+            self.stdout.write(f'{name}: запуск...')
+            results.append((name, self._run_profile(name, paths, cookie, options)))
+
+        self.stdout.write('')
+        self.stdout.write(f"{'режим':<18}{'RPS':>8}{'p50, мс':>10}{'p95, мс':>10}{'ошибки':>8}{'RSS, МБ':>10}{'PSS, МБ':>10}")
+        for name, row in results:
+            self.stdout.write(
+                f"{name:<18}{row['rps']:>8.1f}{row['p50']:>10.1f}{row['p95']:>10.1f}{row['errors']:>8}"
+                f"{row['rss'] / 1024:>10.1f}{row['pss'] / 1024:>10.1f}"
+            )
+        self.stdout.write('RSS считает общие страницы в каждом процессе, PSS делит их между процессами')
+
+    def _session_cookie(self, username):
+        """Сессия пользователя в базе, чтобы воркеры gunicorn ее увидели"""
+        users = get_user_model().objects.filter(is_active=True)
+        user = users.filter(username=username).first() if username else users.order_by('pk').first()
+        if user is None:
+            return ''
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        store['_auth_user_id'] = str(user.pk)
+        store['_auth_user_backend'] = settings.AUTHENTICATION_BACKENDS[0]
+        store['_auth_user_hash'] = user.get_session_auth_hash()
+        store.create()
+        return f'{settings.SESSION_COOKIE_NAME}={store.session_key}'
+
+    def _run_profile(self, name, paths, cookie, options):
+        port = free_port()
+        env = dict(
+            os.environ,
+            **PROFILES[name],
+            PORT=str(port),
+            WEB_CONCURRENCY=str(options['workers']),
+            GUNICORN_THREADS=str(options['threads']),
+        )
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', str(settings.BASE_DIR / 'gunicorn.conf.py'),
+             '--bind', f'127.0.0.1:{port}'],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            self._wait_ready(server, port, paths[0], cookie)
+            # Прогрев: первые запросы каждого воркера импортируют представления
+            for path in paths * options['workers']:
+                self._request(port, path, cookie)
+
+            total = options['requests']
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                timings = list(executor.map(
+                    lambda i: self._request(port, paths[i % len(paths)], cookie), range(total)
+                ))
+            elapsed = time.perf_counter() - started
+
+            pids = process_tree(server.pid)
+            latencies = sorted(ms for ms, ok in timings if ok)
+            return {
+                'rps': total / elapsed,
+                'p50': statistics.median(latencies) if latencies else 0.0,
+                'p95': latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0,
+                'errors': sum(1 for _, ok in timings if not ok),
+                'rss': sum(memory_kb(pid, 'Rss') for pid in pids),
+                'pss': sum(memory_kb(pid, 'Pss') for pid in pids),
+            }
+        finally:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    def _wait_ready(self, server, port, path, cookie, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn завершился с кодом {server.returncode}')
+            if self._request(port, path, cookie)[1]:
+                return
+            time.sleep(0.5)
+        raise CommandError('gunicorn не ответил за отведенное время')
+
+    @staticmethod
+    def _request(port, path, cookie):
+        """(время ответа в мс, успех)"""
+        headers = {'Host': 'localhost', 'X-Forwarded-Proto': 'https'}
+        if cookie:
+            headers['Cookie'] = cookie
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except OSError:
+            ok = False
+        finally:
+            connection.close()
+        return (time.perf_counter() - started) * 1000, ok
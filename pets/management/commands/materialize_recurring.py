@@ -0,0 +1,24 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from pets.recurring import BATCH_SIZE, materialize_due
+
+
+class Command(BaseCommand):
+    help = 'Создает наступившие регулярные расходы всех пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat, default=None,
+                            help='Создать расходы по эту дату включительно (по умолчанию — сегодня)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Шаблонов в одной транзакции')
+
+    def handle(self, *args, date, batch_size, **options):
+        started = time.perf_counter()
+        templates, expenses = materialize_due(date, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано шаблонов: {templates}, создано расходов: {expenses} "
+            f"({time.perf_counter() - started:.2f} с)"
+        ))
@@ -0,0 +1,97 @@
+import gzip
+import re
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from pets.storage import minifier_for
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - зависит от окружения
+    brotli = None
+
+DEFAULT_PAGES = ['pets:home', 'pets:pet_list', 'pets:expense_list', 'pets:analytics', 'pets:login']
+ASSET_RE = re.compile(r'<(?:link|script)\b[^>]*?(?:href|src)="([^"]+)"', re.I)
+
+
+def compressed_size(data):
+    """Размер в том виде, в каком его получит браузер (br, иначе gzip)"""
+    if brotli is not None:
+        return len(brotli.compress(data))
+    return len(gzip.compress(data, 9))
+
+
+class Command(BaseCommand):
+    help = 'Проверяет вес страниц (HTML и своя статика, сжатые) против PAGE_WEIGHT_BUDGET_KB'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pages', nargs='*',
+                            help='Имена URL или пути (по умолчанию основные страницы)')
+        parser.add_argument('--username', help='Пользователь для страниц за входом (по умолчанию первый активный)')
+        parser.add_argument('--budget', type=int, default=settings.PAGE_WEIGHT_BUDGET_KB,
+                            help='Бюджет на страницу, КБ')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(is_active=True)
+        username = options['username']
+        user = users.filter(username=username).first() if username else users.order_by('pk').first()
+
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+
+        over_budget = []
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for page in options['pages'] or DEFAULT_PAGES:
+                path = page if page.startswith('/') else reverse(page)
+                response = client.get(path, secure=True, follow=True)
+                if response.status_code != 200:
+                    raise CommandError(f'{path}: ответ {response.status_code}')
+                total = self._report(path, response.content)
+                if total > options['budget'] * 1024:
+                    over_budget.append(path)
+
+        if over_budget:
+            raise CommandError(f"Превышен бюджет {options['budget']} КБ: {', '.join(over_budget)}")
+        self.stdout.write(self.style.SUCCESS(f"Все страницы в бюджете {options['budget']} КБ"))
+
+    def _report(self, path, html):
+        html_size = compressed_size(html)
+        local, external = [], []
+        for url in ASSET_RE.findall(html.decode('utf-8')):
+            if url.startswith(settings.STATIC_URL):
+                local.append((url, self._asset_size(url)))
+            elif urlsplit(url).netloc:
+                external.append(url)
+
+        total = html_size + sum(size for _, size in local)
+        self.stdout.write(f'{path}: {total / 1024:.1f} КБ (HTML {len(html) / 1024:.1f} КБ, сжатый {html_size / 1024:.1f} КБ)')
+        for url, size in local:
+            self.stdout.write(f'  {url}: {size / 1024:.1f} КБ')
+        if external:
+            self.stdout.write(f'  внешних ресурсов (CDN, вне бюджета): {len(external)}')
+        return total
+
+    def _asset_size(self, url):
+        """Сжатый размер файла статики: собранный collectstatic или исходник"""
+        name = url[len(settings.STATIC_URL):].split('?')[0]
+        if staticfiles_storage.exists(name):
+            with staticfiles_storage.open(name) as handle:
+                return compressed_size(handle.read())
+        source = finders.find(name)
+        if source is None:
+            raise CommandError(f'Файл статики не найден: {name}')
+        with open(source, 'rb') as handle:
+            data = handle.read()
+        minify = minifier_for(name)
+        if minify is not None:
+            data = minify(data.decode('utf-8')).encode('utf-8')
+        return compressed_size(data)
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pets.sync import prune
+
+
+class Command(BaseCommand):
+    help = 'Удаляет старые записи журнала синхронизации'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SYNC_LOG_RETENTION_DAYS,
+                            help='Хранить записи за столько дней')
+
+    def handle(self, *args, days, **options):
+        deleted = prune(days)
+        self.stdout.write(self.style.SUCCESS(f"Удалено записей журнала: {deleted}"))
@@ -0,0 +1,70 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from pets import queue
+
+
+class Command(BaseCommand):
+    help = 'Воркер фоновых задач: забирает задачи из pets_task и выполняет их в пуле потоков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.TASK_WORKER_CONCURRENCY,
+                            help='Число одновременно выполняемых задач')
+        parser.add_argument('--poll-interval', type=float, default=settings.TASK_POLL_INTERVAL,
+                            help='Пауза между опросами пустой очереди, секунды')
+        parser.add_argument('--burst', action='store_true',
+                            help='Выйти, когда в очереди не останется готовых задач')
+
+    def handle(self, *args, concurrency, poll_interval, burst, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        concurrency = max(concurrency, 1)
+        worker = queue.worker_id()
+        running = set()
+        done = 0
+        last_maintenance = 0.0
+        self.stdout.write(f'Воркер {worker}: потоков {concurrency}')
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='pets-worker') as executor:
+            while not self.stopping:
+                if time.monotonic() - last_maintenance > settings.TASK_TIMEOUT / 2:
+                    # Задачи упавших воркеров, старые результаты, обслуживание (@periodic)
+                    queue.requeue_stale()
+                    queue.prune()
+                    queue.run_periodic()
+                    last_maintenance = time.monotonic()
+
+                finished = {future for future in running if future.done()}
+                done += len(finished)
+                running -= finished
+
+                claimed = []
+                if len(running) < concurrency:
+                    claimed = queue.claim(worker, concurrency - len(running))
+                    running.update(executor.submit(self._run, pk, worker) for pk in claimed)
+
+                if not claimed:
+                    if burst and not running:
+                        break
+                    close_old_connections()
+                    time.sleep(poll_interval)
+            # Выход из with дожидается уже взятых задач
+        self.stdout.write(self.style.SUCCESS(f'Воркер остановлен, выполнено задач: {done + len(running)}'))
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    @staticmethod
+    def _run(pk, worker):
+        close_old_connections()
+        try:
+            queue.execute(pk, worker)
+        finally:
+            close_old_connections()
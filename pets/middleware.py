@@ -0,0 +1,59 @@
+from django.conf import settings
+
+from . import rate_scope
+from .db_router import choose_replica, set_read_alias
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """Направляет чтение представлений из REPLICA_READ_VIEWS на реплики.
+
+    Псевдоним базы не сбрасывается после ответа: потоковые ответы
+    (экспорт) дочитывают данные уже после выхода из middleware.
+    Вместо этого он обнуляется в начале каждого запроса.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        set_read_alias(None)
+        response = self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            # Свои изменения клиент должен читать из основной базы
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS:
+            return None
+        if request.COOKIES.get(settings.REPLICA_PIN_COOKIE):
+            return None
+
+        match = request.resolver_match
+        if match is not None and match.view_name in settings.REPLICA_READ_VIEWS:
+            set_read_alias(choose_replica())
+        return None
+
+
+class RateScopeMiddleware:
+    """Открывает область курсов валют (rate_scope) на время запроса"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = rate_scope.begin()
+        try:
+            return self.get_response(request)
+        finally:
+            rate_scope.end(token)
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0002_expensecategory_alter_pet_options_pet_owner_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('RUB', 'Рубли (₽)'), ('USD', 'Доллары ($)'), ('EUR', 'Евро (€)')], max_length=3, verbose_name='Валюта')),
+                ('rate', models.DecimalField(decimal_places=4, max_digits=10, verbose_name='Курс к рублю')),
+                ('date', models.DateField(auto_now_add=True, verbose_name='Дата курса')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Актуальный курс')),
+            ],
+            options={
+                'verbose_name': 'Курс валюты',
+                'verbose_name_plural': 'Курсы валют',
+                'ordering': ['-date', 'currency'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['date'], name='pets_expens_date_0711f1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['currency'], name='pets_expens_currenc_a8034f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['pet', 'date'], name='pets_expens_pet_id_6bf3bc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangerate',
+            index=models.Index(fields=['currency', '-date'], name='pets_exchan_currenc_91b952_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangerate',
+            index=models.Index(fields=['is_active'], name='pets_exchan_is_acti_5c47bf_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.UniqueConstraint(fields=('currency', 'date'), name='unique_currency_rate_per_day'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import migrations
+
+from pets import partitioning
+
+
+def partition_expenses(apps, schema_editor):
+    """Секционирует pets_expense, если включено EXPENSE_PARTITIONING (только PostgreSQL)"""
+    granularity = getattr(settings, 'EXPENSE_PARTITIONING', '')
+    if not granularity or not partitioning.is_supported(schema_editor.connection):
+        return
+    partitioning.partition_table(schema_editor.connection, granularity)
+
+
+def unpartition_expenses(apps, schema_editor):
+    if not partitioning.is_supported(schema_editor.connection):
+        return
+    partitioning.unpartition_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0003_exchangerate_expense_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_expenses, unpartition_expenses),
+    ]
@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 5000
+
+
+def backfill_owner(apps, schema_editor):
+    """Заполняет owner по питомцу порциями по диапазонам id"""
+    Expense = apps.get_model('pets', 'Expense')
+    Pet = apps.get_model('pets', 'Pet')
+    owner_of_pet = Subquery(Pet.objects.filter(pk=OuterRef('pet_id')).values('owner_id')[:1])
+
+    last_id = Expense.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        Expense.objects.filter(
+            id__gte=start, id__lt=start + BATCH_SIZE, owner__isnull=True
+        ).update(owner_id=owner_of_pet)
+
+
+class Migration(migrations.Migration):
+    # Каждая порция фиксируется отдельно, чтобы не держать блокировку на всю таблицу
+    atomic = False
+
+    dependencies = [
+        ('pets', '0004_partition_expense_by_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='owner',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Владелец'),
+        ),
+        migrations.RunPython(backfill_owner, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='expense',
+            name='owner',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Владелец'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'date', 'created_at'], name='expense_owner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'category', 'date'], name='expense_owner_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'created_at'], name='expense_owner_created_idx'),
+        ),
+    ]
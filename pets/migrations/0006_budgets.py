@@ -0,0 +1,105 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:25
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+from pets.money import RateCalendar, to_minor
+
+
+def backfill_period_totals(apps, schema_editor):
+    """Накопленные суммы бюджетов по уже существующим расходам"""
+    Expense = apps.get_model('pets', 'Expense')
+    ExchangeRate = apps.get_model('pets', 'ExchangeRate')
+    BudgetPeriodTotal = apps.get_model('pets', 'BudgetPeriodTotal')
+
+    rates = RateCalendar(ExchangeRate.objects.order_by('currency', 'date').values_list('currency', 'date', 'rate'))
+    totals = {}
+    rows = Expense.objects.values_list('owner_id', 'pet_id', 'category_id', 'date', 'currency', 'amount')
+    for owner_id, pet_id, category_id, date, currency, amount in rows.iterator():
+        rub_minor = rates.to_rub_minor(to_minor(amount), currency, date)
+        month = date.replace(day=1)
+        for pet_key, category_key in [(pet_id, category_id), (pet_id, 0), (0, category_id), (0, 0)]:
+            key = (owner_id, month, pet_key, category_key)
+            totals[key] = totals.get(key, 0) + rub_minor
+
+    BudgetPeriodTotal.objects.bulk_create([
+        BudgetPeriodTotal(owner_id=owner_id, month=month, pet_key=pet_key,
+                          category_key=category_key, total_minor=total)
+        for (owner_id, month, pet_key, category_key), total in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0005_expense_owner'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Budget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('monthly_limit', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))], verbose_name='Лимит в месяц (₽)')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to='pets.expensecategory', verbose_name='Категория')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to=settings.AUTH_USER_MODEL, verbose_name='Владелец')),
+                ('pet', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to='pets.pet', verbose_name='Питомец')),
+            ],
+            options={
+                'verbose_name': 'Бюджет',
+                'verbose_name_plural': 'Бюджеты',
+                'ordering': ['pet__name', 'category__name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BudgetAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('spent_minor', models.BigIntegerField(verbose_name='Потрачено (коп.)')),
+                ('limit_minor', models.BigIntegerField(verbose_name='Лимит (коп.)')),
+                ('is_read', models.BooleanField(default=False, verbose_name='Прочитано')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='pets.budget', verbose_name='Бюджет')),
+            ],
+            options={
+                'verbose_name': 'Превышение бюджета',
+                'verbose_name_plural': 'Превышения бюджета',
+                'ordering': ['-month', '-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BudgetPeriodTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pet_key', models.BigIntegerField(default=0, verbose_name='Питомец (0 — все)')),
+                ('category_key', models.BigIntegerField(default=0, verbose_name='Категория (0 — все)')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('total_minor', models.BigIntegerField(default=0, verbose_name='Сумма (коп.)')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Владелец')),
+            ],
+            options={
+                'verbose_name': 'Сумма за месяц',
+                'verbose_name_plural': 'Суммы за месяц',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='budget',
+            constraint=models.UniqueConstraint(fields=('owner', 'pet', 'category'), name='unique_budget_per_scope'),
+        ),
+        migrations.AddConstraint(
+            model_name='budgetalert',
+            constraint=models.UniqueConstraint(fields=('budget', 'month'), name='unique_budget_alert_per_month'),
+        ),
+        migrations.AddConstraint(
+            model_name='budgetperiodtotal',
+            constraint=models.UniqueConstraint(fields=('owner', 'month', 'pet_key', 'category_key'), name='unique_budget_period_total'),
+        ),
+        migrations.RunPython(backfill_period_totals, migrations.RunPython.noop),
+    ]
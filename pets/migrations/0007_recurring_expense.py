@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:27
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0006_budgets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringExpense',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))], verbose_name='Сумма')),
+                ('currency', models.CharField(choices=[('RUB', 'Рубли (₽)'), ('USD', 'Доллары ($)'), ('EUR', 'Евро (€)')], default='RUB', max_length=3, verbose_name='Валюта')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('frequency', models.CharField(choices=[('daily', 'Ежедневно'), ('weekly', 'Еженедельно'), ('monthly', 'Ежемесячно'), ('yearly', 'Ежегодно')], default='monthly', max_length=10, verbose_name='Периодичность')),
+                ('interval', models.PositiveSmallIntegerField(default=1, help_text='Каждые N периодов', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Интервал')),
+                ('start_date', models.DateField(verbose_name='Первая дата')),
+                ('end_date', models.DateField(blank=True, null=True, verbose_name='Последняя дата')),
+                ('next_run', models.DateField(editable=False, verbose_name='Следующий расход')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pets.expensecategory', verbose_name='Категория')),
+                ('owner', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Владелец')),
+                ('pet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_expenses', to='pets.pet', verbose_name='Питомец')),
+            ],
+            options={
+                'verbose_name': 'Регулярный расход',
+                'verbose_name_plural': 'Регулярные расходы',
+                'ordering': ['next_run'],
+            },
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='recurring',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='pets.recurringexpense', verbose_name='Регулярный расход'),
+        ),
+        migrations.AddConstraint(
+            model_name='expense',
+            constraint=models.UniqueConstraint(condition=models.Q(('recurring__isnull', False)), fields=('recurring', 'date'), name='unique_recurring_occurrence'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringexpense',
+            index=models.Index(fields=['is_active', 'next_run'], name='recurring_due_idx'),
+        ),
+    ]
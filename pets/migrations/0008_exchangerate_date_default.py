@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0007_recurring_expense'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exchangerate',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate, verbose_name='Дата курса'),
+        ),
+    ]
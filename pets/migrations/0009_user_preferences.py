@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0008_exchangerate_date_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserPreferences',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reporting_currency', models.CharField(choices=[('RUB', 'Рубли (₽)'), ('USD', 'Доллары ($)'), ('EUR', 'Евро (€)')], default='RUB', help_text='Итоги на главной и в аналитике пересчитываются в эту валюту', max_length=3, verbose_name='Валюта отчетов')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='preferences', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Настройки пользователя',
+                'verbose_name_plural': 'Настройки пользователей',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Триграммные индексы для icontains в поиске админки (только PostgreSQL).
+# Выражение совпадает с тем, что строит Django: UPPER(column::text) LIKE ...
+# На секционированной pets_expense индекс создается на всех секциях.
+TRIGRAM_INDEXES = [
+    ('pet_name_trgm_idx', 'pets_pet', 'name'),
+    ('expense_description_trgm_idx', 'pets_expense', 'description'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0010_changelog'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:56
+
+import django.db.models.deletion
+import pets.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0012_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Export',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')], default='csv', max_length=10, verbose_name='Формат')),
+                ('token', models.CharField(default=pets.models._export_token, max_length=64, unique=True, verbose_name='Токен ссылки')),
+                ('data_version', models.CharField(blank=True, default='', max_length=100, verbose_name='Версия данных')),
+                ('file', models.FileField(blank=True, upload_to='exports/', verbose_name='Файл')),
+                ('size', models.BigIntegerField(default=0, verbose_name='Размер, байт')),
+                ('rows', models.PositiveIntegerField(default=0, verbose_name='Строк')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Действует до')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Владелец')),
+                ('task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='pets.task', verbose_name='Задача')),
+            ],
+            options={
+                'verbose_name': 'Выгрузка',
+                'verbose_name_plural': 'Выгрузки',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -2,13 +2,23 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+import secrets
 from django.utils import timezone
-from django.db.models.signals import post_migrate
-from django.db import OperationalError
+from django.db.models.signals import post_migrate, post_save, post_delete
+from django.db import OperationalError, transaction
 from django.dispatch import receiver
-from django.db.models import Sum, Count, F, ExpressionWrapper, DecimalField, Subquery, OuterRef
+from django.db.models import Sum, Count, F, ExpressionWrapper, DecimalField, Subquery, OuterRef, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 
+from django.core.cache import cache
+
+from .money import to_minor, from_minor, rate_to_fixed, convert_minor
+from .caching import (
+    bump_owner_version, bump_scope_version, CATALOG_SCOPE, RATES_SCOPE,
+    LATEST_RATE_DATE_KEY,
+)
+
 
 class ExchangeRate(models.Model):
     """Модель для хранения исторических курсов валют"""
@@ -20,7 +30,8 @@ class ExchangeRate(models.Model):
     
     currency = models.CharField(max_length=3, choices=CURRENCIES, verbose_name='Валюта')
     rate = models.DecimalField(max_digits=10, decimal_places=4, verbose_name='Курс к рублю')
-    date = models.DateField(auto_now_add=True, verbose_name='Дата курса')
+    # Дата задается явно: auto_now_add затирал даты исторических курсов
+    date = models.DateField(default=timezone.localdate, verbose_name='Дата курса')
     is_active = models.BooleanField(default=True, verbose_name='Актуальный курс')
     
     class Meta:
@@ -65,6 +76,26 @@ class ExchangeRate(models.Model):
             return Decimal('1.0')
 
 
+def rub_amount_expression():
+    """SQL-выражение суммы расхода в рублях по курсу на дату.
+
+    Без курса на дату используется 1.0, как в ExchangeRate.get_rate_on_date
+    и money.RateCalendar, чтобы база и Python давали одинаковый результат.
+    """
+    return ExpressionWrapper(
+        F('amount') * Coalesce(
+            Subquery(
+                ExchangeRate.objects.filter(
+                    currency=OuterRef('currency'),
+                    date__lte=OuterRef('date')
+                ).order_by('-date').values('rate')[:1]
+            ),
+            Value(Decimal('1.0')),
+        ),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
 class Pet(models.Model):
     PET_TYPES = [
         ('cat', 'Кошка'),
@@ -91,6 +122,26 @@ class Pet(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_species_display()})"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Расходы хранят копию владельца питомца, поддерживаем ее при смене владельца
+        RecurringExpense.objects.filter(pet=self).exclude(owner_id=self.owner_id).update(owner_id=self.owner_id)
+        moved = Expense.objects.filter(pet=self).exclude(owner_id=self.owner_id)
+        moved_rows = list(moved.values_list('id', 'owner_id'))
+        previous_owners = {owner_id for _, owner_id in moved_rows}
+        if previous_owners:
+            moved.update(owner_id=self.owner_id)
+            # Для прежних владельцев питомец и его расходы удалены, для нового — появились
+            from .sync import record_changes
+            for owner_id in previous_owners:
+                record_changes(owner_id, 'pet', [self.pk], deleted=True)
+                record_changes(owner_id, 'expense', [pk for pk, old in moved_rows if old == owner_id], deleted=True)
+            record_changes(self.owner_id, 'expense', [pk for pk, _ in moved_rows])
+            # Накопленные суммы бюджетов привязаны к владельцу
+            from .budgets import rebuild_owner_totals
+            for owner_id in previous_owners | {self.owner_id}:
+                rebuild_owner_totals(owner_id)
+    
     def get_age(self):
         """Возвращает возраст питомца в годах"""
         if self.birth_date:
@@ -122,17 +173,7 @@ class Pet(models.Model):
         expenses = self.expenses.values('currency').annotate(
             count=CountAgg('id'),
             total_amount=Sum('amount'),
-            total_in_rub=Sum(
-                ExpressionWrapper(
-                    F('amount') * Subquery(
-                        ExchangeRate.objects.filter(
-                            currency=OuterRef('currency'),
-                            date__lte=OuterRef('date')
-                        ).order_by('-date').values('rate')[:1]
-                    ),
-                    output_field=DecimalField(max_digits=12, decimal_places=2)
-                )
-            )
+            total_in_rub=Sum(rub_amount_expression())
         ).order_by('currency')
         
         result = {}
@@ -163,7 +204,7 @@ class Pet(models.Model):
             else:
                 result.append(f"{data['total']}{data['symbol']}")
         
-        total_rub = sum(data['total_in_rub'] for data in by_currency.values())
+        total_rub = from_minor(sum(to_minor(data['total_in_rub']) for data in by_currency.values()))
         return " + ".join(result) + f" ≈ {total_rub:.2f} ₽"
     
     def expenses_count(self):
@@ -206,15 +247,7 @@ class ExpenseQuerySet(models.QuerySet):
     def with_rub_amount(self):
         """Аннотирует QuerySet полем rub_amount (сумма в рублях)"""
         return self.annotate(
-            rub_amount=ExpressionWrapper(
-                F('amount') * Subquery(
-                    ExchangeRate.objects.filter(
-                        currency=OuterRef('currency'),
-                        date__lte=OuterRef('date')
-                    ).order_by('-date').values('rate')[:1]
-                ),
-                output_field=DecimalField(max_digits=12, decimal_places=2)
-            )
+            rub_amount=rub_amount_expression()
         )
     
     def total_in_rub(self):
@@ -224,6 +257,15 @@ class ExpenseQuerySet(models.QuerySet):
         )
         return result['total'] or Decimal('0')
     
+    def delete_in_bulk(self):
+        """Один DELETE без Collector: строки не загружаются, сигналы не отправляются.
+
+        На расходы не ссылаются другие таблицы, поэтому каскад не нужен.
+        Суммы бюджетов, журнал синхронизации и версию кэша вызывающий код
+        учитывает сам одним пакетом (см. pets/bulk.py). Возвращает число строк.
+        """
+        return self._raw_delete(self.db)
+    
     def statistics_by_currency(self):
         """Статистика по валютам"""
         from django.db.models import Count as CountAgg
@@ -231,21 +273,13 @@ class ExpenseQuerySet(models.QuerySet):
         return self.values('currency').annotate(
             count=CountAgg('id'),
             total_amount=Sum('amount'),
-            total_in_rub=Sum(
-                ExpressionWrapper(
-                    F('amount') * Subquery(
-                        ExchangeRate.objects.filter(
-                            currency=OuterRef('currency'),
-                            date__lte=OuterRef('date')
-                        ).order_by('-date').values('rate')[:1]
-                    ),
-                    output_field=DecimalField(max_digits=12, decimal_places=2)
-                )
-            )
+            total_in_rub=Sum(rub_amount_expression())
         ).order_by('currency')
 
 
 class Expense(models.Model):
+    ROLLUP_FIELDS = ('owner_id', 'pet_id', 'category_id', 'date', 'currency', 'amount')
+    
     CURRENCIES = [
         ('RUB', 'Рубли (₽)'),
         ('USD', 'Доллары ($)'),
@@ -284,6 +318,26 @@ class Expense(models.Model):
         verbose_name='Чек'
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления')
+    # Денормализованная копия pet.owner: фильтр по владельцу без JOIN с pets_pet.
+    # Отдельный индекс не нужен, owner открывает составные индексы ниже.
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        editable=False,
+        db_index=False,
+        verbose_name='Владелец'
+    )
+    # Шаблон, из которого создан расход; индекс дает ограничение уникальности ниже
+    recurring = models.ForeignKey(
+        'RecurringExpense',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=False,
+        related_name='occurrences',
+        verbose_name='Регулярный расход'
+    )
     
     objects = ExpenseQuerySet.as_manager()
     
@@ -295,6 +349,19 @@ class Expense(models.Model):
             models.Index(fields=['date']),
             models.Index(fields=['currency']),
             models.Index(fields=['pet', 'date']),
+            models.Index(fields=['owner', 'date', 'created_at'], name='expense_owner_date_idx'),
+            models.Index(fields=['owner', 'category', 'date'], name='expense_owner_category_idx'),
+            models.Index(fields=['owner', 'created_at'], name='expense_owner_created_idx'),
+        ]
+        constraints = [
+            # Повторный запуск планировщика не создаст расход дважды. Условие
+            # делает это уникальным индексом, а ключ включает date, поэтому
+            # он совместим с секционированием таблицы.
+            models.UniqueConstraint(
+                fields=['recurring', 'date'],
+                condition=models.Q(recurring__isnull=False),
+                name='unique_recurring_occurrence'
+            ),
         ]
     
     def __str__(self):
@@ -313,7 +380,7 @@ class Expense(models.Model):
     def amount_in_rub(self):
         """Конвертирует сумму в рубли по курсу на дату расхода"""
         rate = ExchangeRate.get_rate_on_date(self.currency, self.date)
-        return self.amount * rate
+        return from_minor(convert_minor(to_minor(self.amount), rate_to_fixed(rate)))
     
     def get_amount_display(self):
         """Возвращает отформатированную сумму с валютой"""
@@ -326,27 +393,32 @@ class Expense(models.Model):
         else:
             return f"{self.amount}{self.get_currency_symbol()} ≈ {self.amount_in_rub:.2f} ₽"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем исходные значения, чтобы бюджеты учли только разницу
+        instance._original = instance.rollup_state()
+        return instance
+    
+    def rollup_state(self):
+        """Поля, от которых зависит вклад расхода в суммы бюджетов.
+
+        None, если часть полей не загружена (only/defer).
+        """
+        try:
+            return tuple(self.__dict__[name] for name in self.ROLLUP_FIELDS)
+        except KeyError:
+            return None
+    
     def save(self, *args, **kwargs):
         # Автоматически устанавливаем сегодняшнюю дату если не указана
         if not self.date:
             self.date = timezone.now().date()
         
-        # Проверяем, есть ли актуальный курс для этой даты
-        try:
-            ExchangeRate.objects.get_or_create(
-                currency=self.currency,
-                date=self.date,
-                defaults={
-                    'rate': ExchangeRate.get_latest_rate(self.currency),
-                    'is_active': self.date == timezone.now().date()
-                }
-            )
-        except Exception as e:
-            # Логируем ошибку, но не прерываем сохранение расхода
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(f"Не удалось создать/получить курс валюты: {e}")
+        self.owner_id = self.pet.owner_id
         
+        # Курс на дату не копируется: get_rate_on_date берет последний курс
+        # не позже даты расхода, а история загружается командой ingest_rates
         super().save(*args, **kwargs)
         
         # Сбрасываем кэш у связанного питомца
@@ -354,6 +426,309 @@ class Expense(models.Model):
             delattr(self.pet, '_total_expenses_cache')
 
 
+class RecurringExpense(models.Model):
+    """Шаблон регулярного расхода (подмножество RRULE: FREQ, INTERVAL, UNTIL)"""
+    FREQUENCIES = [
+        ('daily', 'Ежедневно'),
+        ('weekly', 'Еженедельно'),
+        ('monthly', 'Ежемесячно'),
+        ('yearly', 'Ежегодно'),
+    ]
+    
+    pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='recurring_expenses', verbose_name='Питомец')
+    category = models.ForeignKey(ExpenseCategory, on_delete=models.CASCADE, verbose_name='Категория')
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))],
+        verbose_name='Сумма'
+    )
+    currency = models.CharField(max_length=3, choices=Expense.CURRENCIES, default='RUB', verbose_name='Валюта')
+    description = models.TextField(blank=True, verbose_name='Описание')
+    frequency = models.CharField(max_length=10, choices=FREQUENCIES, default='monthly', verbose_name='Периодичность')
+    interval = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        verbose_name='Интервал',
+        help_text='Каждые N периодов'
+    )
+    start_date = models.DateField(verbose_name='Первая дата')
+    end_date = models.DateField(null=True, blank=True, verbose_name='Последняя дата')
+    # Дата ближайшего несозданного расхода; планировщик читает только наступившие
+    next_run = models.DateField(editable=False, verbose_name='Следующий расход')
+    is_active = models.BooleanField(default=True, verbose_name='Активен')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, editable=False, verbose_name='Владелец')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    
+    class Meta:
+        verbose_name = 'Регулярный расход'
+        verbose_name_plural = 'Регулярные расходы'
+        ordering = ['next_run']
+        indexes = [
+            models.Index(fields=['is_active', 'next_run'], name='recurring_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.pet.name} - {self.category.name} - {self.amount} {self.currency} ({self.get_frequency_display()})"
+    
+    def save(self, *args, **kwargs):
+        self.owner_id = self.pet.owner_id
+        if self.next_run is None:
+            self.next_run = self.start_date
+        super().save(*args, **kwargs)
+
+
+class Budget(models.Model):
+    """Месячный лимит расходов владельца; пустые питомец или категория — «все»"""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets', verbose_name='Владелец')
+    pet = models.ForeignKey(
+        Pet, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='budgets', verbose_name='Питомец'
+    )
+    category = models.ForeignKey(
+        ExpenseCategory, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='budgets', verbose_name='Категория'
+    )
+    monthly_limit = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))],
+        verbose_name='Лимит в месяц (₽)'
+    )
+    is_active = models.BooleanField(default=True, verbose_name='Активен')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    
+    class Meta:
+        verbose_name = 'Бюджет'
+        verbose_name_plural = 'Бюджеты'
+        ordering = ['pet__name', 'category__name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['owner', 'pet', 'category'],
+                name='unique_budget_per_scope'
+            ),
+        ]
+    
+    def __str__(self):
+        pet = self.pet.name if self.pet_id else 'Все питомцы'
+        category = self.category.name if self.category_id else 'Все категории'
+        return f"{pet} / {category}: {self.monthly_limit} ₽"
+    
+    @property
+    def pet_key(self):
+        return self.pet_id or 0
+    
+    @property
+    def category_key(self):
+        return self.category_id or 0
+
+
+class BudgetPeriodTotal(models.Model):
+    """Накопленная сумма расходов владельца за месяц в копейках.
+
+    Для каждого расхода поддерживаются четыре строки: (питомец, категория),
+    (питомец, все), (все, категория), (все, все); 0 в ключе означает «все».
+    Суммы меняются на разницу при каждом сохранении расхода.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', verbose_name='Владелец')
+    pet_key = models.BigIntegerField(default=0, verbose_name='Питомец (0 — все)')
+    category_key = models.BigIntegerField(default=0, verbose_name='Категория (0 — все)')
+    month = models.DateField(verbose_name='Месяц')
+    total_minor = models.BigIntegerField(default=0, verbose_name='Сумма (коп.)')
+    
+    class Meta:
+        verbose_name = 'Сумма за месяц'
+        verbose_name_plural = 'Суммы за месяц'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['owner', 'month', 'pet_key', 'category_key'],
+                name='unique_budget_period_total'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.owner_id} {self.month:%Y-%m} {self.pet_key}/{self.category_key}: {self.total_minor}"
+
+
+class BudgetAlert(models.Model):
+    """Превышение бюджета за месяц (одно на бюджет и месяц)"""
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='alerts', verbose_name='Бюджет')
+    month = models.DateField(verbose_name='Месяц')
+    spent_minor = models.BigIntegerField(verbose_name='Потрачено (коп.)')
+    limit_minor = models.BigIntegerField(verbose_name='Лимит (коп.)')
+    is_read = models.BooleanField(default=False, verbose_name='Прочитано')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    
+    class Meta:
+        verbose_name = 'Превышение бюджета'
+        verbose_name_plural = 'Превышения бюджета'
+        ordering = ['-month', '-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['budget', 'month'],
+                name='unique_budget_alert_per_month'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.budget} — {self.month:%Y-%m}"
+    
+    @property
+    def spent(self):
+        return from_minor(self.spent_minor)
+    
+    @property
+    def limit(self):
+        return from_minor(self.limit_minor)
+
+
+class UserPreferences(models.Model):
+    """Настройки пользователя"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='preferences', verbose_name='Пользователь')
+    reporting_currency = models.CharField(
+        max_length=3,
+        choices=Expense.CURRENCIES,
+        default='RUB',
+        verbose_name='Валюта отчетов',
+        help_text='Итоги на главной и в аналитике пересчитываются в эту валюту'
+    )
+    
+    class Meta:
+        verbose_name = 'Настройки пользователя'
+        verbose_name_plural = 'Настройки пользователей'
+    
+    def __str__(self):
+        return f"{self.user}: {self.reporting_currency}"
+
+
+class ChangeLog(models.Model):
+    """Журнал изменений питомцев и расходов для синхронизации клиентов.
+
+    id растет монотонно и служит токеном синхронизации: клиент запрашивает
+    записи владельца с id больше последнего полученного. Удаления
+    записываются как отметки (deleted=True), сами строки уже не существуют.
+    """
+    KINDS = [
+        ('pet', 'Питомец'),
+        ('expense', 'Расход'),
+    ]
+    
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', verbose_name='Владелец')
+    kind = models.CharField(max_length=10, choices=KINDS, verbose_name='Объект')
+    object_id = models.BigIntegerField(verbose_name='ID объекта')
+    deleted = models.BooleanField(default=False, verbose_name='Удален')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата изменения')
+    
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        indexes = [
+            # Синхронизация читает диапазон id одного владельца
+            models.Index(fields=['owner', 'id'], name='changelog_owner_idx'),
+        ]
+    
+    def __str__(self):
+        action = 'удален' if self.deleted else 'изменен'
+        return f"#{self.pk} {self.kind} {self.object_id} {action}"
+
+
+class Task(models.Model):
+    """Фоновая задача в очереди pets.queue.
+
+    Воркер (manage.py run_tasks) или пул потоков процесса забирает
+    задачи со статусом queued и сроком run_at; неудачные попытки
+    возвращаются в очередь с задержкой, пока не исчерпан max_attempts.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+    
+    name = models.CharField(max_length=100, verbose_name='Задача')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='+', verbose_name='Владелец'
+    )
+    unique_key = models.CharField(max_length=200, blank=True, default='', verbose_name='Ключ дедупликации')
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED, verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name='Максимум попыток')
+    run_at = models.DateTimeField(default=timezone.now, verbose_name='Запустить не раньше')
+    locked_by = models.CharField(max_length=100, blank=True, default='', verbose_name='Воркер')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='Взята в работу')
+    result = models.JSONField(null=True, blank=True, verbose_name='Результат')
+    error = models.TextField(blank=True, default='', verbose_name='Ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создана')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершена')
+    
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            # Воркер выбирает готовые к запуску задачи по сроку
+            models.Index(fields=['status', 'run_at'], name='task_queue_idx'),
+            models.Index(fields=['unique_key', 'status'], name='task_unique_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.pk} {self.name} ({self.get_status_display()})"
+
+
+def _export_token():
+    return secrets.token_urlsafe(32)
+
+
+class Export(models.Model):
+    """Файл выгрузки расходов, построенный фоновой задачей (pets.exports).
+
+    Ссылка на скачивание содержит token и действует до expires_at, после
+    чего файл и запись удаляются.
+    """
+    FORMATS = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', verbose_name='Владелец')
+    format = models.CharField(max_length=10, choices=FORMATS, default='csv', verbose_name='Формат')
+    token = models.CharField(max_length=64, unique=True, default=_export_token, verbose_name='Токен ссылки')
+    task = models.ForeignKey(
+        Task, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='Задача'
+    )
+    data_version = models.CharField(max_length=100, blank=True, default='', verbose_name='Версия данных')
+    file = models.FileField(upload_to='exports/', blank=True, verbose_name='Файл')
+    size = models.BigIntegerField(default=0, verbose_name='Размер, байт')
+    rows = models.PositiveIntegerField(default=0, verbose_name='Строк')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='Действует до')
+    
+    class Meta:
+        verbose_name = 'Выгрузка'
+        verbose_name_plural = 'Выгрузки'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.get_format_display()} {self.owner} {self.created_at:%d.%m.%Y %H:%M}"
+    
+    @property
+    def is_ready(self):
+        return bool(self.file)
+    
+    @property
+    def is_failed(self):
+        return not self.file and (self.task is None or self.task.status == Task.FAILED)
+    
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+
 @receiver(post_migrate)
 def create_default_data(sender, **kwargs):
     """Создает данные по умолчанию после миграций"""
@@ -407,4 +782,56 @@ def create_default_data(sender, **kwargs):
                     print(" Созданы начальные курсы валют")
         except (ProgrammingError, OperationalError, ImportError) as e:
             # Игнорируем ошибки при инициализации
-            pass
\ No newline at end of file
+            pass
+
+
+def deleted_with_owner(origin):
+    """Удаление пришло каскадом от пользователя (аргумент origin сигнала post_delete).
+
+    Суммы бюджетов и журнал синхронизации владельца удаляются тем же
+    каскадом; новые строки, ссылающиеся на удаляемого пользователя, нарушили
+    бы внешний ключ при фиксации.
+    """
+    model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    return issubclass(model, User)
+
+
+@receiver([post_save, post_delete], sender=Pet)
+def pet_changed(sender, instance, **kwargs):
+    """Инвалидирует кэш владельца при изменении питомца"""
+    bump_owner_version(instance.owner_id)
+
+
+@receiver([post_save, post_delete], sender=Expense)
+def expense_changed(sender, instance, **kwargs):
+    """Инвалидирует кэш владельца при изменении расхода"""
+    bump_owner_version(instance.owner_id)
+
+
+@receiver([post_save, post_delete], sender=UserPreferences)
+def preferences_changed(sender, instance, **kwargs):
+    """Суммы в кэше посчитаны в прежней валюте отчетов"""
+    bump_owner_version(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=ExpenseCategory)
+def category_changed(sender, **kwargs):
+    """Инвалидирует кэш всех владельцев и справочник категорий в памяти.
+
+    Версия повышается после фиксации: иначе другой воркер успел бы
+    перечитать справочник до коммита и сохранить старые данные с новой версией.
+    """
+    from .categories import invalidate
+
+    def bump():
+        bump_scope_version(CATALOG_SCOPE)
+        invalidate()
+
+    transaction.on_commit(bump)
+
+
+@receiver([post_save, post_delete], sender=ExchangeRate)
+def exchange_rate_changed(sender, **kwargs):
+    """Инвалидирует кэш всех владельцев при изменении курсов"""
+    cache.delete(LATEST_RATE_DATE_KEY)
+    bump_scope_version(RATES_SCOPE)
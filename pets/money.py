@@ -0,0 +1,217 @@
+"""
+Денежная арифметика в целых младших единицах (копейках, центах).
+
+Сумма хранится как int (в массивах — int64) в сотых долях валюты, курс —
+как целое с фиксированной точкой RATE_SCALE (4 знака, как ExchangeRate.rate).
+Произведение суммы на курс вычисляется точно, округление до копеек —
+один раз, половина от нуля (как ROUND в PostgreSQL и SQLite). Для итогов
+сначала складываются точные произведения, затем округляется сумма, так же
+как SUM(amount * rate) в базе.
+
+Decimal нужен только на границе: при чтении из модели (to_minor) и при
+выводе пользователю (from_minor, format_minor).
+
+Ограничение int64: сумма в копейках × курс с 4 знаками должна оставаться
+меньше 9.2·10^18, то есть до ~10^8 ₽ на одну строку при курсе до 10^4.
+"""
+import bisect
+from decimal import Decimal, ROUND_HALF_UP
+
+MINOR_UNITS = 100
+RATE_SCALE = 10_000
+CURRENCY_SYMBOLS = {'RUB': '₽', 'USD': '$', 'EUR': '€'}
+
+_CENT = Decimal('0.01')
+_RATE_QUANT = Decimal('0.0001')
+
+
+def to_minor(amount):
+    """Decimal/int/str → целое число копеек (округление половины от нуля)"""
+    if amount is None:
+        return 0
+    return int((Decimal(amount) * MINOR_UNITS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor):
+    """Копейки → Decimal с двумя знаками (только для отображения)"""
+    return (Decimal(int(minor)) / MINOR_UNITS).quantize(_CENT)
+
+
+def rate_to_fixed(rate):
+    """Курс Decimal → целое с фиксированной точкой RATE_SCALE"""
+    return int((Decimal(rate) * RATE_SCALE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def fixed_to_rate(rate_fixed):
+    return (Decimal(int(rate_fixed)) / RATE_SCALE).quantize(_RATE_QUANT)
+
+
+def _round_div(value, divisor):
+    """Целочисленное деление с округлением половины от нуля"""
+    quotient, remainder = divmod(abs(value), divisor)
+    if remainder * 2 >= divisor:
+        quotient += 1
+    return quotient if value >= 0 else -quotient
+
+
+def convert_minor(minor, rate_fixed):
+    """Сумма в копейках по курсу → копейки в рублях"""
+    return _round_div(minor * rate_fixed, RATE_SCALE)
+
+
+def convert_minor_back(rub_minor, rate_fixed):
+    """Рубли в копейках → копейки валюты с курсом rate_fixed"""
+    return _round_div(rub_minor * RATE_SCALE, rate_fixed)
+
+
+def sum_converted(pairs):
+    """Сумма в рублях по парам (копейки, курс): одно округление в конце"""
+    return _round_div(sum(minor * rate_fixed for minor, rate_fixed in pairs), RATE_SCALE)
+
+
+def round_fraction(value):
+    """Fraction → ближайшее целое, половина от нуля"""
+    return _round_div(value.numerator, value.denominator)
+
+
+def currency_symbol(currency):
+    return CURRENCY_SYMBOLS.get(currency, currency)
+
+
+def convert_minor_array(minor, rate_fixed):
+    """Векторный convert_minor для массивов NumPy int64"""
+    import numpy as np
+
+    product = np.asarray(minor, dtype=np.int64) * np.asarray(rate_fixed, dtype=np.int64)
+    magnitude = (np.abs(product) + RATE_SCALE // 2) // RATE_SCALE
+    return np.where(product < 0, -magnitude, magnitude)
+
+
+def convert_minor_back_array(rub_minor, rate_fixed):
+    """Векторный convert_minor_back для массивов NumPy int64"""
+    import numpy as np
+
+    product = np.asarray(rub_minor, dtype=np.int64) * RATE_SCALE
+    rate_fixed = np.asarray(rate_fixed, dtype=np.int64)
+    magnitude = (2 * np.abs(product) + rate_fixed) // (2 * rate_fixed)
+    return np.where(product < 0, -magnitude, magnitude)
+
+
+def format_minor(minor, currency='RUB'):
+    """Форматирует сумму в копейках так же, как шаблонные теги"""
+    symbol = currency_symbol(currency)
+    amount = from_minor(minor)
+    if currency == 'RUB':
+        return f"{amount:.2f} {symbol}"
+    return f"{symbol}{amount:.2f}"
+
+
+def as_major_floats(minor_values):
+    """Копейки → float рубли, только для осей графиков"""
+    return [int(value) / MINOR_UNITS for value in minor_values]
+
+
+class RateCalendar:
+    """Курсы валют в памяти для пересчета множества строк без запросов.
+
+    Семантика совпадает с ExchangeRate.get_rate_on_date: берется последний
+    курс на дату или раньше, при его отсутствии — 1.0.
+    """
+
+    def __init__(self, rows):
+        self._dates = {}
+        self._rates = {}
+        for currency, date, rate in rows:
+            self._dates.setdefault(currency, []).append(date)
+            self._rates.setdefault(currency, []).append(rate_to_fixed(rate))
+
+    @classmethod
+    def load(cls, currencies=None, start=None, end=None):
+        """Курсы валют currencies для дат от start до end (None — без ограничения).
+
+        Кроме курсов внутри диапазона читается последний курс до start: он
+        действует на первые даты диапазона.
+        """
+        from django.db.models import OuterRef, Subquery, Value
+        from django.db.models.functions import Coalesce
+
+        from .models import ExchangeRate
+
+        queryset = ExchangeRate.objects.order_by('currency', 'date')
+        if currencies is not None:
+            queryset = queryset.filter(currency__in=sorted(currencies))
+        if start is not None:
+            floor = ExchangeRate.objects.filter(
+                currency=OuterRef('currency'), date__lte=start
+            ).order_by('-date').values('date')[:1]
+            queryset = queryset.filter(date__gte=Coalesce(Subquery(floor), Value(start)))
+        if end is not None:
+            queryset = queryset.filter(date__lte=end)
+        return cls(queryset.values_list('currency', 'date', 'rate'))
+
+    @classmethod
+    def covering(cls, pairs):
+        """Курсы для пар (валюта, дата): только встреченные валюты и их диапазон дат"""
+        pairs = [(currency, date) for currency, date in pairs if currency != 'RUB']
+        if not pairs:
+            return cls(())
+        dates = [date for _, date in pairs]
+        return cls.load({currency for currency, _ in pairs}, min(dates), max(dates))
+
+    @classmethod
+    def for_queryset(cls, queryset, field='date', end=None):
+        """Курсы для строк queryset: валюты и диапазон дат читаются одной агрегацией.
+
+        end продлевает диапазон, если даты строк дальше поля field (регулярные
+        расходы наступают после next_run).
+        """
+        from django.db.models import Max, Min
+
+        ranges = list(
+            queryset.exclude(currency='RUB').order_by().values('currency')
+            .annotate(start=Min(field), end=Max(field)).values_list('currency', 'start', 'end')
+        )
+        if not ranges:
+            return cls(())
+        return cls.load(
+            {currency for currency, _, _ in ranges},
+            min(start for _, start, _ in ranges),
+            end or max(last for _, _, last in ranges),
+        )
+
+    def rate_on(self, currency, date):
+        """Курс с фиксированной точкой на дату"""
+        dates = self._dates.get(currency)
+        if not dates:
+            return RATE_SCALE
+        position = bisect.bisect_right(dates, date)
+        return self._rates[currency][position - 1] if position else RATE_SCALE
+
+    def last_known(self, currency, date):
+        """(дата, курс Decimal) последнего курса не позже date или None"""
+        dates = self._dates.get(currency) or []
+        position = bisect.bisect_right(dates, date)
+        if not position:
+            return None
+        return dates[position - 1], fixed_to_rate(self._rates[currency][position - 1])
+
+    def next_known_date(self, currency, date):
+        """Ближайшая дата курса строго после date или None"""
+        dates = self._dates.get(currency) or []
+        position = bisect.bisect_right(dates, date)
+        return dates[position] if position < len(dates) else None
+
+    def to_rub_minor(self, minor, currency, date):
+        return convert_minor(minor, self.rate_on(currency, date))
+
+    def rates_for(self, currency, dates):
+        """Курсы для массива дат datetime64[D] (векторно)"""
+        import numpy as np
+
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        known = self._dates.get(currency)
+        if not known:
+            return np.full(len(dates), RATE_SCALE, dtype=np.int64)
+        known_dates = np.array(known, dtype='datetime64[D]')
+        rates = np.array([RATE_SCALE] + self._rates[currency], dtype=np.int64)
+        return rates[np.searchsorted(known_dates, dates, side='right')]
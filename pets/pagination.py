@@ -0,0 +1,54 @@
+"""
+Пагинатор с приблизительным числом строк для больших таблиц.
+
+COUNT(*) по миллионам строк читает всю таблицу (или весь индекс) на каждое
+открытие страницы. На PostgreSQL число строк берется из статистики
+планировщика: для выборки без условий — reltuples таблицы и ее секций,
+для выборки с условиями — оценка строк из EXPLAIN. Точный COUNT
+выполняется, только если оценка меньше порога (тогда он дешев), и на
+других базах.
+"""
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+ESTIMATE_SQL = """
+    SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)
+    FROM pg_class c
+    WHERE c.oid = %s::regclass
+       OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)
+"""
+
+
+def estimate_count(queryset):
+    """Оценка числа строк выборки по статистике PostgreSQL или None"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            table = queryset.model._meta.db_table
+            cursor.execute(ESTIMATE_SQL, [table, table])
+            return int(cursor.fetchone()[0])
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, которому не нужен точный COUNT для больших выборок"""
+
+    @cached_property
+    def count(self):
+        threshold = settings.ADMIN_COUNT_ESTIMATE_THRESHOLD
+        if hasattr(self.object_list, 'query'):
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate >= threshold:
+                return estimate
+        return super().count
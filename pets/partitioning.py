@@ -0,0 +1,289 @@
+"""
+Секционирование таблицы расходов по дате (только PostgreSQL).
+
+Таблица pets_expense превращается в секционированную по диапазону `date`
+(по годам или месяцам) с секцией DEFAULT для дат вне созданных диапазонов.
+Первичный ключ становится (id, date), так как ключ секционированной таблицы
+обязан включать ключ секционирования. Поэтому на pets_expense не должно быть
+внешних ключей из других таблиц.
+
+Используется миграцией 0004 (при EXPENSE_PARTITIONING) и командой
+`manage.py expense_partitions`.
+"""
+import datetime
+import re
+
+TABLE = 'pets_expense'
+LEGACY_TABLE = 'pets_expense_legacy'
+DEFAULT_PARTITION = 'pets_expense_default'
+ARCHIVE_PREFIX = 'archive_'
+GRANULARITIES = ('year', 'month')
+
+BOUND_RE = re.compile(r"FROM \('(?P<start>[\d-]+)'\) TO \('(?P<end>[\d-]+)'\)")
+PARTITION_RE = re.compile(r'\b(pets_expense_(?:y\d{4}|m\d{6}|default))\b')
+
+
+def is_supported(connection):
+    return connection.vendor == 'postgresql'
+
+
+def period_start(value, granularity):
+    """Начало периода (года или месяца), в который попадает дата"""
+    if granularity == 'year':
+        return datetime.date(value.year, 1, 1)
+    return datetime.date(value.year, value.month, 1)
+
+
+def next_period(start, granularity):
+    if granularity == 'year':
+        return datetime.date(start.year + 1, 1, 1)
+    if start.month == 12:
+        return datetime.date(start.year + 1, 1, 1)
+    return datetime.date(start.year, start.month + 1, 1)
+
+
+def partition_name(start, granularity):
+    if granularity == 'year':
+        return f'{TABLE}_y{start.year}'
+    return f'{TABLE}_m{start.year}{start.month:02d}'
+
+
+def iter_periods(first, last, granularity):
+    """Периоды (начало, конец), покрывающие даты first..last включительно"""
+    start = period_start(first, granularity)
+    while start <= last:
+        end = next_period(start, granularity)
+        yield start, end
+        start = end
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [TABLE])
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions(cursor):
+    """Список секций: [(имя, начало, конец)], у DEFAULT границы None"""
+    cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        ORDER BY c.relname
+    """, [TABLE])
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = BOUND_RE.search(bound)
+        if match:
+            partitions.append((
+                name,
+                datetime.date.fromisoformat(match['start']),
+                datetime.date.fromisoformat(match['end']),
+            ))
+        else:
+            partitions.append((name, None, None))
+    return partitions
+
+
+def _index_definitions(cursor, table):
+    cursor.execute("""
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE tablename = %s AND indexname <> %s
+    """, [table, f'{table}_pkey'])
+    return cursor.fetchall()
+
+
+def _foreign_keys(cursor, table):
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+    """, [table])
+    return cursor.fetchall()
+
+
+def _check_no_blockers(cursor):
+    cursor.execute("""
+        SELECT conrelid::regclass::text, conname FROM pg_constraint
+        WHERE confrelid = %s::regclass AND contype = 'f'
+    """, [TABLE])
+    referencing = cursor.fetchall()
+    if referencing:
+        raise RuntimeError(
+            f"{TABLE} is referenced by foreign keys {referencing}; "
+            "a partitioned table cannot keep them"
+        )
+    cursor.execute("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'u'
+    """, [TABLE])
+    unique = cursor.fetchall()
+    if unique:
+        raise RuntimeError(f"Unique constraints {unique} must include the date column")
+
+
+def _rebuild(cursor, granularity=None):
+    """Пересоздает pets_expense: секционированной (granularity) или обычной (None)"""
+    indexes = _index_definitions(cursor, TABLE)
+    foreign_keys = _foreign_keys(cursor, TABLE)
+
+    cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}")
+    # Освобождаем имена индексов и ограничений для новой таблицы
+    for name, _ in indexes:
+        cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+    for name, _ in foreign_keys:
+        cursor.execute(f'ALTER TABLE {LEGACY_TABLE} DROP CONSTRAINT "{name}"')
+    cursor.execute(f'ALTER TABLE {LEGACY_TABLE} DROP CONSTRAINT IF EXISTS "{TABLE}_pkey"')
+
+    cursor.execute("""
+        SELECT attidentity FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attname = 'id'
+    """, [LEGACY_TABLE])
+    is_identity = cursor.fetchone()[0] != ''
+
+    partition_clause = 'PARTITION BY RANGE (date)' if granularity else ''
+    identity_clause = 'INCLUDING IDENTITY' if is_identity else ''
+    cursor.execute(f"""
+        CREATE TABLE {TABLE} (
+            LIKE {LEGACY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS {identity_clause}
+        ) {partition_clause}
+    """)
+    primary_key = '(id, date)' if granularity else '(id)'
+    cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY {primary_key}')
+
+    if granularity:
+        cursor.execute(f"SELECT MIN(date), MAX(date) FROM {LEGACY_TABLE}")
+        first, last = cursor.fetchone()
+        today = datetime.date.today()
+        first = min(first or today, today)
+        last = max(last or today, today)
+        for start, end in iter_periods(first, next_period(period_start(last, granularity), granularity), granularity):
+            cursor.execute(
+                f"CREATE TABLE {partition_name(start, granularity)} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+
+    cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {LEGACY_TABLE}")
+
+    if is_identity:
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}",
+            [TABLE],
+        )
+    else:
+        # Последовательность serial-колонки переходит к новой таблице
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [LEGACY_TABLE])
+        sequence = cursor.fetchone()[0]
+        if sequence:
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id")
+
+    for _, definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT "{name}" {definition}')
+
+    cursor.execute(f"DROP TABLE {LEGACY_TABLE} CASCADE")
+    cursor.execute(f"ANALYZE {TABLE}")
+
+
+def partition_table(connection, granularity):
+    """Переводит pets_expense в секционированную таблицу с переносом данных"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return False
+        _check_no_blockers(cursor)
+        _rebuild(cursor, granularity)
+    return True
+
+
+def unpartition_table(connection):
+    """Возвращает pets_expense к обычной таблице (данные архивных секций не возвращаются)"""
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return False
+        _rebuild(cursor, None)
+    return True
+
+
+def detect_granularity(partitions):
+    for _, start, end in partitions:
+        if start is not None:
+            return 'year' if (end.year - start.year) == 1 and end.month == start.month else 'month'
+    return 'year'
+
+
+def ensure_partitions(connection, through, granularity=None):
+    """Создает недостающие секции до даты through включительно.
+
+    Строки, уже попавшие в DEFAULT, переносятся в новую секцию.
+    """
+    created = []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return created
+        partitions = list_partitions(cursor)
+        granularity = granularity or detect_granularity(partitions)
+        existing = {start for _, start, _ in partitions if start is not None}
+        first = min(existing) if existing else period_start(datetime.date.today(), granularity)
+
+        for start, end in iter_periods(first, through, granularity):
+            if start in existing:
+                continue
+            name = partition_name(start, granularity)
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s)",
+                [start, end],
+            )
+            if cursor.fetchone()[0]:
+                cursor.execute(
+                    f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+                )
+                cursor.execute(f"""
+                    WITH moved AS (
+                        DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s RETURNING *
+                    )
+                    INSERT INTO {name} SELECT * FROM moved
+                """, [start, end])
+                cursor.execute(
+                    f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                    [start, end],
+                )
+            else:
+                cursor.execute(
+                    f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)",
+                    [start, end],
+                )
+            created.append(name)
+    return created
+
+
+def archive_partitions(connection, before, drop=False):
+    """Отсоединяет секции, целиком лежащие раньше даты before.
+
+    Отсоединенная секция переименовывается в archive_* и остается в базе
+    (ее можно выгрузить pg_dump и удалить) либо удаляется сразу при drop=True.
+    """
+    archived = []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return archived
+        for name, start, end in list_partitions(cursor):
+            if end is None or end > before:
+                continue
+            cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+            if drop:
+                cursor.execute(f"DROP TABLE {name}")
+            else:
+                cursor.execute(f"ALTER TABLE {name} RENAME TO {ARCHIVE_PREFIX}{name}")
+            archived.append(name)
+    return archived
+
+
+def scanned_partitions(queryset):
+    """Имена секций, которые читает план запроса (EXPLAIN)"""
+    return sorted(set(PARTITION_RE.findall(queryset.explain())))
@@ -0,0 +1,102 @@
+"""
+Сводная статистика питомца для его страницы.
+
+Все показатели — итог, среднее, число расходов, разбивка по категориям и
+по месяцам — считаются из одной выборки, сгруппированной в базе по
+(категория, валюта, день): число строк ответа ограничено числом дней с
+расходами, а не числом расходов. Пересчет в валюту отчетов идет по
+курсам в памяти (CurrencyReport), одно округление на группу.
+
+Готовая сводка кэшируется по версии данных владельца, поэтому повторное
+открытие страницы обходится без запросов к расходам. Последние расходы
+читаются отдельным запросом по индексу (pet, date) и не кэшируются.
+"""
+from dataclasses import dataclass, field
+from fractions import Fraction
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from .budgets import month_start
+from .caching import get_data_version
+from .categories import attach, attach_objects
+from .models import Expense
+from .money import from_minor, round_fraction, to_minor
+from .reporting import CurrencyReport
+
+PET_STATS_CACHE_KEY = 'pets:pet-stats:{}:{}:{}'
+MONTHS = 12
+
+
+@dataclass
+class PetStats:
+    currency: str
+    total: object
+    count: int
+    avg: object
+    by_category: list
+    monthly: list
+    recent: list = field(default_factory=list)
+
+
+def _money(value):
+    return from_minor(round_fraction(value))
+
+
+def compute_pet_stats(pet_id, report):
+    """Сводка по одной сгруппированной выборке (без последних расходов)"""
+    rows = Expense.objects.filter(pet_id=pet_id).order_by().values(
+        'category_id', 'currency', 'date'
+    ).annotate(amount_total=Sum('amount'), row_count=Count('id'))
+
+    total = Fraction(0)
+    count = 0
+    categories = {}
+    months = {}
+    for row in rows:
+        value = report.convert(to_minor(row['amount_total']), row['currency'], row['date'])
+        total += value
+        count += row['row_count']
+        for groups, key in ((categories, row['category_id']), (months, month_start(row['date']))):
+            group = groups.setdefault(key, [Fraction(0), 0])
+            group[0] += value
+            group[1] += row['row_count']
+
+    by_category = attach([
+        {'category_id': category_id, 'total': _money(value), 'count': rows_count}
+        for category_id, (value, rows_count) in categories.items()
+    ])
+    by_category.sort(key=lambda item: item['total'], reverse=True)
+
+    monthly = [
+        {'month': month.strftime('%Y-%m'), 'total': _money(value), 'count': rows_count}
+        for month, (value, rows_count) in sorted(months.items(), reverse=True)[:MONTHS]
+    ]
+    return PetStats(
+        currency=report.currency,
+        total=_money(total),
+        count=count,
+        avg=_money(total / count) if count else from_minor(0),
+        by_category=by_category,
+        monthly=monthly,
+    )
+
+
+def get_pet_stats(pet, report=None, recent=10):
+    """Сводка питомца в валюте отчетов и recent последних расходов.
+
+    Сводка берется из кэша по версии данных владельца; recent=0 не читает
+    последние расходы.
+    """
+    report = report or CurrencyReport()
+    key = PET_STATS_CACHE_KEY.format(pet.pk, report.currency, get_data_version(pet.owner_id))
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_pet_stats(pet.pk, report)
+        cache.set(key, stats, settings.ANALYTICS_CACHE_TIMEOUT)
+    if recent:
+        stats.recent = attach_objects(
+            Expense.objects.filter(pet_id=pet.pk).order_by('-date', '-id')[:recent]
+        )
+    return stats
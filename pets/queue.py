@@ -0,0 +1,300 @@
+"""
+Очередь фоновых задач в базе данных.
+
+Тяжелая работа (графики, загрузка курсов) не выполняется в запросе:
+представление ставит задачу (enqueue) и сразу отвечает, а клиент опрашивает
+ее статус через /api/tasks/<id>/. Задачи хранятся в таблице pets_task,
+поэтому постановка атомарна с транзакцией вызывающего кода и не требует
+отдельного брокера.
+
+Исполнитель выбирается настройкой TASK_BACKEND:
+
+- worker — отдельный процесс manage.py run_tasks с пулом потоков;
+- thread — пул потоков внутри веб-процесса (замена брокера для разработки
+  и деплоя из одного сервиса): задача запускается после коммита. Отложенные
+  повторы живут в таймерах процесса и теряются при его перезапуске, поэтому
+  enqueue не чаще раза в TASK_TIMEOUT / 2 подбирает зависшие и просроченные
+  задачи (recover_local) и запускает периодическое обслуживание — то же,
+  что делает цикл run_tasks.
+
+Периодическое обслуживание (@periodic, например удаление просроченных
+выгрузок) выполняется с той же частотой в обоих режимах.
+
+Задачу забирает тот, чей UPDATE ... WHERE status='queued' изменил строку,
+поэтому несколько воркеров не выполнят одну задачу дважды. Задачи,
+зависшие в running дольше TASK_TIMEOUT (воркер упал), возвращаются в очередь.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+PERIODIC = []
+
+_local_lock = threading.Lock()
+_local_executor = None
+_last_maintenance = None
+
+
+@dataclass(frozen=True)
+class TaskSpec:
+    func: object
+    max_attempts: int
+    retry_delay: int
+
+
+class UnknownTask(Exception):
+    pass
+
+
+def task(name, max_attempts=None, retry_delay=None):
+    """Регистрирует функцию как задачу; параметры приходят из payload"""
+    def decorator(func):
+        REGISTRY[name] = TaskSpec(
+            func,
+            max_attempts or settings.TASK_MAX_ATTEMPTS,
+            settings.TASK_RETRY_DELAY if retry_delay is None else retry_delay,
+        )
+        func.task_name = name
+        return func
+    return decorator
+
+
+def periodic(func):
+    """Регистрирует функцию обслуживания, которую очередь вызывает раз в TASK_TIMEOUT / 2"""
+    PERIODIC.append(func)
+    return func
+
+
+def run_periodic():
+    """Выполняет функции обслуживания; ошибка одной не мешает остальным"""
+    for func in PERIODIC:
+        try:
+            func()
+        except Exception:
+            logger.exception('Periodic job %s failed', func.__name__)
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def enqueue(name, payload=None, owner_id=None, unique_key='', delay=0):
+    """Ставит задачу в очередь и возвращает ее строку.
+
+    С unique_key уже ожидающая или выполняющаяся задача с тем же ключом
+    возвращается вместо новой; задача упавшего воркера (running дольше
+    TASK_TIMEOUT) не считается.
+    """
+    if name not in REGISTRY:
+        raise UnknownTask(name)
+    if settings.TASK_BACKEND == 'thread':
+        _maintain_local()
+    if unique_key:
+        existing = Task.objects.filter(
+            unique_key=unique_key, status__in=[Task.QUEUED, Task.RUNNING]
+        ).exclude(
+            status=Task.RUNNING, locked_at__lt=_stale_deadline()
+        ).order_by('-id').first()
+        if existing is not None:
+            return existing
+
+    job = Task.objects.create(
+        name=name,
+        payload=payload or {},
+        owner_id=owner_id,
+        unique_key=unique_key,
+        max_attempts=REGISTRY[name].max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if settings.TASK_BACKEND == 'thread':
+        transaction.on_commit(lambda: _submit_local(job.pk, delay))
+    return job
+
+
+def _claim(pk, worker):
+    return Task.objects.filter(pk=pk, status=Task.QUEUED).update(
+        status=Task.RUNNING, locked_by=worker, locked_at=timezone.now(), attempts=F('attempts') + 1,
+    ) == 1
+
+
+def _stale_deadline():
+    return timezone.now() - timedelta(seconds=settings.TASK_TIMEOUT)
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи упавших воркеров"""
+    return Task.objects.filter(status=Task.RUNNING, locked_at__lt=_stale_deadline()).update(
+        status=Task.QUEUED, locked_by='', locked_at=None,
+    )
+
+
+def claim(worker, limit):
+    """Забирает до limit готовых задач; возвращает их id"""
+    candidates = Task.objects.filter(
+        status=Task.QUEUED, run_at__lte=timezone.now()
+    ).order_by('run_at', 'id').values_list('pk', flat=True)[:limit * 2]
+    claimed = []
+    for pk in candidates:
+        if _claim(pk, worker):
+            claimed.append(pk)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+def execute(pk, worker):
+    """Выполняет взятую задачу и записывает результат или следующую попытку.
+
+    Возвращает задержку до повторной попытки в секундах или None.
+    """
+    job = Task.objects.get(pk=pk)
+    mine = Task.objects.filter(pk=pk, status=Task.RUNNING, locked_by=worker)
+    spec = REGISTRY.get(job.name)
+    try:
+        if spec is None:
+            raise UnknownTask(job.name)
+        result = spec.func(**job.payload)
+    except Exception as e:
+        logger.exception('Task %s #%s failed (attempt %s)', job.name, pk, job.attempts)
+        error = ''.join(traceback.format_exception(e))[-4000:]
+        if spec is not None and job.attempts < job.max_attempts:
+            delay = spec.retry_delay * 2 ** (job.attempts - 1)
+            mine.update(status=Task.QUEUED, locked_by='', error=error,
+                        run_at=timezone.now() + timedelta(seconds=delay))
+            return delay
+        mine.update(status=Task.FAILED, error=error, finished_at=timezone.now())
+        return None
+    mine.update(status=Task.DONE, result=result, error='', finished_at=timezone.now())
+    return None
+
+
+def retry(queryset):
+    """Возвращает задачи в очередь с новым счетчиком попыток"""
+    ids = list(queryset.exclude(status=Task.RUNNING).values_list('pk', flat=True))
+    Task.objects.filter(pk__in=ids).update(
+        status=Task.QUEUED, attempts=0, run_at=timezone.now(), locked_by='', locked_at=None, finished_at=None,
+    )
+    if settings.TASK_BACKEND == 'thread':
+        for pk in ids:
+            transaction.on_commit(lambda pk=pk: _submit_local(pk))
+    return len(ids)
+
+
+def prune(days=None):
+    """Удаляет завершенные задачи старше days дней"""
+    days = settings.TASK_RESULT_TTL_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Task.objects.filter(
+        status__in=[Task.DONE, Task.FAILED], finished_at__lt=cutoff
+    ).delete()
+    return deleted
+
+
+def recover_local():
+    """Подбирает задачи, потерянные перезапуском веб-процесса (TASK_BACKEND = 'thread').
+
+    Задачи упавших воркеров возвращаются в очередь, а ожидающие дольше
+    TASK_TIMEOUT (их таймер или пул остался в завершенном процессе)
+    отправляются в пул заново. Повторная отправка безопасна: задачу
+    выполнит только тот, кто ее заберет (_claim).
+    """
+    requeue_stale()
+    ids = list(Task.objects.filter(
+        status=Task.QUEUED, run_at__lt=_stale_deadline()
+    ).order_by('run_at', 'id').values_list('pk', flat=True))
+    for pk in ids:
+        transaction.on_commit(lambda pk=pk: _submit_local(pk))
+    return len(ids)
+
+
+def _maintain_local():
+    """Обслуживание очереди вместо цикла run_tasks: не чаще раза в TASK_TIMEOUT / 2"""
+    global _last_maintenance
+    with _local_lock:
+        now = time.monotonic()
+        if _last_maintenance is not None and now - _last_maintenance < settings.TASK_TIMEOUT / 2:
+            return
+        _last_maintenance = now
+    try:
+        # Точка сохранения: ошибка обслуживания не должна сорвать транзакцию вызывающего
+        with transaction.atomic():
+            recover_local()
+    except Exception:
+        logger.exception('Local task maintenance failed')
+    # Обслуживание может трогать файлы и хранилище, поэтому не в запросе
+    transaction.on_commit(lambda: _executor().submit(_run_periodic_local))
+
+
+def _executor():
+    global _local_executor
+    with _local_lock:
+        if _local_executor is None:
+            _local_executor = ThreadPoolExecutor(
+                max_workers=settings.TASK_THREADS, thread_name_prefix='pets-task'
+            )
+    return _local_executor
+
+
+def _submit_local(pk, delay=0):
+    if delay:
+        timer = threading.Timer(delay, _submit_local, args=(pk,))
+        timer.daemon = True
+        timer.start()
+        return
+    _executor().submit(_run_local, pk)
+
+
+def _run_periodic_local():
+    close_old_connections()
+    try:
+        run_periodic()
+    finally:
+        close_old_connections()
+
+
+def _run_local(pk):
+    """Выполнение задачи в потоке веб-процесса (TASK_BACKEND = 'thread')"""
+    close_old_connections()
+    try:
+        worker = worker_id()
+        if _claim(pk, worker):
+            retry_in = execute(pk, worker)
+            if retry_in is not None:
+                _submit_local(pk, retry_in)
+    except Exception:
+        logger.exception('Local task runner failed for #%s', pk)
+    finally:
+        close_old_connections()
+
+
+def status(job):
+    """Статус задачи для ответа API (без трассировки ошибки)"""
+    data = {
+        'id': job.pk,
+        'name': job.name,
+        'status': job.status,
+        'attempts': job.attempts,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    }
+    if job.status == Task.DONE:
+        data['result'] = job.result
+    elif job.status == Task.FAILED:
+        data['error'] = (job.error.strip().splitlines() or [''])[-1]
+    return data
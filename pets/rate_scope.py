@@ -0,0 +1,127 @@
+"""
+Курсы валют на время одного запроса.
+
+Фильтры и теги пересчета в шаблонах вызываются на каждую строку, и раньше
+каждый вызов читал курс отдельным запросом. RateScope собирает пары
+(валюта, дата), которые понадобятся при отрисовке, и читает их курсы
+одним запросом, а дальше отвечает из памяти. Представление может заранее
+зарегистрировать строки страницы (register_expenses), а тег
+convert_expenses делает это сам для всей страницы.
+
+Область создается RateScopeMiddleware в начале каждого запроса. Вне
+запроса (команды, оболочка) каждый вызов получает временную область:
+результат тот же, только без памяти между вызовами.
+"""
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from .money import RateCalendar, convert_minor, convert_minor_back, rate_to_fixed
+
+_scope = ContextVar('pets_rate_scope', default=None)
+
+
+class RateScope:
+    """Курсы на даты и последние курсы, прочитанные за время запроса"""
+
+    def __init__(self):
+        self._pending = set()
+        self._loaded = set()
+        self._rows = []
+        self._calendar = RateCalendar(())
+        self._latest = None
+
+    def register(self, pairs):
+        """Отмечает пары (валюта, дата), курсы которых понадобятся"""
+        for currency, _ in pairs:
+            if currency != 'RUB' and currency not in self._loaded:
+                self._pending.add(currency)
+
+    def register_expenses(self, expenses, currency='RUB'):
+        """Регистрирует курсы для строк расходов и валюты пересчета"""
+        self.register((expense.currency, expense.date) for expense in expenses)
+        self.register([(currency, None)])
+        return expenses
+
+    def resolve(self):
+        """Читает курсы всех зарегистрированных валют одним запросом.
+
+        Курсов на валюту — не больше одного в день, поэтому читается вся
+        история валюты: следующие строки с другими датами уже не требуют
+        запросов.
+        """
+        if not self._pending:
+            return
+        from .models import ExchangeRate
+
+        pending, self._pending = self._pending, set()
+        self._rows.extend(
+            ExchangeRate.objects.filter(currency__in=sorted(pending)).values_list('currency', 'date', 'rate')
+        )
+        self._rows.sort(key=lambda row: row[:2])
+        self._loaded |= pending
+        self._calendar = RateCalendar(self._rows)
+
+    def calendar(self, currencies):
+        """Календарь с историей курсов currencies из этой же области.
+
+        CurrencyReport, созданный с таким календарем, не читает курсы
+        отдельным запросом: итоги страницы и ее строки обходятся одним.
+        """
+        self.register((currency, None) for currency in currencies)
+        self.resolve()
+        return self._calendar
+
+    def rate_on(self, currency, date):
+        """Курс с фиксированной точкой на дату (как ExchangeRate.get_rate_on_date)"""
+        self.register([(currency, date)])
+        self.resolve()
+        return self._calendar.rate_on(currency, date)
+
+    def convert(self, minor, currency, date, target='RUB'):
+        """Сумма в копейках из currency в target по курсам на дату"""
+        if currency == target:
+            return minor
+        self.register([(currency, date), (target, date)])
+        if currency != 'RUB':
+            minor = convert_minor(minor, self.rate_on(currency, date))
+        if target != 'RUB':
+            minor = convert_minor_back(minor, self.rate_on(target, date))
+        return minor
+
+    def latest_rate(self, currency):
+        """Последний активный курс (как ExchangeRate.get_latest_rate)"""
+        if self._latest is None:
+            from .models import ExchangeRate
+
+            active = ExchangeRate.objects.filter(is_active=True)
+            newest = active.filter(currency=OuterRef('currency')).order_by('-date').values('date')[:1]
+            self._latest = {
+                code: rate_to_fixed(rate)
+                for code, rate in active.filter(date=Subquery(newest)).values_list('currency', 'rate')
+            }
+        if currency not in self._latest:
+            self._latest[currency] = rate_to_fixed(Decimal(settings.DEFAULT_EXCHANGE_RATES.get(currency, '1.0')))
+        return self._latest[currency]
+
+
+def current():
+    """Область текущего запроса или временная область вне запроса"""
+    scope = _scope.get()
+    return scope if scope is not None else RateScope()
+
+
+def begin():
+    """Начинает новую область; возвращает токен для end()"""
+    return _scope.set(RateScope())
+
+
+def end(token):
+    _scope.reset(token)
+
+
+def register_expenses(expenses, currency='RUB'):
+    """Регистрирует курсы строк страницы в области текущего запроса"""
+    return current().register_expenses(expenses, currency)
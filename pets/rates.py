@@ -0,0 +1,262 @@
+"""
+Загрузка курсов валют из внешних источников.
+
+Источник отдает котировки (валюта, дата, курс за единицу), которые
+сохраняются одним bulk_create(update_conflicts=True). Для каждой
+запрошенной даты сохраняется действующий курс: пропуски (выходные,
+праздники, дни без данных в файле) заполняются последним известным
+курсом за тот же проход.
+
+После загрузки пересчитываются только расходы, чей курс реально
+изменился: накопленные суммы бюджетов получают разницу. Версия курсов
+(RATES_SCOPE) повышается для всех: пересчет в валюту отчетов зависит от
+курсов, даже если у владельца нет расходов в этой валюте.
+
+Источники:
+    csv — файл со столбцами date, currency, rate[, nominal];
+    cbr — XML в формате ЦБ РФ (XML_daily или XML_dynamic): URL-шаблон
+          с {date} (dd/mm/YYYY) опрашивается по дням, файл или URL без
+          шаблона читается один раз.
+"""
+import csv
+import datetime
+import logging
+import urllib.request
+import xml.etree.ElementTree as ElementTree
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Q
+
+from .budgets import reprice
+from .caching import LATEST_RATE_DATE_KEY, RATES_SCOPE, bump_owner_versions, bump_scope_version
+from .models import ExchangeRate
+from .money import RateCalendar
+
+logger = logging.getLogger(__name__)
+
+FOREIGN_CURRENCIES = [code for code, _ in ExchangeRate.CURRENCIES if code != 'RUB']
+# Коды валют ЦБ РФ в XML_dynamic
+CBR_IDS = {'R01235': 'USD', 'R01239': 'EUR'}
+_RATE_QUANT = Decimal('0.0001')
+
+
+def parse_date(value):
+    value = value.strip()
+    if '.' in value:
+        return datetime.datetime.strptime(value, '%d.%m.%Y').date()
+    return datetime.date.fromisoformat(value)
+
+
+def parse_rate(value, nominal='1'):
+    """Курс за единицу валюты; ЦБ пишет дробную часть через запятую"""
+    try:
+        rate = Decimal(value.strip().replace(',', '.')) / Decimal(str(nominal).strip().replace(',', '.'))
+    except (InvalidOperation, ZeroDivisionError):
+        raise ValueError(f"Invalid rate: {value!r} / {nominal!r}")
+    return rate.quantize(_RATE_QUANT)
+
+
+def read_location(location):
+    """Содержимое файла или URL (http, https, file) в байтах"""
+    if '://' in location:
+        with urllib.request.urlopen(location, timeout=settings.RATES_FETCH_TIMEOUT) as response:
+            return response.read()
+    with open(location, 'rb') as source:
+        return source.read()
+
+
+class RateSource:
+    """Источник котировок: fetch возвращает {(валюта, дата): курс}"""
+
+    def __init__(self, location):
+        self.location = location
+
+    def fetch(self, dates, currencies):
+        raise NotImplementedError
+
+
+class CsvRateSource(RateSource):
+    def fetch(self, dates, currencies):
+        wanted = set(dates)
+        text = read_location(self.location).decode('utf-8-sig')
+        quotes = {}
+        for row in csv.DictReader(text.splitlines()):
+            currency = row['currency'].strip().upper()
+            date = parse_date(row['date'])
+            if currency in currencies and date in wanted:
+                quotes[(currency, date)] = parse_rate(row['rate'], row.get('nominal') or '1')
+        return quotes
+
+
+class CbrXmlRateSource(RateSource):
+    def fetch(self, dates, currencies):
+        quotes = {}
+        if '{date}' in self.location:
+            for date in dates:
+                url = self.location.format(date=date.strftime('%d/%m/%Y'))
+                # Для выходных ЦБ отдает курс, действующий на этот день
+                for (currency, _), rate in self.parse(read_location(url), currencies).items():
+                    quotes[(currency, date)] = rate
+        else:
+            wanted = set(dates)
+            quotes = {
+                key: rate for key, rate in self.parse(read_location(self.location), currencies).items()
+                if key[1] in wanted
+            }
+        return quotes
+
+    @staticmethod
+    def parse(content, currencies):
+        root = ElementTree.fromstring(content)
+        quotes = {}
+        for valute in root.iter('Valute'):
+            currency = valute.findtext('CharCode', '').strip()
+            if currency in currencies:
+                date = parse_date(root.get('Date'))
+                quotes[(currency, date)] = parse_rate(valute.findtext('Value'), valute.findtext('Nominal', '1'))
+        for record in root.iter('Record'):
+            currency = CBR_IDS.get(record.get('Id') or root.get('ID'))
+            if currency in currencies:
+                quotes[(currency, parse_date(record.get('Date')))] = parse_rate(
+                    record.findtext('Value'), record.findtext('Nominal', '1')
+                )
+        return quotes
+
+
+SOURCES = {
+    'csv': CsvRateSource,
+    'cbr': CbrXmlRateSource,
+}
+
+
+def get_source(kind=None, location=None):
+    kind = kind or settings.RATES_SOURCE
+    if kind not in SOURCES:
+        raise ValueError(f"Unknown rate source: {kind}")
+    return SOURCES[kind](location or settings.RATES_LOCATION)
+
+
+def iter_days(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+def missing_dates(start, end, currencies):
+    """Даты диапазона, для которых нет курса хотя бы одной валюты"""
+    existing = set(ExchangeRate.objects.filter(
+        currency__in=currencies, date__range=(start, end)
+    ).values_list('currency', 'date'))
+    return [
+        day for day in iter_days(start, end)
+        if any((currency, day) not in existing for currency in currencies)
+    ]
+
+
+def fill_gaps(quotes, dates, currencies, calendar):
+    """Дополняет котировки действующим курсом на каждую дату.
+
+    Берется более поздний из двух: последний полученный от источника или
+    последний уже сохраненный в базе.
+    """
+    filled = {}
+    for currency in currencies:
+        last = None
+        for day in sorted(dates):
+            if (currency, day) in quotes:
+                last = (day, quotes[(currency, day)])
+                filled[(currency, day)] = last[1]
+                continue
+            stored = calendar.last_known(currency, day)
+            candidates = [value for value in (last, stored) if value is not None]
+            if candidates:
+                filled[(currency, day)] = max(candidates, key=lambda value: value[0])[1]
+    return filled
+
+
+@dataclass
+class IngestResult:
+    requested: int = 0
+    fetched: int = 0
+    created: int = 0
+    updated: int = 0
+    owners: set = field(default_factory=set)
+
+
+def ingest(source, start, end, currencies=None, only_missing=True, dry_run=False):
+    """Загружает курсы за start..end и пересчитывает затронутые суммы"""
+    currencies = [c for c in (currencies or FOREIGN_CURRENCIES) if c in FOREIGN_CURRENCIES]
+    dates = missing_dates(start, end, currencies) if only_missing else list(iter_days(start, end))
+    result = IngestResult(requested=len(dates))
+    if not dates:
+        return result
+
+    quotes = source.fetch(dates, currencies)
+    result.fetched = len(quotes)
+    old_rates = RateCalendar.load(currencies)
+    quotes = fill_gaps(quotes, dates, currencies, old_rates)
+
+    existing = {
+        (currency, date): rate
+        for currency, date, rate in ExchangeRate.objects.filter(
+            currency__in=currencies, date__range=(min(dates), max(dates))
+        ).values_list('currency', 'date', 'rate')
+    }
+    changed = {key: rate for key, rate in quotes.items() if existing.get(key) != rate}
+    result.created = sum(1 for key in changed if key not in existing)
+    result.updated = len(changed) - result.created
+    if dry_run or not changed:
+        return result
+
+    latest_before = ExchangeRate.objects.aggregate(latest=Max('date'))['latest']
+    with transaction.atomic():
+        ExchangeRate.objects.bulk_create(
+            [
+                ExchangeRate(currency=currency, date=date, rate=rate, is_active=True)
+                for (currency, date), rate in changed.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['currency', 'date'],
+            update_fields=['rate', 'is_active'],
+            batch_size=1000,
+        )
+        new_rates = RateCalendar.load(currencies)
+        result.owners = reprice(affected_expenses(changed, new_rates), old_rates, new_rates)
+
+        # bulk_create не отправляет post_save, кэш сбрасывается вручную.
+        # Владельцы с пересчитанными расходами получают и новое время изменения.
+        owners = set(result.owners)
+        transaction.on_commit(lambda: bump_owner_versions(owners))
+        transaction.on_commit(lambda: bump_scope_version(RATES_SCOPE))
+        if latest_before is None or max(date for _, date in changed) > latest_before:
+            transaction.on_commit(lambda: cache.delete(LATEST_RATE_DATE_KEY))
+    return result
+
+
+def affected_expenses(changed, rates):
+    """Условие на расходы, курс которых мог измениться.
+
+    Курс на дату d действует до следующей известной даты той же валюты,
+    поэтому каждая измененная дата дает полуинтервал [d, следующая дата);
+    соседние полуинтервалы объединяются.
+    """
+    condition = Q(pk__in=[])
+    for currency in sorted({currency for currency, _ in changed}):
+        intervals = []
+        for date in sorted(date for code, date in changed if code == currency):
+            until = rates.next_known_date(currency, date)
+            if intervals and intervals[-1][1] is not None and date <= intervals[-1][1]:
+                intervals[-1][1] = until
+            else:
+                intervals.append([date, until])
+        for start, until in intervals:
+            period = Q(currency=currency, date__gte=start)
+            if until is not None:
+                period &= Q(date__lt=until)
+            condition |= period
+    return condition
@@ -0,0 +1,127 @@
+"""
+Регулярные расходы: расписание и пакетное создание наступивших расходов.
+
+Планировщик читает только шаблоны с next_run <= сегодня (индекс
+is_active, next_run), поэтому стоимость запуска пропорциональна числу
+наступивших расходов, а не числу шаблонов. Расходы создаются одним
+bulk_create на порцию; повторный запуск ничего не дублирует благодаря
+сдвигу next_run в той же транзакции и уникальному индексу (recurring, date).
+"""
+import calendar
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from .budgets import record_bulk
+from .caching import bump_owner_versions
+from .models import Expense, RecurringExpense
+from .money import RateCalendar
+from .sync import record_expenses
+
+BATCH_SIZE = 500
+# Сколько пропущенных повторов одного шаблона создается за одну порцию
+MAX_CATCH_UP = 366
+
+
+def _add_months(value, months, day):
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    return datetime.date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+def next_occurrence(template, current):
+    """Следующая дата после current по расписанию шаблона.
+
+    Для месячных и годовых расписаний день берется из start_date, так что
+    расход 31-го числа в коротком месяце приходится на последний день.
+    """
+    interval = template.interval or 1
+    if template.frequency == 'daily':
+        return current + datetime.timedelta(days=interval)
+    if template.frequency == 'weekly':
+        return current + datetime.timedelta(weeks=interval)
+    if template.frequency == 'monthly':
+        return _add_months(current, interval, template.start_date.day)
+    if template.frequency == 'yearly':
+        return _add_months(current, 12 * interval, template.start_date.day)
+    raise ValueError(f"Unknown frequency: {template.frequency}")
+
+
+def due_dates(template, today):
+    """Наступившие даты шаблона и новое значение next_run"""
+    dates = []
+    run = template.next_run
+    while run <= today and (template.end_date is None or run <= template.end_date) and len(dates) < MAX_CATCH_UP:
+        dates.append(run)
+        run = next_occurrence(template, run)
+    return dates, run
+
+
+def _materialize_batch(today, batch_size, rates):
+    """Создает расходы одной порции шаблонов; возвращает (шаблонов, расходов)"""
+    with transaction.atomic():
+        # skip_locked: параллельный запуск возьмет другие шаблоны
+        due = list(
+            RecurringExpense.objects.select_for_update(skip_locked=True)
+            .filter(is_active=True, next_run__lte=today)
+            .order_by('next_run', 'pk')[:batch_size]
+        )
+        if not due:
+            return 0, 0
+
+        planned = []
+        for template in due:
+            dates, template.next_run = due_dates(template, today)
+            if template.end_date and template.next_run > template.end_date:
+                template.is_active = False
+            planned.extend((template, date) for date in dates)
+
+        existing = set()
+        if planned:
+            # Расходы, созданные до сбоя прошлого запуска, не дублируются
+            existing = set(Expense.objects.filter(
+                recurring__in=due,
+                date__range=(min(date for _, date in planned), today),
+            ).values_list('recurring_id', 'date'))
+
+        expenses = [
+            Expense(
+                pet_id=template.pet_id,
+                owner_id=template.owner_id,
+                category_id=template.category_id,
+                amount=template.amount,
+                currency=template.currency,
+                description=template.description,
+                date=date,
+                recurring=template,
+            )
+            for template, date in planned
+            if (template.pk, date) not in existing
+        ]
+        # Сигналы post_save не срабатывают: суммы бюджетов и кэш обновляются ниже
+        Expense.objects.bulk_create(expenses, batch_size=batch_size)
+        RecurringExpense.objects.bulk_update(due, ['next_run', 'is_active'], batch_size=batch_size)
+
+        if expenses:
+            record_bulk(expenses, rates=rates)
+            record_expenses(expenses)
+            owner_ids = {expense.owner_id for expense in expenses}
+            transaction.on_commit(lambda: bump_owner_versions(owner_ids))
+    return len(due), len(expenses)
+
+
+def materialize_due(today=None, batch_size=BATCH_SIZE):
+    """Создает все наступившие регулярные расходы; возвращает (шаблонов, расходов)"""
+    today = today or timezone.localdate()
+    rates = RateCalendar.for_queryset(
+        RecurringExpense.objects.filter(is_active=True, next_run__lte=today), field='next_run', end=today,
+    )
+    templates_total = expenses_total = 0
+    while True:
+        templates, expenses = _materialize_batch(today, batch_size, rates)
+        if not templates:
+            break
+        templates_total += templates
+        expenses_total += expenses
+    return templates_total, expenses_total
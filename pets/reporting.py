@@ -0,0 +1,111 @@
+"""
+Итоги расходов в валюте отчетов пользователя.
+
+Пересчет выполняется над группами, а не над строками: база суммирует
+расходы по (группа, валюта, день), каждая такая сумма переводится по курсу
+этого дня из RateCalendar, и только затем результаты складываются.
+Число пересчетов ограничено числом дней с расходами в каждой валюте,
+поэтому смена валюты отчетов не увеличивает число запросов.
+
+Промежуточные значения — точные дроби, округление до сотых выполняется
+один раз на группу (money.round_fraction).
+"""
+from fractions import Fraction
+
+from django.db.models import Count, Max, Min, Sum
+from django.utils.functional import cached_property
+
+from .models import UserPreferences
+from .money import RATE_SCALE, RateCalendar, currency_symbol, from_minor, round_fraction, to_minor
+
+DEFAULT_CURRENCY = 'RUB'
+
+
+def get_reporting_currency(user):
+    """Валюта отчетов пользователя; запоминается на объекте пользователя"""
+    if not getattr(user, 'is_authenticated', False):
+        return DEFAULT_CURRENCY
+    if not hasattr(user, '_reporting_currency'):
+        user._reporting_currency = UserPreferences.objects.filter(user=user).values_list(
+            'reporting_currency', flat=True
+        ).first() or DEFAULT_CURRENCY
+    return user._reporting_currency
+
+
+class CurrencyReport:
+    """Суммирует расходы в одной валюте отчетов; курсы читаются один раз"""
+
+    def __init__(self, currency=DEFAULT_CURRENCY, rates=None):
+        self.currency = currency
+        if rates is not None:
+            self.__dict__['rates'] = rates
+
+    @classmethod
+    def for_user(cls, user, rates=None):
+        return cls(get_reporting_currency(user), rates)
+
+    @cached_property
+    def rates(self):
+        return RateCalendar.load()
+
+    @property
+    def symbol(self):
+        return currency_symbol(self.currency)
+
+    def convert(self, minor, currency, day):
+        """Точная сумма в валюте отчетов (Fraction, в сотых долях)"""
+        if currency == self.currency:
+            return Fraction(minor)
+        rub = Fraction(minor * self.rates.rate_on(currency, day), RATE_SCALE)
+        if self.currency == 'RUB':
+            return rub
+        return rub * RATE_SCALE / self.rates.rate_on(self.currency, day)
+
+    def totals(self, queryset, *group_by, extremes=False):
+        """Итоги по группам: список словарей с полями group_by и total, count, avg.
+
+        С extremes=True добавляются min и max одного расхода: внутри
+        (валюта, день) курс общий, поэтому экстремумы группы переводятся
+        без чтения отдельных строк.
+        """
+        aggregates = {'amount_total': Sum('amount'), 'row_count': Count('id')}
+        if extremes:
+            aggregates.update(amount_max=Max('amount'), amount_min=Min('amount'))
+        rows = queryset.order_by().values(*group_by, 'currency', 'date').annotate(**aggregates)
+
+        groups = {}
+        for row in rows:
+            key = tuple(row[name] for name in group_by)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {'sum': Fraction(0), 'count': 0, 'max': None, 'min': None}
+            currency, day = row['currency'], row['date']
+            group['sum'] += self.convert(to_minor(row['amount_total']), currency, day)
+            group['count'] += row['row_count']
+            if extremes:
+                high = self.convert(to_minor(row['amount_max']), currency, day)
+                low = self.convert(to_minor(row['amount_min']), currency, day)
+                group['max'] = high if group['max'] is None else max(group['max'], high)
+                group['min'] = low if group['min'] is None else min(group['min'], low)
+
+        result = []
+        for key, group in groups.items():
+            item = dict(zip(group_by, key))
+            item['total'] = from_minor(round_fraction(group['sum']))
+            item['count'] = group['count']
+            item['avg'] = from_minor(round_fraction(group['sum'] / group['count'])) if group['count'] else None
+            if extremes:
+                item['max'] = from_minor(round_fraction(group['max']))
+                item['min'] = from_minor(round_fraction(group['min']))
+            result.append(item)
+        return result
+
+    def total(self, queryset, extremes=False):
+        """Общий итог; для пустой выборки total = 0"""
+        result = self.totals(queryset, extremes=extremes)
+        if result:
+            return result[0]
+        empty = {'total': from_minor(0), 'count': 0, 'avg': None}
+        if extremes:
+            empty.update(max=None, min=None)
+        return empty
@@ -0,0 +1,149 @@
+"""
+Журнал изменений для синхронизации офлайн-клиентов.
+
+Каждое сохранение или удаление питомца и расхода добавляет строку
+ChangeLog владельца. Клиент хранит токен — id последней полученной
+строки — и запрашивает только более новые записи: чтение идет по индексу
+(owner, id), поэтому стоимость синхронизации зависит от числа изменений,
+а не от объема истории.
+
+Первая синхронизация: получить токен (GET /api/sync/ без since), затем
+загрузить списки /api/pets/ и /api/expenses/ и дальше запрашивать
+изменения с этим токеном. Записи, пришедшие дважды, безопасно применить
+повторно.
+
+Массовые операции (bulk_create, QuerySet.update) сигналов не отправляют
+и записывают изменения сами через record_changes.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ChangeLog, Expense, Pet, deleted_with_owner
+
+PET_SYNC_FIELDS = ('id', 'name', 'species', 'breed', 'birth_date', 'created_at')
+EXPENSE_SYNC_FIELDS = ('id', 'pet_id', 'category_id', 'amount', 'currency', 'date', 'description', 'recurring_id')
+
+
+class SyncTokenExpired(Exception):
+    """Записи после токена уже удалены из журнала, нужна полная загрузка"""
+
+
+def record_changes(owner_id, kind, object_ids, deleted=False):
+    """Записывает изменение объектов одного вида одним INSERT"""
+    ChangeLog.objects.bulk_create([
+        ChangeLog(owner_id=owner_id, kind=kind, object_id=object_id, deleted=deleted)
+        for object_id in object_ids
+    ], batch_size=1000)
+
+
+def record_expenses(expenses, deleted=False):
+    """Изменения списка расходов, сгруппированные по владельцам"""
+    by_owner = {}
+    for expense in expenses:
+        by_owner.setdefault(expense.owner_id, []).append(expense.pk)
+    for owner_id, ids in by_owner.items():
+        record_changes(owner_id, 'expense', ids, deleted=deleted)
+
+
+def current_token(owner_id):
+    """Токен, с которого начинать синхронизацию после полной загрузки"""
+    last = ChangeLog.objects.filter(owner_id=owner_id).order_by('-id').values_list('id', flat=True).first()
+    return last or 0
+
+
+def changes_since(owner_id, since, limit):
+    """Изменения владельца после токена since, не больше limit записей журнала.
+
+    Несколько записей об одном объекте сводятся к последней. Для
+    измененных объектов возвращается их текущее состояние; объект, которого
+    уже нет у владельца, отдается как удаленный.
+
+    Записи отдаются по возрастанию id и только до первой записи моложе
+    SYNC_SETTLE_SECONDS: токен не перешагивает ее, даже если более поздние
+    записи уже старше окна. Транзакция, не зафиксированная за это время,
+    не видна чтению, и токен может уйти дальше ее записей; поэтому
+    транзакции, пишущие журнал, должны фиксироваться быстрее окна.
+    """
+    if since:
+        # prune() оставляет последнюю запись каждого владельца, поэтому она —
+        # верхняя граница его токенов, а токен раньше первой записи указывает
+        # на удаленную часть журнала. Границы читаются по индексу (owner, id).
+        bounds = ChangeLog.objects.filter(owner_id=owner_id).aggregate(oldest=Min('id'), newest=Max('id'))
+        if bounds['oldest'] is None or not bounds['oldest'] <= since <= bounds['newest']:
+            raise SyncTokenExpired(since)
+
+    settled = timezone.now() - datetime.timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    entries = list(
+        ChangeLog.objects.filter(owner_id=owner_id, id__gt=since)
+        .order_by('id').values_list('id', 'kind', 'object_id', 'deleted', 'created_at')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    for position, entry in enumerate(entries):
+        if entry[4] >= settled:
+            # Остальные записи придут следующим запросом после окна
+            entries, has_more = entries[:position], False
+            break
+
+    latest = {}
+    for _, kind, object_id, deleted, _ in entries:
+        latest[(kind, object_id)] = deleted
+
+    result = {}
+    for kind, model, fields in (('pet', Pet, PET_SYNC_FIELDS), ('expense', Expense, EXPENSE_SYNC_FIELDS)):
+        changed = [object_id for (k, object_id), deleted in latest.items() if k == kind and not deleted]
+        deleted = {object_id for (k, object_id), is_deleted in latest.items() if k == kind and is_deleted}
+        rows = list(model.objects.filter(owner_id=owner_id, id__in=changed).values(*fields)) if changed else []
+        deleted |= set(changed) - {row['id'] for row in rows}
+        result[kind] = {'changed': rows, 'deleted': sorted(deleted)}
+
+    return {
+        'pets': result['pet'],
+        'expenses': result['expense'],
+        'token': entries[-1][0] if entries else since,
+        'has_more': has_more,
+    }
+
+
+def prune(days=None):
+    """Удаляет записи журнала старше days дней; возвращает число удаленных.
+
+    Последняя запись каждого владельца остается всегда: по ней
+    changes_since отличает актуальный токен от устаревшего и после полной
+    очистки.
+    """
+    days = settings.SYNC_LOG_RETENTION_DAYS if days is None else days
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    newest = ChangeLog.objects.order_by().values('owner_id').annotate(newest=Max('id')).values('newest')
+    deleted, _ = ChangeLog.objects.filter(created_at__lt=cutoff).exclude(id__in=newest).delete()
+    return deleted
+
+
+@receiver(post_save, sender=Pet)
+def pet_saved(sender, instance, **kwargs):
+    record_changes(instance.owner_id, 'pet', [instance.pk])
+
+
+@receiver(post_delete, sender=Pet)
+def pet_deleted(sender, instance, origin=None, **kwargs):
+    # Журнал удаляемого владельца удаляется тем же каскадом
+    if deleted_with_owner(origin):
+        return
+    record_changes(instance.owner_id, 'pet', [instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=Expense)
+def expense_saved(sender, instance, **kwargs):
+    record_changes(instance.owner_id, 'expense', [instance.pk])
+
+
+@receiver(post_delete, sender=Expense)
+def expense_deleted(sender, instance, origin=None, **kwargs):
+    if deleted_with_owner(origin):
+        return
+    record_changes(instance.owner_id, 'expense', [instance.pk], deleted=True)
@@ -0,0 +1,61 @@
+"""
+Фоновые задачи приложения (регистрируются в pets.queue при импорте).
+"""
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import exports, rates
+from .models import Export
+from .queue import periodic, task
+
+
+@task('analytics.charts', max_attempts=2)
+def render_analytics_charts(owner_id, period, currency, cache_key):
+    """Строит графики аналитики и кладет их в кэш под ключом страницы"""
+    from .views import build_analytics_charts
+
+    charts = build_analytics_charts(owner_id, period, currency)
+    cache.set(cache_key, charts, settings.ANALYTICS_CACHE_TIMEOUT)
+    return {'charts': sum(1 for chart in charts.values() if chart)}
+
+
+@task('rates.ingest')
+def ingest_rates(start, end, source=None, location=None, currencies=None, only_missing=True):
+    """Загрузка курсов за start..end (даты в ISO) с пересчетом сумм"""
+    result = rates.ingest(
+        rates.get_source(source, location),
+        datetime.date.fromisoformat(start),
+        datetime.date.fromisoformat(end),
+        currencies=currencies,
+        only_missing=only_missing,
+    )
+    return {
+        'requested': result.requested,
+        'fetched': result.fetched,
+        'created': result.created,
+        'updated': result.updated,
+        'owners': len(result.owners),
+    }
+
+
+@task('exports.build', max_attempts=2)
+def build_export(export_id):
+    """Файл выгрузки расходов (см. pets.exports)"""
+    return exports.build(export_id)
+
+
+@task('exports.expire')
+def expire_export(export_id):
+    """Удаляет выгрузку и ее файл по истечении срока ссылки"""
+    export = Export.objects.filter(pk=export_id).first()
+    if export is not None:
+        exports.delete_export(export)
+    return {'deleted': export is not None}
+
+
+@periodic
+def cleanup_exports():
+    """Просроченные выгрузки, чья задача exports.expire не выполнилась вовремя"""
+    exports.cleanup()
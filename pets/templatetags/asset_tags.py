@@ -0,0 +1,35 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.safestring import mark_safe
+
+from pets.storage import minifier_for
+
+register = template.Library()
+
+# Содержимое встраиваемых файлов на процесс; в DEBUG читается заново
+_inlined = {}
+
+
+def _read(path):
+    if settings.DEBUG or settings.TESTING:
+        # До collectstatic файл есть только в исходниках
+        source = finders.find(path)
+        with open(source, encoding='utf-8') as handle:
+            text = handle.read()
+        minify = minifier_for(path)
+        return minify(text) if minify else text
+    with staticfiles_storage.open(path) as handle:
+        return handle.read().decode('utf-8')
+
+
+@register.simple_tag
+def inline_static(path):
+    """Встраивает файл статики в страницу (критичный CSS без лишнего запроса).
+
+    На продакшене берется собранный collectstatic файл, уже минифицированный.
+    """
+    if settings.DEBUG or path not in _inlined:
+        _inlined[path] = mark_safe(_read(path))
+    return _inlined[path]
@@ -1,12 +1,19 @@
 from django import template
-from decimal import Decimal
+
+from pets import rate_scope
+from pets.money import (
+    to_minor, from_minor, convert_minor, convert_minor_back, format_minor,
+)
 
 register = template.Library()
 
+# Курсы берутся из области текущего запроса (pets.rate_scope): таблица
+# из сотни строк обходится одним запросом к курсам, а не запросом на строку
+
 @register.filter
 def to_rub(expense):
     """Конвертирует расход в рубли"""
-    return expense.amount_in_rub
+    return from_minor(rate_scope.current().convert(to_minor(expense.amount), expense.currency, expense.date))
 
 @register.filter
 def currency_symbol(currency_code):
@@ -19,7 +26,7 @@ def format_currency(amount, currency_code):
     """Форматирует сумму с валютой"""
     symbols = {'RUB': '₽', 'USD': '$', 'EUR': '€'}
     symbol = symbols.get(currency_code, currency_code)
-    
+
     if currency_code == 'RUB':
         return f"{amount} {symbol}"
     else:
@@ -27,24 +34,29 @@ def format_currency(amount, currency_code):
 
 @register.simple_tag
 def convert_and_format(amount, from_currency, to_currency='RUB'):
-    """Конвертирует и форматирует сумму"""
-    # Простая реализация конвертации
-    rates = {'RUB': 1.0, 'USD': 90.0, 'EUR': 100.0}
-    
-    if from_currency == to_currency:
-        converted = amount
-    else:
-        # Конвертируем через рубли
-        amount_in_rub = amount * Decimal(str(rates.get(from_currency, 1.0)))
-        if to_currency == 'RUB':
-            converted = amount_in_rub
-        else:
-            converted = amount_in_rub / Decimal(str(rates.get(to_currency, 1.0)))
-    
-    symbols = {'RUB': '₽', 'USD': '$', 'EUR': '€'}
-    symbol = symbols.get(to_currency, to_currency)
-    
-    if to_currency == 'RUB':
-        return f"{converted:.2f} {symbol}"
-    else:
-        return f"{symbol}{converted:.2f}"
\ No newline at end of file
+    """Конвертирует и форматирует сумму по последним курсам ExchangeRate"""
+    minor = to_minor(amount)
+    if from_currency != to_currency:
+        scope = rate_scope.current()
+        # Конвертируем через рубли в целых копейках
+        if from_currency != 'RUB':
+            minor = convert_minor(minor, scope.latest_rate(from_currency))
+        if to_currency != 'RUB':
+            minor = convert_minor_back(minor, scope.latest_rate(to_currency))
+    return format_minor(minor, to_currency)
+
+@register.simple_tag
+def convert_expenses(expenses, to_currency='RUB'):
+    """Пересчитывает страницу расходов по курсам на даты одним запросом.
+
+    Использование: {% convert_expenses page_obj to_currency as rows %}.
+    Каждой строке добавляются converted_amount и converted_display.
+    """
+    scope = rate_scope.current()
+    expenses = scope.register_expenses(list(expenses), to_currency)
+    scope.resolve()
+    for expense in expenses:
+        minor = scope.convert(to_minor(expense.amount), expense.currency, expense.date, to_currency)
+        expense.converted_amount = from_minor(minor)
+        expense.converted_display = format_minor(minor, to_currency)
+    return expenses
@@ -1,3 +1,1261 @@
-from django.test import TestCase
+import datetime
+import gc
+import importlib.util
+import io
+import json
+import os
+import runpy
+import time
+import weakref
+from decimal import ROUND_HALF_UP, Decimal
+from fractions import Fraction
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models.signals import post_delete
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from petcosttracker import db as db_profiles
+from pets import admin as pets_admin
+from pets import (
+    analytics, budgets, bulk, categories, charts, db_router, money, partitioning, pet_stats, queue, rates,
+    recurring, sync,
+)
+from pets.auth import USER_CACHE_KEY, CachedModelBackend
+from pets.caching import CATALOG_SCOPE, get_data_version, get_scope_version
+from pets.models import (
+    Budget, BudgetAlert, BudgetPeriodTotal, ChangeLog, ExchangeRate, Expense, ExpenseCategory, Export, Pet,
+    RecurringExpense, Task, UserPreferences,
+)
+from pets.pagination import EstimatedCountPaginator, estimate_count
+from pets.reporting import CurrencyReport
+
+
+def create_owner(username='owner', currency=None):
+    """Пользователь с питомцем и категорией для тестов"""
+    user = User.objects.create_user(username, password='secret-pass-123')
+    if currency is not None:
+        UserPreferences.objects.create(user=user, reporting_currency=currency)
+    pet = Pet.objects.create(name='Рекс', species='dog', owner=user)
+    category, _ = ExpenseCategory.objects.get_or_create(name='Корм')
+    return user, pet, category
+
+
+def add_expense(pet, category, amount, currency='RUB', date=None):
+    return Expense.objects.create(
+        pet=pet,
+        category=category,
+        amount=Decimal(amount),
+        currency=currency,
+        date=date or datetime.date.today(),
+    )
+
+
+# ==================== УСЛОВНЫЕ GET ====================
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.pet, self.category = create_owner()
+        self.expense = add_expense(self.pet, self.category, '100')
+        self.client.force_login(self.user)
+        # Первый ответ выдает CSRF-cookie, которая входит в ETag
+        self.client.get(reverse('pets:home'))
+
+    def test_etag_answers_304_until_expense_changes(self):
+        for name in ('pets:home', 'pets:analytics', 'pets:export_csv'):
+            with self.subTest(name):
+                url = reverse(name)
+                first = self.client.get(url)
+                self.assertEqual(first.status_code, 200)
+                self.assertIn('private', first['Cache-Control'])
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        url = reverse('pets:home')
+        etag = self.client.get(url)['ETag']
+        self.expense.amount = Decimal('150')
+        self.expense.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_last_modified_answers_304_until_expense_changes(self):
+        url = reverse('pets:home')
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        # Заголовок с точностью до секунды: изменение — позже
+        later = time.time() + 10
+        with mock.patch('pets.caching.time.time', return_value=later):
+            self.expense.amount = Decimal('150')
+            self.expense.save()
+        changed = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['Last-Modified'], last_modified)
+
+    def test_validator_is_not_shared_between_owners(self):
+        url = reverse('pets:home')
+        etag = self.client.get(url)['ETag']
+
+        other, _, _ = create_owner('other')
+        self.client.force_login(other)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Привет, other!')
+
+
+# ==================== ВЛАДЕЛЕЦ РАСХОДОВ ====================
+
+class ExpenseOwnerTests(TestCase):
+    """Expense.owner и RecurringExpense.owner — копия владельца питомца"""
+
+    def setUp(self):
+        self.user, self.pet, self.category = create_owner()
+        self.other, self.other_pet, _ = create_owner('other')
+
+    def test_expense_owner_follows_its_pet(self):
+        expense = add_expense(self.pet, self.category, '10')
+        self.assertEqual(expense.owner_id, self.user.pk)
+
+        expense.pet = self.other_pet
+        expense.save()
+        self.assertEqual(Expense.objects.get(pk=expense.pk).owner_id, self.other.pk)
+
+    def test_moving_pet_rewrites_owner_copies(self):
+        expense = add_expense(self.pet, self.category, '10')
+        recurring = RecurringExpense.objects.create(
+            pet=self.pet, category=self.category, amount=Decimal('5'), start_date=datetime.date.today(),
+        )
+        self.assertEqual(recurring.owner_id, self.user.pk)
+        token = sync.current_token(self.user.pk)
+
+        self.pet.owner = self.other
+        self.pet.save()
+
+        self.assertEqual(Expense.objects.get(pk=expense.pk).owner_id, self.other.pk)
+        self.assertEqual(RecurringExpense.objects.get(pk=recurring.pk).owner_id, self.other.pk)
+        self.assertFalse(Expense.objects.filter(owner=self.user).exists())
+        # Суммы бюджетов переехали к новому владельцу
+        month = expense.date.replace(day=1)
+        self.assertFalse(BudgetPeriodTotal.objects.filter(owner=self.user, total_minor__gt=0).exists())
+        self.assertEqual(BudgetPeriodTotal.objects.get(
+            owner=self.other, month=month, pet_key=0, category_key=0
+        ).total_minor, 1000)
+        # Прежний владелец получает удаление питомца и расхода при синхронизации
+        self.assertEqual(
+            set(ChangeLog.objects.filter(owner=self.user, id__gt=token, deleted=True).values_list('kind', 'object_id')),
+            {('pet', self.pet.pk), ('expense', expense.pk)},
+        )
+
+
+# ==================== РЕПЛИКИ ====================
+
+REPLICA = 'replica_test'
+
+
+@override_settings(
+    REPLICA_DATABASES=[REPLICA],
+    DATABASE_ROUTERS=['pets.db_router.ReplicaRouter'],
+    MIDDLEWARE=settings.MIDDLEWARE + ['pets.middleware.ReplicaRoutingMiddleware'],
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Две базы: основная и реплика-зеркало (TEST MIRROR) на тех же данных"""
+
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        cache.clear()
+        db_router._replica_health.clear()
+        self.user, self.pet, self.category = create_owner()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        db_router.set_read_alias(None)
+
+    def test_read_view_queries_replica(self):
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client.get(reverse('pets:pet_list'))
+        self.assertContains(response, 'Рекс')
+        self.assertTrue(replica.captured_queries)
+
+    def test_write_goes_to_primary_and_pins_client(self):
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client.post(reverse('pets:pet_add'), {'name': 'Мурка', 'species': 'cat'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(replica.captured_queries, [])
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+        # Следующее чтение клиента идет в основную базу
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            self.client.get(reverse('pets:pet_list'))
+        self.assertEqual(replica.captured_queries, [])
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        with mock.patch.object(db_router, 'replica_lag', side_effect=OSError('down')):
+            self.assertIsNone(db_router.choose_replica())
+            with CaptureQueriesContext(connections[REPLICA]) as replica:
+                response = self.client.get(reverse('pets:pet_list'))
+        self.assertContains(response, 'Рекс')
+        self.assertEqual(replica.captured_queries, [])
+
+    def test_task_queue_reads_primary(self):
+        db_router.set_read_alias(REPLICA)
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            Task.objects.count()
+            Pet.objects.count()
+        self.assertEqual(len(replica.captured_queries), 1)
+
+    def test_database_cache_reads_primary(self):
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'pets_cache_test',
+        }}):
+            call_command('createcachetable', verbosity=0)
+            db_router.set_read_alias(REPLICA)
+            with CaptureQueriesContext(connections[REPLICA]) as replica:
+                cache.set('pets:test', 'value')
+                self.assertEqual(cache.get('pets:test'), 'value')
+        self.assertEqual(replica.captured_queries, [])
+
+
+# ==================== СОЕДИНЕНИЯ ====================
+
+POSTGRES = 'django.db.backends.postgresql'
+
+
+class ConnectionProfileTests(SimpleTestCase):
+
+    def test_pool_requires_django_51(self):
+        with mock.patch.object(db_profiles.django, 'VERSION', (4, 2, 11, 'final', 0)):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'Django 5.1+'):
+                db_profiles.tune_database({'ENGINE': POSTGRES}, 'pool')
+
+    def test_pool_requires_psycopg3(self):
+        with mock.patch.object(db_profiles.django, 'VERSION', (5, 1, 0, 'final', 0)), \
+                mock.patch.object(db_profiles, 'find_spec', return_value=None):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'psycopg[pool]'):
+                db_profiles.tune_database({'ENGINE': POSTGRES}, 'pool')
+
+    def test_pool_options_split_server_limit(self):
+        with mock.patch.object(db_profiles, 'check_pool_support'):
+            config = db_profiles.tune_database(
+                {'ENGINE': POSTGRES}, 'pool', workers=4, threads=4, max_connections=20,
+            )
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 5)
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+
+    def test_other_modes_need_no_pool(self):
+        config = db_profiles.tune_database({'ENGINE': POSTGRES}, 'pgbouncer')
+        self.assertNotIn('pool', config['OPTIONS'])
+        self.assertTrue(config['DISABLE_SERVER_SIDE_CURSORS'])
+
+
+class GunicornConfigTests(SimpleTestCase):
+    """gunicorn.conf.py: число воркеров и потоков и их передача в settings"""
+
+    NAMES = ('GUNICORN_WORKER_CLASS', 'WEB_CONCURRENCY', 'GUNICORN_THREADS', 'GUNICORN_MAX_WORKERS')
+
+    def load(self, env, cores=2):
+        with mock.patch.dict(os.environ, env), mock.patch('multiprocessing.cpu_count', return_value=cores):
+            for name in set(self.NAMES) - set(env):
+                os.environ.pop(name, None)
+            config = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+            exported = int(os.environ['WEB_CONCURRENCY']), int(os.environ['GUNICORN_THREADS'])
+        return config, exported
+
+    def test_workers_and_threads(self):
+        # (окружение, ядра, воркеры, потоки)
+        for env, cores, workers, threads in [
+            ({}, 2, 3, 4),
+            ({}, 8, 4, 4),
+            ({'GUNICORN_MAX_WORKERS': '2'}, 8, 2, 4),
+            ({'GUNICORN_WORKER_CLASS': 'sync'}, 1, 3, 1),
+            ({'GUNICORN_WORKER_CLASS': 'sync'}, 2, 4, 1),
+            ({'GUNICORN_WORKER_CLASS': 'uvicorn', 'GUNICORN_THREADS': '8'}, 2, 3, 1),
+            ({'WEB_CONCURRENCY': '7', 'GUNICORN_THREADS': '8'}, 2, 7, 8),
+        ]:
+            with self.subTest(env=env, cores=cores):
+                config, exported = self.load(env, cores)
+                self.assertEqual((config['workers'], config['threads']), (workers, threads))
+                # settings читает итоговые значения из окружения
+                self.assertEqual(exported, (workers, threads))
+
+    def test_exported_values_size_the_pool(self):
+        _, (workers, threads) = self.load({'GUNICORN_THREADS': '8'}, cores=3)
+        with mock.patch.object(db_profiles, 'check_pool_support'):
+            config = db_profiles.tune_database(
+                {'ENGINE': POSTGRES}, 'pool', workers=workers, threads=threads, max_connections=20,
+            )
+        self.assertEqual((workers, threads), (4, 8))
+        self.assertEqual((config['OPTIONS']['pool']['min_size'], config['OPTIONS']['pool']['max_size']), (5, 5))
+
+    def test_worker_class(self):
+        with self.assertRaisesMessage(RuntimeError, 'GUNICORN_WORKER_CLASS'):
+            self.load({'GUNICORN_WORKER_CLASS': 'eventlet'})
+        self.assertEqual(self.load({'GUNICORN_WORKER_CLASS': 'uvicorn'})[0]['wsgi_app'], 'petcosttracker.asgi:application')
+
+
+class MigrationTests(TestCase):
+
+    def test_migrations_match_models(self):
+        # Миграции собраны закрепленной версией Django: новых изменений быть не должно
+        out = io.StringIO()
+        call_command('makemigrations', 'pets', check=True, dry_run=True, stdout=out)
+        self.assertIn('No changes detected', out.getvalue())
+
+
+# ==================== СЕКЦИОНИРОВАНИЕ ====================
+
+class PartitionPeriodTests(SimpleTestCase):
+
+    def test_month_periods_cross_year(self):
+        periods = list(partitioning.iter_periods(
+            datetime.date(2023, 11, 15), datetime.date(2024, 1, 2), 'month'
+        ))
+        self.assertEqual(
+            [partitioning.partition_name(start, 'month') for start, _ in periods],
+            ['pets_expense_m202311', 'pets_expense_m202312', 'pets_expense_m202401'],
+        )
+        self.assertEqual(periods[-1][1], datetime.date(2024, 2, 1))
+
+    def test_detect_granularity(self):
+        year = [('pets_expense_y2024', datetime.date(2024, 1, 1), datetime.date(2025, 1, 1))]
+        month = [('pets_expense_m202412', datetime.date(2024, 12, 1), datetime.date(2025, 1, 1))]
+        self.assertEqual(partitioning.detect_granularity(year), 'year')
+        self.assertEqual(partitioning.detect_granularity(month), 'month')
+
+    def test_analytics_periods_bound_date_on_both_sides(self):
+        """Отсечение секций возможно, только если дата ограничена с двух сторон"""
+        from pets.views import _get_period_dates
+        for period in ('week', 'month', 'year'):
+            start_date, end_date = _get_period_dates(period)
+            sql = str(Expense.objects.filter(owner_id=1, date__range=(start_date, end_date)).query)
+            self.assertIn('BETWEEN', sql)
+            self.assertEqual(end_date, timezone.localdate())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'секционирование есть только на PostgreSQL')
+class PartitionPruningTests(TestCase):
+    """Планы запросов аналитики читают только секции своего периода"""
+
+    def setUp(self):
+        self.user, self.pet, self.category = create_owner()
+        for date in (datetime.date(2019, 6, 1), datetime.date(2021, 3, 1), datetime.date.today()):
+            add_expense(self.pet, self.category, '100', date=date)
+        self.assertTrue(partitioning.partition_table(connection, 'year'))
+
+    def overlapping(self, start_date, end_date):
+        return {
+            partitioning.partition_name(start, 'year')
+            for start, _ in partitioning.iter_periods(start_date, end_date, 'year')
+        }
+
+    def test_conversion_keeps_rows(self):
+        self.assertEqual(Expense.objects.filter(owner=self.user).count(), 3)
+        with connection.cursor() as cursor:
+            names = [name for name, _, _ in partitioning.list_partitions(cursor)]
+        self.assertIn('pets_expense_y2019', names)
+        self.assertIn(partitioning.DEFAULT_PARTITION, names)
+
+    def test_recent_periods_prune_old_partitions(self):
+        from pets.views import _get_period_dates
+        for period in ('week', 'month', 'year'):
+            start_date, end_date = _get_period_dates(period)
+            queryset = Expense.objects.filter(
+                owner_id=self.user.pk, date__range=(start_date, end_date)
+            ).values('category__name')
+            scanned = set(partitioning.scanned_partitions(queryset)) - {partitioning.DEFAULT_PARTITION}
+            self.assertEqual(scanned, self.overlapping(start_date, end_date), period)
+
+    def test_archive_detaches_old_partitions(self):
+        archived = partitioning.archive_partitions(connection, datetime.date(2020, 1, 1))
+        self.assertEqual(archived, ['pets_expense_y2019'])
+        self.assertEqual(Expense.objects.filter(owner=self.user).count(), 2)
+
+
+# ==================== АУТЕНТИФИКАЦИЯ ====================
+
+class CachedModelBackendTests(TestCase):
+
+    def setUp(self):
+        self.user, _, _ = create_owner()
+        cache.delete(USER_CACHE_KEY.format(self.user.pk))
+
+    @override_settings(SHARED_CACHE=True)
+    def test_shared_cache_skips_database(self):
+        backend = CachedModelBackend()
+        self.assertEqual(backend.get_user(self.user.pk), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(self.user.pk), self.user)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_process_cache_reads_database(self):
+        backend = CachedModelBackend()
+        self.assertEqual(backend.get_user(self.user.pk), self.user)
+        self.assertIsNone(cache.get(USER_CACHE_KEY.format(self.user.pk)))
+        with self.assertNumQueries(1):
+            backend.get_user(self.user.pk)
+
+    @override_settings(DEBUG=True)
+    def test_emergency_login_uses_configured_backend(self):
+        self.client.get(reverse('pets:emergency_login'))
+        self.assertEqual(self.client.session['_auth_user_backend'], 'pets.auth.CachedModelBackend')
+        self.assertEqual(self.client.get(reverse('pets:home')).wsgi_request.user.username, 'test_admin')
+
+
+# ==================== ДЕНЬГИ ====================
+
+def decimal_round(value):
+    """Эталон: округление Decimal половины от нуля до целого"""
+    return int(Decimal(value).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+# Суммы и курсы для сверки с Decimal, включая половины и отрицательные значения
+MINOR_SAMPLES = [0, 1, 3, 5, 7, 15, 25, 99, 12345, 987654321, -1, -3, -5, -15, -12345, -987654321]
+RATE_SAMPLES = [1, 2500, 5000, 7500, 9999, 10_000, 15_000, 12_345, 770_000, 1_234_567]
+
+
+class MoneyTests(SimpleTestCase):
+
+    def test_to_minor_rounds_half_away_from_zero(self):
+        # (сумма, копейки): при округлении к четному 0.125, 0.025 и 1.23445 дали бы другое
+        for amount, expected in [
+            ('0', 0), (None, 0), (3, 300), ('12.344', 1234), ('0.125', 13), ('0.025', 3), ('0.015', 2),
+            ('1.005', 101), ('-0.125', -13), ('-0.025', -3), ('-1.005', -101), (Decimal('99999999.99'), 9999999999),
+        ]:
+            with self.subTest(amount=amount):
+                self.assertEqual(money.to_minor(amount), expected)
+
+    def test_rate_scale(self):
+        for rate, expected in [
+            ('1', 10_000), ('77.1234', 771_234), ('1.23445', 12_345), ('1.23435', 12_344), ('0.00005', 1),
+            ('0.00004', 0), (Decimal('10000'), 100_000_000),
+        ]:
+            with self.subTest(rate=rate):
+                self.assertEqual(money.rate_to_fixed(rate), expected)
+                self.assertEqual(money.rate_to_fixed(money.fixed_to_rate(expected)), expected)
+
+    def test_conversion_matches_decimal(self):
+        for minor in MINOR_SAMPLES:
+            for rate in RATE_SAMPLES:
+                with self.subTest(minor=minor, rate=rate):
+                    self.assertEqual(
+                        money.convert_minor(minor, rate),
+                        decimal_round(Decimal(minor) * rate / money.RATE_SCALE),
+                    )
+                    self.assertEqual(
+                        money.convert_minor_back(minor, rate),
+                        decimal_round(Decimal(minor) * money.RATE_SCALE / rate),
+                    )
+
+    def test_sum_rounds_once(self):
+        pairs = [(1, 5000), (1, 5000), (1, 5000)]
+        # Три половины копейки — 1.5 → 2, а не 1 + 1 + 1
+        self.assertEqual(money.sum_converted(pairs), 2)
+        self.assertEqual(money.sum_converted([(-1, 5000)] * 3), -2)
+
+    @skipUnless(analytics.NUMPY_AVAILABLE, 'NumPy не установлен')
+    def test_arrays_match_scalars(self):
+        import numpy as np
+
+        minor = np.array([m for m in MINOR_SAMPLES for _ in RATE_SAMPLES], dtype=np.int64)
+        rates = np.array(RATE_SAMPLES * len(MINOR_SAMPLES), dtype=np.int64)
+        self.assertEqual(
+            money.convert_minor_array(minor, rates).tolist(),
+            [money.convert_minor(int(m), int(r)) for m, r in zip(minor, rates)],
+        )
+        self.assertEqual(
+            money.convert_minor_back_array(minor, rates).tolist(),
+            [money.convert_minor_back(int(m), int(r)) for m, r in zip(minor, rates)],
+        )
+
+    @skipUnless(analytics.NUMPY_AVAILABLE, 'NumPy не установлен')
+    def test_int64_bounds(self):
+        import numpy as np
+
+        # Граница из документации модуля: 10^8 ₽ в строке при курсе до 10^4
+        largest = money.to_minor('99999999.99')
+        top_rate = money.rate_to_fixed('10000')
+        self.assertLess(largest * top_rate, np.iinfo(np.int64).max)
+        for sign in (1, -1):
+            rub = money.convert_minor_array(np.array([sign * largest]), np.array([top_rate]))
+            self.assertEqual(rub.tolist(), [money.convert_minor(sign * largest, top_rate)])
+            back = money.convert_minor_back_array(rub, np.array([top_rate]))
+            self.assertEqual(back.tolist(), [sign * largest])
+
+
+# ==================== БЮДЖЕТЫ ====================
+
+class BudgetRollupTests(TestCase):
+
+    def setUp(self):
+        self.user, self.pet, self.category = create_owner()
+        self.month = timezone.localdate().replace(day=1)
+
+    def total(self, pet_key=0, category_key=0):
+        row = BudgetPeriodTotal.objects.filter(
+            owner=self.user, month=self.month, pet_key=pet_key, category_key=category_key
+        ).first()
+        return row.total_minor if row else 0
+
+    def test_totals_follow_save_edit_and_delete(self):
+        expense = add_expense(self.pet, self.category, '100.50')
+        self.assertEqual(self.total(), 10050)
+        self.assertEqual(self.total(self.pet.pk, self.category.pk), 10050)
+
+        expense.amount = Decimal('40')
+        expense.save()
+        self.assertEqual(self.total(), 4000)
+
+        expense.delete()
+        self.assertEqual(self.total(), 0)
+        self.assertEqual(self.total(self.pet.pk, 0), 0)
+
+    def test_save_without_original_loads_stored_row(self):
+        expense = add_expense(self.pet, self.category, '100')
+        # Объект собран вручную: прежний вклад читается из базы одной выборкой по pk
+        rebuilt = Expense(
+            pk=expense.pk, pet=self.pet, category=self.category, amount=Decimal('30'),
+            currency='RUB', date=expense.date, created_at=expense.created_at,
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(budgets.stored_state(rebuilt.pk), expense.rollup_state())
+        with mock.patch('pets.budgets.rebuild_owner_totals') as rebuild:
+            rebuilt.save()
+        rebuild.assert_not_called()
+        self.assertEqual(self.total(), 3000)
+
+        partial = Expense.objects.only('pk', 'amount').get(pk=expense.pk)
+        partial.amount = Decimal('12.50')
+        partial.save(update_fields=['amount'])
+        self.assertEqual(self.total(), 1250)
+        self.assertEqual(self.total(self.pet.pk, self.category.pk), 1250)
+
+    def test_deleting_pet_subtracts_its_expenses(self):
+        other = Pet.objects.create(name='Мурка', species='cat', owner=self.user)
+        add_expense(self.pet, self.category, '10')
+        add_expense(other, self.category, '5')
+        self.pet.delete()
+        self.assertEqual(self.total(), 500)
+
+    def test_deleting_owner_drops_totals(self):
+        Budget.objects.create(owner=self.user, monthly_limit=Decimal('50'))
+        add_expense(self.pet, self.category, '100')
+        owner_id = self.user.pk
+
+        self.user.delete()
+        self.assertFalse(BudgetPeriodTotal.objects.filter(owner_id=owner_id).exists())
+        self.assertFalse(Budget.objects.filter(owner_id=owner_id).exists())
+        self.assertFalse(ChangeLog.objects.filter(owner_id=owner_id).exists())
+        # Внешние ключи проверяются при фиксации; проверяем сразу
+        connection.check_constraints()
+
+    def test_bulk_delete_subtracts_once(self):
+        kept = add_expense(self.pet, self.category, '7')
+        doomed = [add_expense(self.pet, self.category, amount).pk for amount in ('10', '20')]
+        other, other_pet, other_category = create_owner('other')
+        foreign = add_expense(other_pet, other_category, '30')
+        token = sync.current_token(self.user.pk)
+
+        self.assertEqual(bulk.delete_expenses(self.user.pk, doomed + [foreign.pk]), 2)
+        self.assertEqual(self.total(), 700)
+        self.assertEqual(self.total(self.pet.pk, self.category.pk), 700)
+        self.assertEqual(list(Expense.objects.filter(owner=self.user)), [kept])
+        self.assertTrue(Expense.objects.filter(pk=foreign.pk).exists())
+        # Одна запись журнала на удаленный расход, а не по одной от сигнала и от пакета
+        self.assertEqual(
+            sorted(ChangeLog.objects.filter(owner=self.user, id__gt=token).values_list('object_id', flat=True)), sorted(doomed)
+        )
+
+
+    def test_bulk_delete_skips_collector(self):
+        doomed = [add_expense(self.pet, self.category, amount).pk for amount in ('10', '20', '30')]
+        received = []
+
+        def receiver(sender, instance, **kwargs):
+            received.append(instance.pk)
+
+        post_delete.connect(receiver, sender=Expense)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Expense)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(bulk.delete_expenses(self.user.pk, doomed), 3)
+        # Строки не загружаются в модели и сигналы не отправляются: один SELECT ключей и один DELETE
+        statements = [query['sql'] for query in queries if '"pets_expense"' in query['sql']]
+        self.assertEqual([sql.split()[0] for sql in statements], ['SELECT', 'DELETE'])
+        self.assertEqual(received, [])
+        self.assertEqual(self.total(), 0)
+
+# ==================== РЕГУЛЯРНЫЕ РАСХОДЫ ====================
+
+class RecurringSchedulerTests(TestCase):
+
+    def setUp(self):
+        self.user, self.pet, self.category = create_owner()
+
+    def template(self, start, frequency='monthly', **kwargs):
+        return RecurringExpense.objects.create(
+            pet=self.pet, category=self.category, amount=Decimal('100'),
+            frequency=frequency, start_date=start, **kwargs
+        )
+
+    def dates(self, template):
+        return list(Expense.objects.filter(recurring=template).order_by('date').values_list('date', flat=True))
+
+    def test_month_end_is_clamped(self):
+        template = self.template(datetime.date(2024, 1, 31))
+        self.assertEqual(recurring.materialize_due(datetime.date(2024, 5, 15)), (1, 4))
+        self.assertEqual(self.dates(template), [
+            datetime.date(2024, 1, 31), datetime.date(2024, 2, 29),
+            datetime.date(2024, 3, 31), datetime.date(2024, 4, 30),
+        ])
+        template.refresh_from_db()
+        # День берется из start_date, а не из укороченного февраля
+        self.assertEqual(template.next_run, datetime.date(2024, 5, 31))
+
+        leap = self.template(datetime.date(2024, 2, 29), frequency='yearly')
+        self.assertEqual(recurring.next_occurrence(leap, leap.start_date), datetime.date(2025, 2, 28))
+        self.assertEqual(recurring.next_occurrence(leap, datetime.date(2027, 2, 28)), datetime.date(2028, 2, 29))
+
+    def test_rerun_does_not_duplicate(self):
+        template = self.template(datetime.date(2024, 1, 10), end_date=datetime.date(2024, 3, 10))
+        today = datetime.date(2024, 6, 1)
+        self.assertEqual(recurring.materialize_due(today), (1, 3))
+        self.assertEqual(recurring.materialize_due(today), (0, 0))
+
+        # Сбой после вставки расходов: next_run не сдвинулся, шаблон снова наступил
+        RecurringExpense.objects.filter(pk=template.pk).update(next_run=template.start_date, is_active=True)
+        self.assertEqual(recurring.materialize_due(today), (1, 0))
+        self.assertEqual(len(self.dates(template)), 3)
+        template.refresh_from_db()
+        self.assertFalse(template.is_active)
+
+    def test_bulk_create_updates_budgets_and_changelog(self):
+        budget = Budget.objects.create(owner=self.user, monthly_limit=Decimal('150'))
+        token = sync.current_token(self.user.pk)
+        self.template(datetime.date(2024, 1, 5), frequency='weekly', interval=2, end_date=datetime.date(2024, 2, 29))
+
+        self.assertEqual(recurring.materialize_due(datetime.date(2024, 3, 1)), (1, 4))
+        totals = dict(BudgetPeriodTotal.objects.filter(
+            owner=self.user, pet_key=0, category_key=0,
+        ).values_list('month', 'total_minor'))
+        # Январь: 5 и 19; февраль: 2 и 16 (по 100 ₽), 1 марта уже после end_date
+        self.assertEqual(totals, {datetime.date(2024, 1, 1): 20000, datetime.date(2024, 2, 1): 20000})
+        self.assertEqual(
+            sorted(BudgetAlert.objects.filter(budget=budget).values_list('month', 'spent_minor')),
+            [(datetime.date(2024, 1, 1), 20000), (datetime.date(2024, 2, 1), 20000)],
+        )
+        self.assertEqual(
+            sorted(ChangeLog.objects.filter(owner=self.user, id__gt=token).values_list('object_id', flat=True)),
+            sorted(Expense.objects.filter(owner=self.user).values_list('pk', flat=True)),
+        )
+
+
+# ==================== КУРСЫ ====================
+
+class StaticSource:
+    """Источник курсов с заранее заданными котировками"""
+
+    def __init__(self, quotes):
+        self.quotes = quotes
+
+    def fetch(self, dates, currencies):
+        return {key: rate for key, rate in self.quotes.items() if key[1] in dates and key[0] in currencies}
+
+
+class RateIngestTests(TestCase):
+
+    def test_ingest_invalidates_owners_without_foreign_expenses(self):
+        """Суммы в USD у владельца только рублевых расходов зависят от курса"""
+        user, pet, category = create_owner(currency='USD')
+        add_expense(pet, category, '770')
+        before = get_data_version(user.pk)
+
+        today = timezone.localdate()
+        source = StaticSource({('USD', today): Decimal('70.0000'), ('EUR', today): Decimal('80.0000')})
+        with self.captureOnCommitCallbacks(execute=True):
+            result = rates.ingest(source, today, today, only_missing=False)
+
+        self.assertEqual(result.owners, set())
+        self.assertGreater(result.created + result.updated, 0)
+        self.assertNotEqual(get_data_version(user.pk), before)
+
+    def test_unchanged_rates_keep_versions(self):
+        user, pet, category = create_owner()
+        today = timezone.localdate()
+        source = StaticSource({('USD', today): Decimal('70.0000'), ('EUR', today): Decimal('80.0000')})
+        with self.captureOnCommitCallbacks(execute=True):
+            rates.ingest(source, today, today, only_missing=False)
+        before = get_data_version(user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = rates.ingest(source, today, today, only_missing=False)
+        self.assertEqual(result.created + result.updated, 0)
+        self.assertEqual(get_data_version(user.pk), before)
+
+
+class RateCalendarRangeTests(TestCase):
+
+    def setUp(self):
+        day = datetime.date(2020, 1, 1)
+        for offset, rate in [(0, '70'), (10, '71'), (20, '72'), (30, '73')]:
+            ExchangeRate.objects.create(currency='USD', date=day + datetime.timedelta(days=offset), rate=Decimal(rate))
+        ExchangeRate.objects.create(currency='EUR', date=day, rate=Decimal('80'))
+        self.day = day
+
+    def test_range_keeps_rate_before_start(self):
+        start, end = self.day + datetime.timedelta(days=15), self.day + datetime.timedelta(days=25)
+        full = money.RateCalendar.load()
+        scoped = money.RateCalendar.load({'USD'}, start, end)
+        for offset in range(15, 26):
+            date = self.day + datetime.timedelta(days=offset)
+            self.assertEqual(scoped.rate_on('USD', date), full.rate_on('USD', date))
+        # Курсы вне диапазона и других валют не читаются
+        self.assertIsNone(scoped.next_known_date('USD', end))
+        self.assertEqual(scoped.rate_on('EUR', end), money.RATE_SCALE)
+
+    def test_covering_reads_only_present_currencies(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(money.RateCalendar.covering([('RUB', self.day)]).rate_on('USD', self.day), money.RATE_SCALE)
+        calendar = money.RateCalendar.covering([('USD', self.day + datetime.timedelta(days=12)), ('RUB', self.day)])
+        self.assertEqual(calendar.rate_on('USD', self.day + datetime.timedelta(days=12)), 710_000)
+        self.assertIsNone(calendar.last_known('EUR', self.day))
+
+    def test_queryset_range(self):
+        user, pet, category = create_owner()
+        add_expense(pet, category, '1', currency='USD', date=self.day + datetime.timedelta(days=12))
+        add_expense(pet, category, '1', currency='USD', date=self.day + datetime.timedelta(days=22))
+        add_expense(pet, category, '1', date=self.day + datetime.timedelta(days=40))
+        with self.assertNumQueries(2):
+            calendar = money.RateCalendar.for_queryset(Expense.objects.filter(owner=user))
+        self.assertEqual(calendar.last_known('USD', self.day + datetime.timedelta(days=12))[1], Decimal('71'))
+        self.assertIsNone(calendar.next_known_date('USD', self.day + datetime.timedelta(days=22)))
+
+
+# ==================== АНАЛИТИКА ====================
+
+class MixedCurrencyAnalyticsTests(TestCase):
+    """Расходы в разных валютах сводятся в валюту отчетов"""
+
+    def setUp(self):
+        self.user, self.pet, self.category = create_owner()
+        today = timezone.localdate()
+        ExchangeRate.objects.update_or_create(currency='USD', date=today, defaults={'rate': Decimal('77')})
+        add_expense(self.pet, self.category, '100', 'RUB', today)
+        add_expense(self.pet, self.category, '10', 'USD', today)
+
+    def test_rub_report(self):
+        extract = analytics.load_extract(self.user.pk, 'RUB')
+        self.assertEqual(int(extract.amounts.sum()), 87000)
+        report = analytics.compute_report(extract)
+        self.assertEqual(report['monthly'][-1]['total'], 870.0)
+
+    def test_usd_report(self):
+        extract = analytics.load_extract(self.user.pk, 'USD')
+        # 100 ₽ / 77 = 1.30 $ плюс 10 $
+        self.assertEqual(int(extract.amounts.sum()), 1130)
+
+
+
+class AnalyticsReferenceTests(TestCase):
+    """Векторный отчет против прямого расчета на Python по тем же расходам"""
+
+    def setUp(self):
+        self.user, self.pet, self.food = create_owner()
+        self.vet, _ = ExpenseCategory.objects.get_or_create(name='Ветеринар')
+        # 15 месяцев истории с пропущенным месяцем и неровными суммами
+        self.rows = []
+        for index in range(15):
+            if index == 4:
+                continue
+            year, month = 2024 + index // 12, index % 12 + 1
+            for day, category, amount in ((3, self.food, 1000 + 137 * index), (17, self.vet, 250 * (index % 5))):
+                if amount:
+                    date = datetime.date(year, month, day)
+                    add_expense(self.pet, category, str(Decimal(amount) / 100), date=date)
+                    self.rows.append((date, category.pk, amount))
+
+    def reference_monthly(self):
+        by_month = {}
+        for date, _, amount in self.rows:
+            key = date.year * 12 + date.month - 1
+            by_month[key] = by_month.get(key, 0) + amount
+        return [by_month.get(key, 0) for key in range(min(by_month), max(by_month) + 1)]
+
+    def test_matches_python_reference(self):
+        report = analytics.compute_report(analytics.load_extract(self.user.pk))
+        totals = self.reference_monthly()
+        self.assertEqual(report['rows'], len(self.rows))
+        self.assertEqual([item['month'] for item in report['monthly']][:2], ['2024-01', '2024-02'])
+
+        for i, item in enumerate(report['monthly']):
+            self.assertEqual(item['total'], totals[i] / 100)
+            rolling = round(sum(totals[i - 2:i + 1]) / 3 / 100, 2) if i >= 2 else None
+            self.assertEqual(item['rolling_avg'], rolling)
+            base = totals[i - 12] if i >= 12 else 0
+            self.assertEqual(item['yoy_percent'], round((totals[i] - base) / base * 100, 1) if base else None)
+
+        for item in report['seasonality']:
+            by_month = [0] * 12
+            for date, category_id, amount in self.rows:
+                if category_id == item['category_id']:
+                    by_month[date.month - 1] += amount
+            mean = sum(by_month) / 12
+            self.assertEqual(item['index'], [round(value / mean, 2) for value in by_month])
+            self.assertEqual(item['peak_month'], by_month.index(max(by_month)) + 1)
+
+        # Метод наименьших квадратов по последним 12 месяцам
+        recent = totals[-12:]
+        n = len(recent)
+        x_mean, y_mean = (n - 1) / 2, sum(recent) / n
+        covariance = sum((x - x_mean) * (y - y_mean) for x, y in enumerate(recent))
+        slope = covariance / sum((x - x_mean) ** 2 for x in range(n))
+        intercept = y_mean - slope * x_mean
+        self.assertEqual([item['month'] for item in report['forecast']], ['2025-04', '2025-05', '2025-06'])
+        for step, item in enumerate(report['forecast']):
+            self.assertAlmostEqual(item['total'], max(slope * (n + step) + intercept, 0) / 100, places=2)
+
+    def test_empty_owner(self):
+        other, _, _ = create_owner('other')
+        report = analytics.compute_report(analytics.load_extract(other.pk))
+        self.assertEqual((report['rows'], report['monthly'], report['forecast']), (0, [], []))
+
+class PetStatsTests(TestCase):
+
+    def setUp(self):
+        self.user, self.pet, self.category = create_owner()
+        self.toys, _ = ExpenseCategory.objects.get_or_create(name='Игрушки')
+        start = datetime.date(2024, 1, 1)
+        ExchangeRate.objects.create(currency='USD', date=start, rate=Decimal('91.3717'))
+        ExchangeRate.objects.create(currency='USD', date=datetime.date(2024, 2, 15), rate=Decimal('89.9999'))
+        ExchangeRate.objects.create(currency='EUR', date=start, rate=Decimal('99.1234'))
+        rows = [
+            (self.category, '100.10', 'RUB', (1, 5)), (self.category, '0.33', 'USD', (1, 5)),
+            (self.category, '0.35', 'USD', (1, 5)), (self.toys, '12.99', 'EUR', (1, 20)),
+            (self.toys, '7.77', 'USD', (2, 14)), (self.toys, '7.77', 'USD', (2, 15)),
+            (self.category, '250', 'RUB', (3, 1)), (self.category, '1.01', 'EUR', (3, 1)),
+        ]
+        self.expenses = [
+            add_expense(self.pet, category, amount, currency, datetime.date(2024, *day))
+            for category, amount, currency, day in rows
+        ]
+        add_expense(Pet.objects.create(name='Мурка', species='cat', owner=self.user), self.category, '999')
+
+    def reference(self, report):
+        """Итоги по каждому расходу отдельно, одно округление на итог"""
+        total, by_category, by_month = Fraction(0), {}, {}
+        for expense in self.expenses:
+            value = report.convert(money.to_minor(expense.amount), expense.currency, expense.date)
+            total += value
+            by_category[expense.category_id] = by_category.get(expense.category_id, 0) + value
+            month = expense.date.strftime('%Y-%m')
+            by_month[month] = by_month.get(month, 0) + value
+
+        def rounded(value):
+            return money.from_minor(money.round_fraction(value))
+
+        return (
+            rounded(total), rounded(total / len(self.expenses)),
+            {key: rounded(value) for key, value in by_category.items()},
+            {key: rounded(value) for key, value in by_month.items()},
+        )
+
+    def test_grouped_stats_match_per_expense_totals(self):
+        categories.all_categories()
+        for currency in ('RUB', 'USD', 'EUR'):
+            with self.subTest(currency=currency):
+                report = CurrencyReport(currency, rates=money.RateCalendar.load())
+                with self.assertNumQueries(1):
+                    stats = pet_stats.compute_pet_stats(self.pet.pk, report)
+                total, avg, by_category, by_month = self.reference(report)
+                self.assertEqual((stats.total, stats.avg, stats.count), (total, avg, len(self.expenses)))
+                self.assertEqual({item['category_id']: item['total'] for item in stats.by_category}, by_category)
+                self.assertEqual({item['month']: item['total'] for item in stats.monthly}, by_month)
+                self.assertEqual(sum(item['count'] for item in stats.monthly), len(self.expenses))
+
+    def test_cached_stats_read_only_recent(self):
+        report = CurrencyReport('USD', rates=money.RateCalendar.load())
+        first = pet_stats.get_pet_stats(self.pet, report, recent=3)
+        with self.assertNumQueries(1):
+            again = pet_stats.get_pet_stats(self.pet, report, recent=3)
+        self.assertEqual((again.total, len(again.recent)), (first.total, 3))
+
+
+class ExpenseListRatesTests(TestCase):
+
+    def setUp(self):
+        self.user, self.pet, self.category = create_owner(currency='EUR')
+        ExchangeRate.objects.create(currency='USD', date=datetime.date(2024, 1, 1), rate=Decimal('90.5'))
+        ExchangeRate.objects.create(currency='EUR', date=datetime.date(2024, 1, 1), rate=Decimal('99.25'))
+        for day in range(1, 20):
+            add_expense(
+                self.pet, self.category, '1.5', currency=('USD', 'EUR', 'RUB')[day % 3],
+                date=datetime.date(2024, 1, day),
+            )
+
+    def test_page_reads_rates_once(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('pets:expense_list'))
+        self.assertEqual(response.status_code, 200)
+        # Итоги (CurrencyReport) и строки страницы (convert_expenses) — один запрос курсов
+        rate_queries = [query['sql'] for query in queries if '"pets_exchangerate"' in query['sql']]
+        self.assertEqual(len(rate_queries), 1, rate_queries)
+
+    def test_tag_outside_request_scope(self):
+        expenses = list(Expense.objects.filter(owner=self.user).order_by('date'))
+        template = Template(
+            '{% load currency_tags %}{% convert_expenses expenses "EUR" as rows %}'
+            '{% for row in rows %}{{ row.converted_display }};{% endfor %}'
+        )
+        # Без RateScopeMiddleware тег получает временную область и читает курсы один раз
+        with self.assertNumQueries(1):
+            rendered = template.render(Context({'expenses': expenses}))
+        rates = money.RateCalendar.load()
+        expected = []
+        for expense in expenses:
+            minor = money.to_minor(expense.amount)
+            if expense.currency != 'EUR':
+                rub = money.convert_minor(minor, rates.rate_on(expense.currency, expense.date))
+                minor = money.convert_minor_back(rub, rates.rate_on('EUR', expense.date))
+            expected.append(f"{money.format_minor(minor, 'EUR')};")
+        self.assertEqual(rendered, ''.join(expected))
+
+
+# ==================== API ====================
+
+class ExpenseBatchTests(TestCase):
+
+    def setUp(self):
+        self.user, self.pet, self.category = create_owner()
+        self.client.force_login(self.user)
+        self.expense = add_expense(self.pet, self.category, '100')
+        self.url = reverse('pets:api_expenses_batch')
+
+    def post(self, payload):
+        return self.client.post(self.url, json.dumps(payload), content_type='application/json')
+
+    def month_total(self):
+        return BudgetPeriodTotal.objects.get(
+            owner=self.user, month=self.expense.date.replace(day=1), pet_key=0, category_key=0
+        ).total_minor
+
+    def test_update_adjusts_budget_totals(self):
+        response = self.post({'update': [{'id': self.expense.pk, 'amount': '30'}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.month_total(), 3000)
+
+    def test_duplicate_ids_are_rejected(self):
+        response = self.post({'update': [
+            {'id': self.expense.pk, 'amount': '30'},
+            {'id': self.expense.pk, 'amount': '50'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']['update']), ['1'])
+        self.expense.refresh_from_db()
+        self.assertEqual(self.expense.amount, Decimal('100'))
+        self.assertEqual(self.month_total(), 10000)
+
+
+# ==================== СИНХРОНИЗАЦИЯ ====================
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class SyncTests(TestCase):
+
+    def setUp(self):
+        self.user, self.pet, self.category = create_owner()
+
+    def test_changes_since_token(self):
+        token = sync.current_token(self.user.pk)
+        expense = add_expense(self.pet, self.category, '10')
+        changes = sync.changes_since(self.user.pk, token, 100)
+        self.assertEqual([row['id'] for row in changes['expenses']['changed']], [expense.pk])
+
+        expense_id = expense.pk
+        expense.delete()
+        changes = sync.changes_since(self.user.pk, changes['token'], 100)
+        self.assertEqual(changes['expenses']['deleted'], [expense_id])
+
+    def test_prune_keeps_newest_entry(self):
+        add_expense(self.pet, self.category, '10')
+        newest = sync.current_token(self.user.pk)
+        sync.prune(days=-1)
+        self.assertEqual(list(ChangeLog.objects.values_list('id', flat=True)), [newest])
+        # Клиент, получивший последнюю запись, продолжает синхронизацию
+        self.assertEqual(sync.changes_since(self.user.pk, newest, 100)['token'], newest)
+
+    def test_pruned_token_expires(self):
+        stale = sync.current_token(self.user.pk)
+        for amount in ('1', '2', '3'):
+            add_expense(self.pet, self.category, amount)
+        sync.prune(days=-1)
+        with self.assertRaises(sync.SyncTokenExpired):
+            sync.changes_since(self.user.pk, stale, 100)
+
+    def test_other_owners_pruning_keeps_token(self):
+        add_expense(self.pet, self.category, '10')
+        token = sync.current_token(self.user.pk)
+        ChangeLog.objects.filter(owner=self.user).update(created_at=timezone.now() - datetime.timedelta(days=2))
+        other, other_pet, other_category = create_owner('other')
+        for amount in ('1', '2', '3'):
+            add_expense(other_pet, other_category, amount)
+        sync.prune(days=1)
+        # Границы токена проверяются по журналу владельца: его последняя запись осталась
+        self.assertEqual(sync.changes_since(self.user.pk, token, 100)['token'], token)
+        with self.assertRaises(sync.SyncTokenExpired):
+            sync.changes_since(self.user.pk, sync.current_token(other.pk), 100)
+
+    @override_settings(SYNC_SETTLE_SECONDS=60)
+    def test_token_stops_before_unsettled_entry(self):
+        token = sync.current_token(self.user.pk)
+        fresh = add_expense(self.pet, self.category, '1')
+        settled = add_expense(self.pet, self.category, '2')
+        hour_ago = timezone.now() - datetime.timedelta(hours=1)
+        ChangeLog.objects.filter(object_id=settled.pk, kind='expense').update(created_at=hour_ago)
+
+        # Запись с большим id уже старше окна, но токен не перешагивает более молодую
+        changes = sync.changes_since(self.user.pk, token, 100)
+        self.assertEqual((changes['token'], changes['expenses']['changed']), (token, []))
+
+        ChangeLog.objects.filter(object_id=fresh.pk, kind='expense').update(created_at=hour_ago)
+        changes = sync.changes_since(self.user.pk, token, 100)
+        self.assertEqual(
+            sorted(row['id'] for row in changes['expenses']['changed']), sorted([fresh.pk, settled.pk])
+        )
+
+    def test_empty_log_expires_token(self):
+        token = sync.current_token(self.user.pk)
+        ChangeLog.objects.all().delete()
+        with self.assertRaises(sync.SyncTokenExpired):
+            sync.changes_since(self.user.pk, token, 100)
+
+
+# ==================== АДМИНКА ====================
+
+@skipUnless(pets_admin.PERFORMANCE_MODE, 'ADMIN_PERFORMANCE_MODE выключен')
+class ExpenseAdminTests(TestCase):
+
+    def setUp(self):
+        self.user, self.pet, self.category = create_owner()
+        for date in (datetime.date(2023, 5, 10), datetime.date(2024, 2, 5), datetime.date(2024, 2, 20)):
+            add_expense(self.pet, self.category, '10', date=date)
+        cache.delete(pets_admin.EXPENSE_DATE_RANGE_KEY)
+        admin_user = User.objects.create_superuser('admin', password='secret-pass-123')
+        self.client.force_login(admin_user)
+        self.url = reverse('admin:pets_expense_changelist')
+
+    def test_changelist_counts_exactly_without_estimate(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        changelist = response.context['cl']
+        self.assertIsInstance(changelist.paginator, EstimatedCountPaginator)
+        # Вне PostgreSQL оценки нет, пагинатор выполняет обычный COUNT
+        if connection.vendor != 'postgresql':
+            self.assertIsNone(estimate_count(changelist.queryset))
+        self.assertEqual((changelist.paginator.count, changelist.result_count), (3, 3))
+
+    def test_period_filter_narrows_results(self):
+        for period, expected in [('2023', 1), ('2024', 2), ('2024-02', 2), ('2023-05', 1), ('2023-06', 0)]:
+            with self.subTest(period=period):
+                response = self.client.get(self.url, {'period': period})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['cl'].result_count, expected)
+
+        choices = [value for value, _ in pets_admin.PeriodFilter(
+            None, {}, Expense, pets_admin.ExpenseAdmin,
+        ).lookups(None, pets_admin.ExpenseAdmin)]
+        self.assertEqual(choices[-2:], ['2024', '2023'])
+
+
+# ==================== СПРАВОЧНИК КАТЕГОРИЙ ====================
+
+class CategoryRegistryTests(TestCase):
+
+    def worker(self):
+        """Отдельная копия модуля со своим состоянием, как в другом процессе"""
+        spec = importlib.util.find_spec('pets.categories')
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    def test_edit_bumps_catalog_version_on_commit(self):
+        category = ExpenseCategory.objects.create(name='Игрушки')
+        other = self.worker()
+        self.assertEqual(other.get_category(category.pk).name, 'Игрушки')
+        version = get_scope_version(CATALOG_SCOPE)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            category.name = 'Игрушки и лакомства'
+            category.save()
+            # До фиксации версия прежняя: другие процессы не перечитывают справочник
+            self.assertEqual(get_scope_version(CATALOG_SCOPE), version)
+            self.assertEqual(other.get_category(category.pk).name, 'Игрушки')
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_scope_version(CATALOG_SCOPE), version)
+        # Копия другого процесса не получала invalidate() и перечитывает справочник по версии
+        with self.assertNumQueries(1):
+            self.assertEqual(other.get_category(category.pk).name, 'Игрушки и лакомства')
+        with self.assertNumQueries(0):
+            self.assertIn(category.pk, other.category_ids())
+
+
+# ==================== ВЕС СТРАНИЦ ====================
+
+class PageWeightTests(TestCase):
+
+    def setUp(self):
+        self.user, self.pet, self.category = create_owner()
+        for amount in ('120', '45.50', '300'):
+            add_expense(self.pet, self.category, amount)
+
+    def page_weight(self, *args):
+        out = io.StringIO()
+        call_command('page_weight', *args, username=self.user.username, stdout=out)
+        return out.getvalue()
+
+    def test_pages_fit_budget(self):
+        output = self.page_weight()
+        for page in ('pets:home', 'pets:pet_list', 'pets:expense_list', 'pets:analytics', 'pets:login'):
+            self.assertIn(reverse(page), output)
+        self.assertIn(f'в бюджете {settings.PAGE_WEIGHT_BUDGET_KB} КБ', output)
+
+    def test_over_budget_fails(self):
+        with self.assertRaisesMessage(CommandError, 'Превышен бюджет 1 КБ'):
+            self.page_weight('pets:home', '--budget', '1')
+
+
+# ==================== АНАЛИТИКА И ОЧЕРЕДЬ ЗАДАЧ ====================
+
+class AnalyticsChartsConditionalTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.pet, self.category = create_owner()
+        add_expense(self.pet, self.category, '100')
+        self.client.force_login(self.user)
+        self.url = reverse('pets:analytics') + '?view=charts'
+        # Первый ответ выдает CSRF-cookie, которая входит в ETag
+        self.client.get(self.url)
+
+    def test_reload_after_charts_task_is_not_304(self):
+        pending = self.client.get(self.url)
+        self.assertEqual(pending.status_code, 200)
+        self.assertIsNotNone(pending.context['charts_task'])
+        etag = pending['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Задача положила графики в кэш, данные владельца не менялись
+        key = Task.objects.get(name='analytics.charts').payload['cache_key']
+        cache.set(key, {'chart1': 'png', 'chart2': None, 'chart3': None})
+        ready = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(ready.status_code, 200)
+        self.assertEqual(ready.context['chart1'], 'png')
+        self.assertIsNone(ready.context['charts_task'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=ready['ETag']).status_code, 304)
+
+
+@override_settings(TASK_BACKEND='thread')
+class LocalQueueRecoveryTests(TestCase):
+
+    def setUp(self):
+        queue._last_maintenance = None
+        self.addCleanup(setattr, queue, '_last_maintenance', None)
+        self.long_ago = timezone.now() - datetime.timedelta(seconds=settings.TASK_TIMEOUT + 60)
+
+    def enqueue(self):
+        with mock.patch.object(queue, '_submit_local') as submit, mock.patch.object(queue, '_executor'), \
+                self.captureOnCommitCallbacks(execute=True):
+            job = queue.enqueue('analytics.charts', {}, unique_key='charts')
+        return job, submit
+
+    def test_stale_running_task_is_requeued(self):
+        stale = Task.objects.create(
+            name='analytics.charts', unique_key='charts', status=Task.RUNNING,
+            locked_by='gone', locked_at=self.long_ago, run_at=self.long_ago,
+        )
+        job, submit = self.enqueue()
+        self.assertEqual(job.pk, stale.pk)
+        self.assertEqual(job.status, Task.QUEUED)
+        submit.assert_called_once_with(stale.pk)
+
+    def test_lost_delayed_retry_is_resubmitted(self):
+        lost = Task.objects.create(name='analytics.charts', unique_key='charts', run_at=self.long_ago, attempts=1)
+        job, submit = self.enqueue()
+        self.assertEqual(job.pk, lost.pk)
+        submit.assert_called_once_with(lost.pk)
+
+        # Следующее обслуживание — не раньше чем через TASK_TIMEOUT / 2
+        job, submit = self.enqueue()
+        submit.assert_not_called()
+
+    def test_maintenance_cleans_expired_exports(self):
+        user, _, _ = create_owner()
+        expired = Export.objects.create(owner=user, expires_at=timezone.now() - datetime.timedelta(hours=1))
+        fresh = Export.objects.create(owner=user, expires_at=timezone.now() + datetime.timedelta(hours=1))
+        with mock.patch.object(queue, '_executor') as executor, self.captureOnCommitCallbacks(execute=True):
+            queue.enqueue('analytics.charts', {})
+        # Обслуживание уходит в пул задач, а не выполняется в запросе
+        executor.return_value.submit.assert_any_call(queue._run_periodic_local)
+
+        queue.run_periodic()
+        self.assertFalse(Export.objects.filter(pk=expired.pk).exists())
+        self.assertTrue(Export.objects.filter(pk=fresh.pk).exists())
+
+    @override_settings(TASK_BACKEND='worker')
+    def test_stale_running_task_is_not_deduplicated(self):
+        stale = Task.objects.create(
+            name='analytics.charts', unique_key='charts', status=Task.RUNNING,
+            locked_by='gone', locked_at=self.long_ago,
+        )
+        job, _ = self.enqueue()
+        self.assertNotEqual(job.pk, stale.pk)
+        self.assertEqual(job.status, Task.QUEUED)
+
+
+# ==================== ГРАФИКИ ====================
+
+@skipUnless(charts.AVAILABLE, 'matplotlib не установлен')
+@override_settings(CHART_POOL_SIZE=2)
+class FigurePoolTests(SimpleTestCase):
+
+    def setUp(self):
+        previous, charts._pool = charts._pool, None
+        self.addCleanup(setattr, charts, '_pool', previous)
+
+    def test_figures_are_reused(self):
+        for i in range(12):
+            render = (charts.pie, charts.line, charts.bar)[i % 3]
+            self.assertTrue(render(['А', 'Б'], [1.0, 2.0], 'Тест', *(['x', 'y'] if i % 3 else [])))
+        # По одной фигуре на шаблон: каждая возвращается в пул и берется снова
+        self.assertEqual(charts.get_pool().created, 3)
+
+    def test_failed_render_is_not_pooled_or_leaked(self):
+        figures = []
+        with self.assertRaises(RuntimeError):
+            with charts.chart('bar', 'Ошибка') as ax:
+                figures.append(weakref.ref(ax.figure))
+                ax.bar(['А', 'Б'], [1, 2])
+                raise RuntimeError('render failed')
+        del ax
+        gc.collect()
+        self.assertIsNone(figures[0]())
+
+        charts.bar(['А'], [1.0], 'Тест', 'x', 'y')
+        self.assertEqual(charts.get_pool().created, 2)
+
+    def test_soak_command(self):
+        out = io.StringIO()
+        call_command('chart_soak', renders=30, warmup=6, fail_every=5, max_growth=100, stdout=out)
+        self.assertIn('Память стабильна', out.getvalue())
+        # Упавшие отрисовки не возвращают фигуры, удачные берут их из пула
+        self.assertLessEqual(charts.get_pool().created, 3 + (30 + 6) // 5)
@@ -1,6 +1,6 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import api, views
 from .views import (
     PetUpdateView, 
     ExpenseUpdateView, 
@@ -41,15 +41,38 @@ urlpatterns = [
     # Расходы
     path('expenses/', views.expense_list, name='expense_list'),
     path('expenses/add/', views.expense_add, name='expense_add'),
+    path('expenses/bulk/', views.expense_bulk, name='expense_bulk'),
     path('expenses/<int:pk>/edit/', ExpenseUpdateView.as_view(), name='expense_edit'),
     path('expenses/<int:pk>/delete/', ExpenseDeleteView.as_view(), name='expense_delete'),
     
     # Аналитика
     path('analytics/', views.analytics, name='analytics'),
     
+    # Настройки
+    path('settings/', views.user_settings, name='settings'),
+    
+    # Регулярные расходы
+    path('recurring/', views.recurring_list, name='recurring_list'),
+    path('recurring/<int:pk>/toggle/', views.recurring_toggle, name='recurring_toggle'),
+    
+    # Бюджеты
+    path('budgets/', views.budget_list, name='budget_list'),
+    path('budgets/<int:pk>/delete/', views.budget_delete, name='budget_delete'),
+    
     # Экспорт
     path('export/csv/', views.export_expenses_csv, name='export_csv'),
+    path('exports/', views.export_list, name='export_list'),
+    path('exports/<str:token>/download/', views.export_download, name='export_download'),
     
     # Поиск
     path('search/', global_search, name='global_search'),
+    
+    # JSON API
+    path('api/pets/', api.pets, name='api_pets'),
+    path('api/categories/', api.categories, name='api_categories'),
+    path('api/expenses/', api.expenses, name='api_expenses'),
+    path('api/expenses/batch/', api.expenses_batch, name='api_expenses_batch'),
+    path('api/analytics/', api.analytics, name='api_analytics'),
+    path('api/sync/', api.sync, name='api_sync'),
+    path('api/tasks/<int:pk>/', api.task_status, name='api_task_status'),
 ]
\ No newline at end of file
@@ -1,34 +1,49 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Sum, Count, Avg, Q, Min, Max
+from django.db.models import Sum, Count, Q
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from datetime import timedelta, datetime
 from django.core.paginator import Paginator
 from django.http import HttpResponse
 import json
 from django.views.generic import UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.urls import reverse_lazy
-import io
-import base64
-from django.db.models.functions import TruncMonth, TruncDate
-import matplotlib
-matplotlib.use('Agg')  
+from django.urls import reverse, reverse_lazy
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.db.models.functions import TruncMonth
 from django.conf import settings
-import matplotlib.pyplot as plt
-from .models import Pet, Expense, ExpenseCategory
-from .forms import PetForm, ExpenseForm
-from django.http import HttpResponse
+from .models import (
+    Pet, Expense, ExpenseCategory, Budget, BudgetAlert, BudgetPeriodTotal, RecurringExpense,
+    UserPreferences, Export,
+)
+from .forms import PetForm, ExpenseForm, BudgetForm, RecurringExpenseForm, UserPreferencesForm
+from .recurring import next_occurrence
+from .budgets import evaluate_owner, month_start
+from .conditional import owner_conditional
+from .analytics import owner_report
+from .money import from_minor, to_minor
+from .reporting import CurrencyReport
+from .pet_stats import get_pet_stats
+from . import categories as category_registry
+from . import charts, exports, queue, rate_scope
+from .caching import get_data_version
+from .bulk import delete_expenses, update_expenses
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 import csv
 import logging
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
+# Готовые графики аналитики по версии данных владельца
+ANALYTICS_CHARTS_KEY = 'pets:analytics-charts:{}:{}:{}:{}'
+
 # Константы для категорий (убрали дублирование)
 DEFAULT_CATEGORIES = [
     {'name': 'Корм', 'color': '#FF6384'},
@@ -41,18 +56,8 @@ DEFAULT_CATEGORIES = [
     {'name': 'Другое', 'color': '#C9CBCF'},
 ]
 
-# Проверка доступности matplotlib для аналитики
-try:
-    import matplotlib
-    matplotlib.use('Agg')
-    import matplotlib.pyplot as plt
-    import numpy as np
-    MATPLOTLIB_AVAILABLE = True
-except ImportError as e:
-    logger.error(f"Matplotlib import error: {e}")
-    MATPLOTLIB_AVAILABLE = False
-    plt = None
-    np = None
+# Доступность matplotlib для аналитики (графики строит pets.charts)
+MATPLOTLIB_AVAILABLE = charts.AVAILABLE
 
 # ==================== АУТЕНТИФИКАЦИЯ ====================
 
@@ -66,8 +71,9 @@ def login_view(request):
         
         if form.is_valid():
             username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            user = authenticate(username=username, password=password)
+            # Форма уже проверила пароль; повторный authenticate() считал бы
+            # хэш PBKDF2 второй раз
+            user = form.get_user()
             
             if user is not None:
                 login(request, user)
@@ -117,7 +123,8 @@ def register_view(request):
 def ensure_default_categories():
     """Создание категорий расходов по умолчанию (если их нет)"""
     try:
-        if not ExpenseCategory.objects.exists():
+        # Справочник в памяти: запрос к базе только при смене версии категорий
+        if not category_registry.all_categories():
             for cat in DEFAULT_CATEGORIES:
                 ExpenseCategory.objects.create(name=cat['name'], color=cat['color'])
             logger.info("Created default expense categories")
@@ -126,34 +133,36 @@ def ensure_default_categories():
 
 # ==================== ОСНОВНЫЕ VIEW ====================
 
+@owner_conditional
 def home(request):
     """Главная страница с общей статистикой"""
     if request.user.is_authenticated:
         pets = Pet.objects.filter(owner=request.user)
-        expenses = Expense.objects.filter(pet__owner=request.user)
+        expenses = Expense.objects.filter(owner=request.user)
     else:
         pets = Pet.objects.all()
         expenses = Expense.objects.all()
     
+    # Суммы в валюте отчетов пользователя
+    report = CurrencyReport.for_user(request.user)
+    
     # Общая статистика
-    total_expenses = expenses.aggregate(total=Sum('amount'))['total'] or 0
+    total_expenses = report.total(expenses)['total']
     
     # Расходы за последние 30 дней
     last_month = timezone.now().date() - timedelta(days=30)
-    monthly_expenses = expenses.filter(
-        date__gte=last_month
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    monthly_expenses = report.total(expenses.filter(date__gte=last_month))['total']
     
     # Последние расходы
     recent_expenses = expenses.order_by('-date')[:5]
     
-    # Статистика по категориям
-    category_stats = expenses.values(
-        'category__name', 'category__color'
+    # Статистика по категориям (названия и цвета — из справочника, без JOIN)
+    category_stats = SimpleLazyObject(lambda: category_registry.attach(list(expenses.values(
+        'category_id'
     ).annotate(
         total=Sum('amount'),
         count=Count('id')
-    ).order_by('-total')[:5]
+    ).order_by('-total')[:5])))
     
     # Расходы по питомцам
     pet_stats = pets.annotate(
@@ -161,17 +170,14 @@ def home(request):
         expense_count=Count('expenses')
     ).order_by('-total_spent')[:3]
     
-    monthly_data = expenses.annotate(
-        month=TruncMonth('date')
-    ).values('month').annotate(
-        total=Sum('amount')
-    ).order_by('month')[:6]
-    
-    # Форматируем данные для шаблона
-    monthly_data_formatted = [
+    # Форматируем данные для шаблона (считается только при обращении)
+    monthly_data_formatted = SimpleLazyObject(lambda: [
         {'month': item['month'].strftime('%Y-%m'), 'total': item['total']}
-        for item in monthly_data
-    ]
+        for item in sorted(
+            report.totals(expenses.annotate(month=TruncMonth('date')), 'month'),
+            key=lambda item: item['month']
+        )[:6]
+    ])
     
     context = {
         'pets': pets,
@@ -236,50 +242,23 @@ def pet_detail(request, pk):
     """Детальная страница питомца со всеми расходами"""
     pet = get_object_or_404(Pet, pk=pk)
     
-    if request.user.is_authenticated and pet.owner != request.user:
+    # Сравнение по id: владелец не загружается
+    if request.user.is_authenticated and pet.owner_id != request.user.pk:
         messages.error(request, 'У вас нет доступа к этому питомцу')
         return redirect('pets:pet_list')
     
-    expenses = pet.expenses.all().order_by('-date')
-    
-    # Статистика
-    total_spent = expenses.aggregate(total=Sum('amount'))['total'] or 0
-    avg_expense = expenses.aggregate(avg=Avg('amount'))['avg'] or 0
-    
-    # Расходы по категориям
-    by_category = expenses.values('category__name', 'category__color').annotate(
-        total=Sum('amount'),
-        count=Count('id')
-    ).order_by('-total')
-    
-    # По месяцам (последние 12 месяцев)
-    monthly_expenses = expenses.annotate(
-        month=TruncMonth('date')
-    ).values('month').annotate(
-        total=Sum('amount'),
-        count=Count('id')
-    ).order_by('-month')[:12]
-    
-    # Форматируем для шаблона
-    monthly_expenses_formatted = []
-    for item in monthly_expenses:
-        monthly_expenses_formatted.append({
-            'month': item['month'].strftime('%Y-%m'),
-            'total': item['total'] or 0,
-            'count': item['count']
-        })
-    
-    # Последние расходы
-    recent_expenses = expenses[:10]
+    # Итоги, категории и месяцы — одна сгруппированная выборка (или кэш),
+    # последние расходы — еще один запрос по индексу
+    stats = get_pet_stats(pet, CurrencyReport.for_user(request.user), recent=10)
     
     context = {
         'pet': pet,
-        'expenses': recent_expenses,
-        'total_spent': total_spent,
-        'avg_expense': avg_expense,
-        'by_category': by_category,
-        'monthly_expenses': monthly_expenses_formatted,
-        'expense_count': expenses.count(),
+        'expenses': stats.recent,
+        'total_spent': stats.total,
+        'avg_expense': stats.avg,
+        'by_category': stats.by_category,
+        'monthly_expenses': stats.monthly,
+        'expense_count': stats.count,
     }
     return render(request, 'pets/pet_detail.html', context)
 
@@ -307,11 +286,11 @@ def pet_add(request):
 def expense_list(request):
     """Список всех расходов с фильтрацией"""
     if request.user.is_authenticated:
-        expenses = Expense.objects.filter(pet__owner=request.user)
+        expenses = Expense.objects.filter(owner=request.user)
     else:
         expenses = Expense.objects.all()
     
-    expenses = expenses.select_related('pet', 'category')
+    expenses = expenses.select_related('pet')
     
     # Фильтры
     pet_filter = request.GET.get('pet')
@@ -332,7 +311,7 @@ def expense_list(request):
         expenses = expenses.filter(
             Q(description__icontains=search_query) |
             Q(pet__name__icontains=search_query) |
-            Q(category__name__icontains=search_query)
+            Q(category_id__in=category_registry.matching_ids(search_query))
         )
     
     # Сортировка
@@ -343,17 +322,24 @@ def expense_list(request):
     paginator = Paginator(expenses, 15)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.object_list = category_registry.attach_objects(page_obj.object_list)
     
     # Статистика
-    total_amount = expenses.aggregate(total=Sum('amount'))['total'] or 0
-    avg_amount = expenses.aggregate(avg=Avg('amount'))['avg'] or 0
+    # Итоги и строки страницы пересчитываются по одному календарю курсов
+    # из области запроса: все валюты читаются одним запросом
+    scope = rate_scope.current()
+    report = CurrencyReport.for_user(request.user, scope.calendar(code for code, _ in Expense.CURRENCIES))
+    scope.register_expenses(page_obj.object_list, report.currency)
+    summary = report.total(expenses)
+    total_amount = summary['total']
+    avg_amount = summary['avg'] or 0
     
     context = {
         'page_obj': page_obj,
         'total_amount': total_amount,
         'avg_amount': avg_amount,
         'pets': Pet.objects.all() if not request.user.is_authenticated else Pet.objects.filter(owner=request.user),
-        'categories': ExpenseCategory.objects.all(),
+        'categories': category_registry.all_categories(),
         'filters': {
             'pet': pet_filter,
             'category': category_filter,
@@ -365,6 +351,42 @@ def expense_list(request):
     }
     return render(request, 'pets/expense_list.html', context)
 
+@login_required
+def expense_bulk(request):
+    """Массовые действия над отмеченными расходами (только POST)"""
+    next_url = request.POST.get('next')
+    if not next_url or not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = reverse('pets:expense_list')
+    if request.method != 'POST':
+        return redirect(next_url)
+    
+    ids = [int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()]
+    action = request.POST.get('action')
+    if not ids:
+        messages.warning(request, 'Не выбрано ни одного расхода')
+        return redirect(next_url)
+    
+    fields = {'category': 'category_id', 'pet': 'pet_id', 'currency': 'currency'}
+    try:
+        if action == 'delete':
+            count = delete_expenses(request.user.pk, ids)
+            messages.success(request, f'Удалено расходов: {count}')
+        elif action in fields:
+            value = request.POST.get(action)
+            if not value:
+                raise ValueError('empty value')
+            if action == 'category' and category_registry.get_category(int(value)) is None:
+                raise ValueError('unknown category')
+            if action == 'currency' and value not in dict(Expense.CURRENCIES):
+                raise ValueError('unknown currency')
+            count = update_expenses(request.user.pk, ids, **{fields[action]: value})
+            messages.success(request, f'Изменено расходов: {count}')
+        else:
+            messages.error(request, 'Неизвестное действие')
+    except ValueError:
+        messages.error(request, 'Выберите допустимое значение для действия')
+    return redirect(next_url)
+
 @login_required
 def expense_add(request):
     """Добавление нового расхода"""
@@ -399,19 +421,126 @@ def expense_add(request):
     }
     return render(request, 'pets/form.html', context)
 
+@login_required
+def user_settings(request):
+    """Настройки пользователя: валюта отчетов"""
+    preferences, _ = UserPreferences.objects.get_or_create(user=request.user)
+    if request.method == 'POST':
+        form = UserPreferencesForm(request.POST, instance=preferences)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Настройки сохранены')
+            return redirect('pets:settings')
+    else:
+        form = UserPreferencesForm(instance=preferences)
+    return render(request, 'pets/settings.html', {'form': form})
+
+@login_required
+def recurring_list(request):
+    """Шаблоны регулярных расходов; сами расходы создает materialize_recurring"""
+    if request.method == 'POST':
+        form = RecurringExpenseForm(request.POST, user=request.user)
+        if form.is_valid():
+            template = form.save()
+            messages.success(request, f'Регулярный расход добавлен, ближайший — {template.next_run:%d.%m.%Y}')
+            return redirect('pets:recurring_list')
+    else:
+        form = RecurringExpenseForm(user=request.user, initial={'start_date': timezone.localdate()})
+    
+    context = {
+        'form': form,
+        'templates': category_registry.attach_objects(
+            RecurringExpense.objects.filter(owner=request.user).select_related('pet')
+        ),
+    }
+    return render(request, 'pets/recurring_list.html', context)
+
+@login_required
+def recurring_toggle(request, pk):
+    """Приостановка и возобновление шаблона (только POST)"""
+    template = get_object_or_404(RecurringExpense, pk=pk, owner=request.user)
+    if request.method == 'POST':
+        template.is_active = not template.is_active
+        if template.is_active:
+            # Пропущенные за паузу расходы не создаются задним числом
+            today = timezone.localdate()
+            while template.next_run < today:
+                template.next_run = next_occurrence(template, template.next_run)
+        template.save(update_fields=['is_active', 'next_run'])
+    return redirect('pets:recurring_list')
+
+@login_required
+def budget_list(request):
+    """Бюджеты владельца с расходом за текущий месяц и превышениями"""
+    if request.method == 'POST':
+        form = BudgetForm(request.POST, user=request.user)
+        if form.is_valid():
+            budget = form.save(commit=False)
+            budget.owner = request.user
+            budget.save()
+            evaluate_owner(request.user.pk)
+            messages.success(request, f'Бюджет «{budget}» добавлен')
+            return redirect('pets:budget_list')
+    else:
+        form = BudgetForm(user=request.user)
+    
+    month = month_start(timezone.localdate())
+    # Потраченное берется из накопленных сумм, без агрегации расходов
+    totals = {
+        (pet_key, category_key): total
+        for pet_key, category_key, total in BudgetPeriodTotal.objects.filter(
+            owner=request.user, month=month
+        ).values_list('pet_key', 'category_key', 'total_minor')
+    }
+    budgets = []
+    for budget in category_registry.attach_objects(Budget.objects.filter(owner=request.user).select_related('pet')):
+        spent = totals.get((budget.pet_key, budget.category_key), 0)
+        limit = to_minor(budget.monthly_limit)
+        budgets.append({
+            'budget': budget,
+            'spent': from_minor(spent),
+            'percent': min(round(spent * 100 / limit), 999) if limit else 0,
+            'exceeded': spent > limit,
+        })
+    
+    alerts = BudgetAlert.objects.filter(
+        budget__owner=request.user, is_read=False
+    ).select_related('budget__pet')
+    alert_list = list(alerts)
+    category_registry.attach_objects(alert.budget for alert in alert_list)
+    if alert_list:
+        alerts.update(is_read=True)
+    
+    context = {
+        'form': form,
+        'budgets': budgets,
+        'alerts': alert_list,
+        'month': month,
+    }
+    return render(request, 'pets/budget_list.html', context)
+
+@login_required
+def budget_delete(request, pk):
+    """Удаление бюджета (только POST)"""
+    budget = get_object_or_404(Budget, pk=pk, owner=request.user)
+    if request.method == 'POST':
+        budget.delete()
+        messages.success(request, 'Бюджет удален')
+    return redirect('pets:budget_list')
+
 # ==================== АНАЛИТИКА: ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ====================
 
 def _get_filtered_expenses(request):
     """Получение отфильтрованных расходов для аналитики"""
     if request.user.is_authenticated:
-        expenses = Expense.objects.filter(pet__owner=request.user)
+        expenses = Expense.objects.filter(owner=request.user)
     else:
         expenses = Expense.objects.all()
     return expenses
 
 def _get_period_dates(period):
     """Получение дат начала и конца периода"""
-    today = timezone.now().date()
+    today = timezone.localdate()
     
     if period == 'week':
         start_date = today - timedelta(days=7)
@@ -424,209 +553,52 @@ def _get_period_dates(period):
     
     return start_date, today
 
-def _create_category_chart(filtered_expenses):
-    """Создание круговой диаграммы по категориям"""
-    try:
-        category_data = filtered_expenses.values('category__name').annotate(
-            total=Sum('amount')
-        ).order_by('-total')[:6]
-        
-        if not category_data:
-            return None
-        
-        categories = []
-        amounts = []
-        
-        for item in category_data:
-            cat_name = item['category__name'] or 'Без категории'
-            if cat_name:
-                categories.append(cat_name[:15])
-                amounts.append(float(item['total']))
-        
-        if not categories or not amounts:
-            return None
-        
-        fig, ax = plt.subplots(figsize=(8, 8))
-        colors = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40']
-        ax.pie(amounts, labels=categories, colors=colors[:len(categories)], 
-              autopct='%1.1f%%', startangle=90)
-        ax.set_title('Расходы по категориям', fontsize=14)
-        ax.axis('equal')
-        
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', dpi=80, bbox_inches='tight')
-        buf.seek(0)
-        chart = base64.b64encode(buf.getvalue()).decode('utf-8')
-        buf.close()
-        plt.close(fig)
-        
-        return chart
-    except Exception as e:
-        logger.error(f"Error creating category chart: {e}")
-        return None
-
-def _create_trend_chart(filtered_expenses, period):
-    """Создание линейного графика по времени"""
-    try:
-        if period == 'week':
-            date_data = filtered_expenses.annotate(
-                day=TruncDate('date')
-            ).values('day').annotate(
-                total=Sum('amount')
-            ).order_by('day')
-        else:
-            date_data = filtered_expenses.annotate(
-                month=TruncMonth('date')
-            ).values('month').annotate(
-                total=Sum('amount')
-            ).order_by('month')
-        
-        if not date_data:
-            return None
-        
-        dates = []
-        amounts = []
-        
-        for item in date_data:
-            if 'day' in item:
-                dates.append(item['day'].strftime('%d.%m'))
-            else:
-                dates.append(item['month'].strftime('%b %Y'))
-            amounts.append(float(item['total']))
-        
-        if len(dates) < 2:
-            return None
-        
-        fig, ax = plt.subplots(figsize=(10, 5))
-        ax.plot(dates, amounts, marker='o', linewidth=2, color='#36A2EB')
-        ax.fill_between(dates, amounts, alpha=0.2, color='#36A2EB')
-        ax.set_title('Динамика расходов', fontsize=14)
-        ax.set_xlabel('Период')
-        ax.set_ylabel('Сумма (руб)')
-        ax.grid(True, alpha=0.3)
-        plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
-        plt.tight_layout()
-        
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', dpi=80)
-        buf.seek(0)
-        chart = base64.b64encode(buf.getvalue()).decode('utf-8')
-        buf.close()
-        plt.close(fig)
-        
-        return chart
-    except Exception as e:
-        logger.error(f"Error creating trend chart: {e}")
-        return None
-
-def _create_pet_chart(filtered_expenses):
-    """Создание столбчатой диаграммы по питомцам"""
-    try:
-        pet_data = filtered_expenses.values('pet__name').annotate(
-            total=Sum('amount')
-        ).order_by('-total')[:5]
-        
-        if not pet_data:
-            return None
-        
-        pet_names = []
-        pet_amounts = []
-        
-        for item in pet_data:
-            name = item['pet__name'] or 'Без имени'
-            if name:
-                pet_names.append(name[:12])
-                pet_amounts.append(float(item['total']))
-        
-        if not pet_names or not pet_amounts:
-            return None
-        
-        fig, ax = plt.subplots(figsize=(10, 6))
-        colors = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF']
-        bars = ax.bar(pet_names, pet_amounts, color=colors[:len(pet_names)])
-        ax.set_title('Расходы по питомцам', fontsize=14)
-        ax.set_xlabel('Питомец')
-        ax.set_ylabel('Сумма (руб)')
-        ax.grid(axis='y', alpha=0.3)
-        
-        # Добавляем значения на столбцы
-        for bar in bars:
-            height = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2., height,
-                   f'{height:,.0f}₽',
-                   ha='center', va='bottom')
-        
-        plt.tight_layout()
-        
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', dpi=80)
-        buf.seek(0)
-        chart = base64.b64encode(buf.getvalue()).decode('utf-8')
-        buf.close()
-        plt.close(fig)
-        
-        return chart
-    except Exception as e:
-        logger.error(f"Error creating pet chart: {e}")
-        return None
-
 def analytics_tables(request, expenses):
     """Логика для табличной аналитики"""
-    # Общая статистика
-    total_stats = expenses.aggregate(
-        total=Sum('amount'),
-        avg=Avg('amount'),
-        count=Count('id'),
-        min=Min('amount'),
-        max=Max('amount')
-    )
+    # Все суммы — в валюте отчетов пользователя
+    report = CurrencyReport.for_user(request.user)
     
-    # Статистика по категориям
-    by_category = expenses.values(
-        'category__name', 'category__color'
-    ).annotate(
-        total=Sum('amount'),
-        count=Count('id'),
-        avg=Avg('amount')
-    ).order_by('-total')
-    
-    # По питомцам
-    by_pet = expenses.values(
-        'pet__name'
-    ).annotate(
-        total=Sum('amount'),
-        count=Count('id')
-    ).order_by('-total')
-    
-    # По месяцам
-    monthly_stats = expenses.annotate(
-        month=TruncMonth('date')
-    ).values('month').annotate(
-        total=Sum('amount'),
-        count=Count('id')
-    ).order_by('month')
-    
-    # Форматируем для шаблона
-    monthly_stats_formatted = []
-    for item in monthly_stats:
-        monthly_stats_formatted.append({
+    # Общая статистика
+    total_stats = report.total(expenses, extremes=True)
+    
+    # Статистика по категориям, по питомцам и по месяцам. Списки строятся
+    # лениво: если фрагмент шаблона взят из кэша, запросы не выполняются.
+    by_category = SimpleLazyObject(lambda: sorted(
+        category_registry.attach(report.totals(expenses, 'category_id')),
+        key=lambda item: item['total'], reverse=True
+    ))
+    
+    by_pet = SimpleLazyObject(lambda: sorted(
+        report.totals(expenses, 'pet__name'),
+        key=lambda item: item['total'], reverse=True
+    ))
+    
+    monthly_stats_formatted = SimpleLazyObject(lambda: [
+        {
             'month': item['month'].strftime('%Y-%m'),
             'total': item['total'],
             'count': item['count']
-        })
+        }
+        for item in sorted(
+            report.totals(expenses.annotate(month=TruncMonth('date')), 'month'),
+            key=lambda item: item['month']
+        )
+    ])
     
-    # Сравнение с предыдущим месяцем
-    current_month_start = datetime.now().replace(day=1)
-    current_month_expenses = expenses.filter(
-        date__gte=current_month_start
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    # Сравнение с предыдущим месяцем. Оба периода ограничены с двух сторон,
+    # чтобы на секционированной таблице читались только нужные секции.
+    today = timezone.localdate()
+    current_month_start = today.replace(day=1)
+    current_month_expenses = report.total(expenses.filter(
+        date__range=(current_month_start, today)
+    ))['total']
     
     prev_month_end = current_month_start - timedelta(days=1)
     prev_month_start = prev_month_end.replace(day=1)
-    prev_month_expenses = expenses.filter(
+    prev_month_expenses = report.total(expenses.filter(
         date__gte=prev_month_start,
         date__lte=prev_month_end
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    ))['total']
     
     # Изменение в процентах
     if prev_month_expenses > 0:
@@ -645,10 +617,46 @@ def analytics_tables(request, expenses):
         'change_percent': change_percent,
         'expense_count': expenses.count(),
         'current_month': current_month_start.strftime('%Y-%m'),
+        # Тренды, сезонность и прогноз; считаются только при промахе кэша фрагмента
+        'insights': SimpleLazyObject(lambda: owner_report(request.user.pk, report.currency)),
         'no_data': not expenses.exists(),
         'matplotlib_error': not MATPLOTLIB_AVAILABLE,
     }
 
+def _period_expenses(expenses, start_date, end_date):
+    """Расходы за период; если за период данных нет — все расходы"""
+    filtered_expenses = expenses.filter(date__range=(start_date, end_date))
+    if not filtered_expenses.exists():
+        return expenses
+    return filtered_expenses
+
+def build_analytics_charts(owner_id, period, currency):
+    """Три графика аналитики в base64 (выполняется в фоновой задаче)"""
+    start_date, end_date = _get_period_dates(period)
+    filtered_expenses = _period_expenses(Expense.objects.filter(owner_id=owner_id), start_date, end_date)
+    report = CurrencyReport(currency)
+    return {
+        'chart1': charts.category_chart(filtered_expenses, report),
+        'chart2': charts.trend_chart(filtered_expenses, period, report),
+        'chart3': charts.pet_chart(filtered_expenses, report),
+    }
+
+def _analytics_charts_key(user, period, currency):
+    return ANALYTICS_CHARTS_KEY.format(user.pk, period, currency, get_data_version(user.pk))
+
+def analytics_charts_ready(request):
+    """Часть ETag аналитики: готовы ли графики.
+
+    Задача кладет графики в кэш, не меняя данных владельца; без этой части
+    перезагрузка после задачи получала бы 304 со страницей без графиков.
+    """
+    if request.GET.get('view') != 'charts':
+        return ''
+    key = _analytics_charts_key(
+        request.user, request.GET.get('period', 'month'), CurrencyReport.for_user(request.user).currency
+    )
+    return 'charts' if cache.has_key(key) else 'pending'
+
 def analytics_charts(request, expenses):
     """Логика для аналитики с графиками"""
     if not MATPLOTLIB_AVAILABLE:
@@ -664,33 +672,39 @@ def analytics_charts(request, expenses):
     
     period = request.GET.get('period', 'month')
     start_date, end_date = _get_period_dates(period)
+    filtered_expenses = _period_expenses(expenses, start_date, end_date)
     
-    # Фильтруем расходы
-    filtered_expenses = expenses.filter(date__gte=start_date)
-    
-    # Если нет данных за период, показываем всё
-    if not filtered_expenses.exists():
-        filtered_expenses = expenses
-    
-    # Статистика
+    # Статистика в валюте отчетов
+    report = CurrencyReport.for_user(request.user)
+    summary = report.total(filtered_expenses)
     stats = {
-        'total_expenses': filtered_expenses.aggregate(Sum('amount'))['amount__sum'] or 0,
-        'average_expense': filtered_expenses.aggregate(Avg('amount'))['amount__avg'] or 0,
-        'expense_count': filtered_expenses.count(),
+        'total_expenses': summary['total'],
+        'average_expense': summary['avg'] or 0,
+        'expense_count': summary['count'],
     }
     
-    # Создаем графики
-    chart1 = _create_category_chart(filtered_expenses)
-    chart2 = _create_trend_chart(filtered_expenses, period)
-    chart3 = _create_pet_chart(filtered_expenses)
+    # Графики строятся фоновой задачей; страница опрашивает ее статус и
+    # перезагружается, когда картинки появятся в кэше
+    key = _analytics_charts_key(request.user, period, report.currency)
+    cached = cache.get(key)
+    charts_task = None
+    if cached is None:
+        cached = {}
+        charts_task = queue.enqueue(
+            'analytics.charts',
+            {'owner_id': request.user.pk, 'period': period, 'currency': report.currency, 'cache_key': key},
+            owner_id=request.user.pk,
+            unique_key=key,
+        )
     
     return {
         'view_mode': 'charts',
         'period': period,
         'stats': stats,
-        'chart1': chart1,
-        'chart2': chart2,
-        'chart3': chart3,
+        'chart1': cached.get('chart1'),
+        'chart2': cached.get('chart2'),
+        'chart3': cached.get('chart3'),
+        'charts_task': charts_task,
         'no_data': not filtered_expenses.exists(),
         'matplotlib_error': False,
         'filtered_data_count': filtered_expenses.count(),
@@ -700,6 +714,7 @@ def analytics_charts(request, expenses):
     }
 
 @login_required
+@owner_conditional(extra=analytics_charts_ready)
 def analytics(request):
     """
     Страница аналитики с переключением между таблицами и графиками
@@ -726,31 +741,93 @@ def analytics(request):
     
     return render(request, 'pets/analytics.html', context)
 
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи"""
+    def write(self, value):
+        return value
+
+@owner_conditional
 def export_expenses_csv(request):
-    """Экспорт расходов в CSV"""
+    """Экспорт расходов в CSV.
+
+    Ответ отдается потоком, а строки читаются порциями через серверный
+    курсор (на PostgreSQL), поэтому память воркера не зависит от объема.
+    Для больших выгрузок есть фоновый режим (export_list).
+    """
     
     # Фильтруем по текущему пользователю
     if request.user.is_authenticated:
-        expenses = Expense.objects.filter(created_by=request.user)
+        expenses = Expense.objects.filter(owner=request.user)
     else:
         # Для анонимных пользователей возвращаем пустой список
         expenses = Expense.objects.none()
     
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="pet_expenses.csv"'
+    writer = csv.writer(_Echo())
     
-    writer = csv.writer(response)
-    writer.writerow(['Дата', 'Питомец', 'Категория', 'Сумма (RUB)', 'Описание'])
+    def stream():
+        yield writer.writerow(exports.HEADER)
+        for row in exports.expense_rows(expenses):
+            yield writer.writerow(row)
     
-    for expense in expenses:
-        writer.writerow([
-            expense.date.strftime('%Y-%m-%d') if expense.date else '',
-            expense.pet.name if expense.pet else 'Не указан',
-            expense.category.name if expense.category else 'Без категории',
-            expense.amount,
-            expense.description or ''
-        ])
+    response = StreamingHttpResponse(stream(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="pet_expenses.csv"'
+    return response
+
+@login_required
+def export_list(request):
+    """Фоновые выгрузки пользователя: запрос новой и ссылки на готовые"""
+    if request.method == 'POST':
+        fmt = request.POST.get('format', 'csv')
+        if fmt in dict(Export.FORMATS):
+            exports.request_export(request.user.pk, fmt)
+            messages.success(request, 'Выгрузка готовится, ссылка появится на этой странице')
+        else:
+            messages.error(request, 'Неизвестный формат выгрузки')
+        return redirect('pets:export_list')
     
+    context = {
+        'exports': Export.objects.filter(
+            owner=request.user, expires_at__gt=timezone.now()
+        ).select_related('task'),
+        'formats': Export.FORMATS,
+        'ttl_hours': settings.EXPORT_TTL_HOURS,
+    }
+    return render(request, 'pets/export_list.html', context)
+
+@login_required
+def export_download(request, token):
+    """Скачивание готовой выгрузки с поддержкой докачки (Range)"""
+    export = get_object_or_404(Export, token=token, owner=request.user)
+    if export.is_expired:
+        return HttpResponse('Срок действия ссылки истек', status=410, content_type='text/plain; charset=utf-8')
+    if not export.is_ready:
+        raise Http404('Выгрузка еще не готова')
+    
+    size = export.size
+    etag = f'"{export.token[:16]}-{size}"'
+    byte_range = None
+    # If-Range с другим ETag означает, что файл сменился: отдаем целиком
+    if request.headers.get('If-Range', etag) == etag:
+        try:
+            byte_range = exports.parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    start, end = byte_range or (0, size - 1)
+    
+    response = StreamingHttpResponse(
+        exports.iter_file(export.file.open('rb'), start, end - start + 1),
+        status=206 if byte_range else 200,
+        content_type='application/gzip',
+    )
+    response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Disposition'] = f'attachment; filename="{exports.FILE_NAMES[export.format]}"'
+    response['Cache-Control'] = 'private, no-store'
     return response
 
 class PetUpdateView(LoginRequiredMixin, UpdateView):
@@ -782,7 +859,7 @@ class ExpenseUpdateView(LoginRequiredMixin, UpdateView):
     
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Expense.objects.filter(pet__owner=self.request.user)
+            return Expense.objects.filter(owner=self.request.user)
         return Expense.objects.all()
     
     def get_success_url(self):
@@ -813,7 +890,7 @@ class ExpenseDeleteView(LoginRequiredMixin, DeleteView):
     
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Expense.objects.filter(pet__owner=self.request.user)
+            return Expense.objects.filter(owner=self.request.user)
         return Expense.objects.all()
     
     def delete(self, request, *args, **kwargs):
@@ -842,12 +919,11 @@ def global_search(request):
         ).distinct()
         
         # Поиск расходов
-        expenses_results = Expense.objects.filter(
-            Q(category__icontains=query) |
-            Q(description__icontains=query) |
-            Q(notes__icontains=query),
-            pet__owner=request.user
-        ).distinct().select_related('pet')
+        expenses_results = category_registry.attach_objects(Expense.objects.filter(
+            Q(category_id__in=category_registry.matching_ids(query)) |
+            Q(description__icontains=query),
+            owner=request.user
+        ).select_related('pet'))
         
         results['pets'] = pets_results
         results['expenses'] = expenses_results
@@ -884,7 +960,7 @@ def emergency_login(request):
             logger.info(f"Created test admin user with password: {password}")
         
         # Авторизуем пользователя
-        user.backend = 'django.contrib.auth.backends.ModelBackend'
+        user.backend = 'pets.auth.CachedModelBackend'
         login(request, user)
         messages.success(request, f'Вы вошли как {user.username} (тестовый режим)')
         
@@ -0,0 +1,108 @@
+// Автоматическое скрытие сообщений через 5 секунд
+document.addEventListener('DOMContentLoaded', function() {
+    setTimeout(function() {
+        var alerts = document.querySelectorAll('.alert');
+        alerts.forEach(function(alert) {
+            var bsAlert = new bootstrap.Alert(alert);
+            bsAlert.close();
+        });
+    }, 5000);
+
+    // Инициализация всплывающих подсказок
+    var tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
+    var tooltipList = tooltipTriggerList.map(function (tooltipTriggerEl) {
+        return new bootstrap.Tooltip(tooltipTriggerEl);
+    });
+
+    // Предотвращение отправки пустой формы поиска
+    const searchForm = document.querySelector('.search-form');
+    if (searchForm) {
+        searchForm.addEventListener('submit', function(e) {
+            const searchInput = this.querySelector('input[name="q"]');
+            if (searchInput && searchInput.value.trim() === '') {
+                e.preventDefault();
+                searchInput.focus();
+                searchInput.classList.add('is-invalid');
+                setTimeout(() => {
+                    searchInput.classList.remove('is-invalid');
+                }, 2000);
+
+                // Показать сообщение
+                showToast('Введите поисковый запрос', 'warning');
+            }
+        });
+    }
+
+    // Фокус на поле поиска при переходе на страницу поиска с пустым запросом
+    if (window.location.pathname.includes('search') && !window.location.search.includes('q=')) {
+        const searchInput = document.getElementById('global-search-input');
+        if (searchInput) {
+            setTimeout(() => {
+                searchInput.focus();
+            }, 300);
+        }
+    }
+
+    // Восстановить фокус при возврате со страницы поиска
+    if (localStorage.getItem('focusSearch') === 'true') {
+        const searchInput = document.getElementById('global-search-input');
+        if (searchInput) {
+            setTimeout(() => {
+                searchInput.focus();
+                localStorage.removeItem('focusSearch');
+            }, 300);
+        }
+    }
+});
+
+// Функция для показа уведомлений
+function showToast(message, type = 'info') {
+    // Проверяем, есть ли уже контейнер для тостов
+    let toastContainer = document.getElementById('toast-container');
+    if (!toastContainer) {
+        toastContainer = document.createElement('div');
+        toastContainer.id = 'toast-container';
+        toastContainer.className = 'position-fixed top-0 end-0 p-3';
+        toastContainer.style.zIndex = '1060';
+        document.body.appendChild(toastContainer);
+    }
+
+    // Создаем тост
+    const toastId = 'toast-' + Date.now();
+    const toast = document.createElement('div');
+    toast.id = toastId;
+    toast.className = 'toast align-items-center text-white bg-' + (type === 'warning' ? 'warning' : type === 'success' ? 'success' : 'info') + ' border-0';
+    toast.setAttribute('role', 'alert');
+    toast.setAttribute('aria-live', 'assertive');
+    toast.setAttribute('aria-atomic', 'true');
+
+    toast.innerHTML = `
+        <div class="d-flex">
+            <div class="toast-body">
+                <i class="bi ${type === 'warning' ? 'bi-exclamation-triangle' : type === 'success' ? 'bi-check-circle' : 'bi-info-circle'} me-2"></i>
+                ${message}
+            </div>
+            <button type="button" class="btn-close btn-close-white me-2 m-auto" data-bs-dismiss="toast"></button>
+        </div>
+    `;
+
+    toastContainer.appendChild(toast);
+
+    // Инициализируем и показываем тост
+    const bsToast = new bootstrap.Toast(toast, { delay: 3000 });
+    bsToast.show();
+
+    // Удаляем тост после скрытия
+    toast.addEventListener('hidden.bs.toast', function () {
+        toast.remove();
+    });
+}
+
+// Обработка клика на ссылки поиска
+document.querySelectorAll('a[href*="search"]').forEach(link => {
+    link.addEventListener('click', function() {
+        if (this.getAttribute('href') === document.body.dataset.searchUrl) {
+            localStorage.setItem('focusSearch', 'true');
+        }
+    });
+});